@@ -1,8 +1,11 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from redis import Redis
 import requests, json
 from datetime import datetime
-from config import REDIS_URL, QUEUE_KEY, SUB_HASH_PREFIX
+from config import REDIS_URL, SUB_HASH_PREFIX, RESULT_TTL_SEC, SELFTEST_TTL_SEC
+import job_queue
+import blobs
+import metrics
 import uuid
 
 app = Flask(__name__)
@@ -20,8 +23,13 @@ def create_submission(submission_id):
       limitations?: { maxTime, maxMemory(MB), maxOutput(KB) }
       callback_url?: string
       callback_token?: string
+      priority?: "deadline" | "live" | "rejudge"，默认 live
+      user_id?: 提交用户，用于同一 lane 内按用户轮转与在途提交数限制
+      no_cache?: 为 true 时不复用缓存的判题结果与旧测试点结果（对时间敏感的重判）
+      previous_cases?: 重判时上一次的测试点结果（提交的 extra），数据未变的测试点直接沿用（见 incremental.py）
     return:
       { submission_id }
+      429：该用户在途提交数已达 MAX_INFLIGHT_PER_USER
     """
     data = request.get_json(silent=True) or {}
     problem_id = data.get("problem_id")
@@ -30,6 +38,7 @@ def create_submission(submission_id):
     limitations = data.get("limitations") or {}
     callback_url = data.get("callback_url")
     callback_token = data.get("callback_token")
+    lane = data.get("priority")
 
     if not problem_id or not language or not source_code:
         return jsonify({"error": "missing problem_id / language / source_code"}), 400
@@ -42,10 +51,13 @@ def create_submission(submission_id):
         "limitations": limitations,
         "callback_url": callback_url,
         "callback_token": callback_token,
+        "user_id": data.get("user_id"),
+        "no_cache": bool(data.get("no_cache")),
+        "previous_cases": data.get("previous_cases"),
         "created_at": datetime.now().isoformat()
     }
 
-    # 初始状态
+    # 初始状态（带 TTL，判完后 worker 会重新设置）
     sub_key = SUB_HASH_PREFIX + submission_id
     rds.hset(sub_key, mapping={
         "status": "Pending",
@@ -53,8 +65,19 @@ def create_submission(submission_id):
         "score": "0",
         "created_at": job["created_at"]
     })
-    # 入队
-    rds.rpush(QUEUE_KEY, json.dumps(job))
+    rds.expire(sub_key, RESULT_TTL_SEC)
+    # 先占在途名额再写 blob：超过上限时不留下没人引用的源码 blob
+    try:
+        job_queue.reserve(rds, job, lane)
+    except job_queue.QueueFull as e:
+        rds.delete(sub_key)
+        return jsonify({"error": str(e)}), 429
+    # 入队，源码按内容存为 blob，任务里只放引用
+    try:
+        job_queue.enqueue(rds, blobs.offload(rds, job), lane)
+    except Exception:
+        job_queue.finish(rds, job)
+        raise
     return jsonify({"submission_id": submission_id}), 202
 
 
@@ -79,8 +102,10 @@ def self_test():
         "source_code": source_code,
         "limitations": limitations,
         "test_cases": test_cases,
+        "problem_id": data.get("problem_id"),  # 可选，给出时使用该题的 checker
         "callback_url": callback_url,
         "callback_token": callback_token,
+        "user_id": data.get("user_id"),
         "created_at": datetime.now().isoformat()
     }
     
@@ -92,8 +117,9 @@ def self_test():
         "score": "0",
         "created_at": job["created_at"]
     })
-    # 入队
-    rds.rpush(QUEUE_KEY, json.dumps(job))
+    rds.expire(sub_key, SELFTEST_TTL_SEC)
+    # 入队（自测走最高优先级），源码与测试数据按内容存为 blob
+    job_queue.enqueue(rds, blobs.offload(rds, job), "selftest")
 
     return jsonify({"submission_id": submission_id}), 202
 
@@ -108,7 +134,7 @@ def self_test_status(submission_id):
 
     status = rds.hgetall(sub_key)
     # Redis 中可能存的是字符串，解析必要字段
-    result = status.get("result")
+    result = blobs.unpack(status.get("result"))
     score = status.get("score")
     job_status = status.get("status")
     created_at = status.get("created_at")
@@ -121,5 +147,20 @@ def self_test_status(submission_id):
         "created_at": created_at
     })
 
+@app.get("/judger/queues")
+def queue_depths():
+    """
+    各优先级队列当前长度
+    """
+    return jsonify(job_queue.lane_depths(rds))
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """
+    Prometheus 文本格式的判题指标：队列长度、各阶段耗时直方图、按结果与语言的判题计数
+    """
+    body = metrics.render(rds, job_queue.lane_depths(rds))
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=8000)
@@ -0,0 +1,390 @@
+# bench.py
+"""
+判题机基准测试
+
+  python bench.py micro [--size-kb 4096] [--repeat 5]
+      输出比较、diff 生成、摘要计算、meta 解析等热点路径
+  python bench.py macro [--fake-isolate] [--languages cpp,python,java] [--cases 1,10] [--output-kb 1,256]
+                        [--mix ac,wa] [--submissions 4] [--backends isolate,rlimit,docker]
+      用合成提交跑 judge_submission（docker 后端走 judge_submission_docker），
+      按 沙箱后端 × 语言 × 测试点数 × 输出大小 的网格报告每分钟提交数与各阶段平均耗时（result["timings"]）
+
+  python bench.py stability [--fake-isolate] [--backend isolate] [--language cpp] [--workers 4] [--runs 10]
+      计时稳定性：多个进程并发判同一个固定计算量的提交，分别在 不绑核 / 每个进程绑定一个判题 slot（cpus.py）
+      下运行，比较选手程序 time 的均值、标准差、变异系数与极差
+
+--fake-isolate 使用 fake_isolate.py 代替 isolate（不需要 root，不做任何隔离）；
+box、测试数据、编译缓存与预编译头都放在临时目录里，不影响本机的判题数据。
+
+回归检查：--save out.json 保存结果，之后 --baseline out.json [--tolerance 0.25]
+与之比较，任一项耗时超过基线 (1 + tolerance) 倍时以退出码 1 结束。
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+from typing import Callable, Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BOX_ID = 900  # 避开 BOX_ID_START 起的 worker box
+
+# 合成提交：第一行输入 k，输出 k 行 i*i；verdict 控制程序行为
+PROGRAMS = {
+    "cpp": """#include <bits/stdc++.h>
+int main() {
+    long long k;
+    if (!(std::cin >> k)) return 0;
+    std::string out;
+    for (long long i = 0; i < k; i++) {
+        long long v = i * i;
+        if (VERDICT_WA && i == k - 1) v++;
+        out += std::to_string(v);
+        out += '\\n';
+    }
+    fwrite(out.data(), 1, out.size(), stdout);
+    if (VERDICT_TLE) { volatile unsigned long long x = 0; for (;;) x++; }
+    return VERDICT_RE ? 3 : 0;
+}
+""",
+    "python": """import sys
+k = int(sys.stdin.readline() or 0)
+out = [str(i * i) for i in range(k)]
+if VERDICT_WA and k:
+    out[-1] = str((k - 1) * (k - 1) + 1)
+sys.stdout.write("\\n".join(out) + "\\n")
+if VERDICT_TLE:
+    while True:
+        pass
+sys.exit(3 if VERDICT_RE else 0)
+""",
+    "java": """import java.io.*;
+public class Main {
+    public static void main(String[] args) throws IOException {
+        BufferedReader br = new BufferedReader(new InputStreamReader(System.in));
+        String line = br.readLine();
+        long k = line == null ? 0 : Long.parseLong(line.trim());
+        StringBuilder sb = new StringBuilder();
+        for (long i = 0; i < k; i++) {
+            long v = i * i;
+            if (VERDICT_WA && i == k - 1) v++;
+            sb.append(v).append('\\n');
+        }
+        System.out.print(sb);
+        System.out.flush();
+        if (VERDICT_TLE) { long x = 0; while (true) x++; }
+        System.exit(VERDICT_RE ? 3 : 0);
+    }
+}
+""",
+}
+TOOLCHAINS = {"cpp": ["g++"], "python": ["python3"], "java": ["javac", "java"]}
+EXPECTED = {"ac": "AC", "wa": "WA", "re": "RE", "tle": "TLE", "ce": "CE"}
+
+
+def synth_source(language: str, verdict: str) -> str:
+    src = PROGRAMS[language]
+    true, false = ("True", "False") if language == "python" else ("true", "false")
+    for v in ("WA", "RE", "TLE"):
+        src = src.replace(f"VERDICT_{v}", true if verdict == v.lower() else false)
+    if verdict == "ce":
+        src += "\n#error\n" if language == "cpp" else "\n}}}\n"
+    return src
+
+
+def _timeit(fn: Callable[[], object], repeat: int) -> float:
+    """repeat 次中的中位数（秒）"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+# ---------------------------------------------------------------- micro
+
+def run_micro(args) -> Dict[str, float]:
+    from compare import compare_files, compare_text, digest_file
+    from sandbox import parse_meta
+    from jvm import parse_harness_meta, harness_mac
+
+    tmp = tempfile.mkdtemp(prefix="judge_bench_")
+    try:
+        lines = max(1, args.size_kb * 1024 // 12)
+        expected = "".join(f"{i * i}\n" for i in range(lines))
+        wrong = expected[:-2] + "0\n"
+        paths = {}
+        for name, text in (("expected", expected), ("same", expected.replace("\n", "  \n")), ("wrong", wrong)):
+            paths[name] = os.path.join(tmp, name)
+            with open(paths[name], "w") as f:
+                f.write(text)
+        digest = digest_file(paths["expected"])
+        mb = len(expected) / 1024 / 1024
+
+        meta = "time:0.123\ntime-wall:0.150\nmax-rss:20480\ncsw-voluntary:3\ncsw-forced:1\nexitcode:0\n"
+        hmeta = os.path.join(tmp, "case.hmeta")
+        with open(hmeta, "w") as f:
+            body = "status:ok\ntime:12\nmemory:40960\n"
+            f.write(f"{body}mac:{harness_mac('k' * 64, 'case', body)}\n")
+
+        cases = {
+            "compare_files.equal": lambda: compare_files(paths["expected"], paths["same"]),
+            "compare_files.equal_digest": lambda: compare_files(paths["expected"], paths["same"], digest),
+            "compare_files.wa_last_line": lambda: compare_files(paths["expected"], paths["wrong"]),
+            "compare_text.equal": lambda: compare_text(expected, paths["same"]),
+            "digest_file": lambda: digest_file(paths["same"]),
+            "parse_meta.x10000": lambda: [parse_meta(meta) for _ in range(10000)],
+            "parse_harness_meta.x1000": lambda: [parse_harness_meta(hmeta, "case", "k" * 64) for _ in range(1000)],
+        }
+        results = {}
+        print(f"{'benchmark':<32} {'median':>12} {'throughput':>14}")
+        for name, fn in cases.items():
+            sec = _timeit(fn, args.repeat)
+            results[name] = sec
+            rate = f"{mb / sec:>10.1f}MB/s" if not name.startswith("parse") else ""
+            print(f"{name:<32} {sec * 1000:>10.3f}ms {rate:>14}")
+        return results
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+# ---------------------------------------------------------------- macro
+
+def _write_problem(data_dir: str, problem_id: int, cases: int, output_kb: int) -> None:
+    from compare import digest_file
+    base = os.path.join(data_dir, str(problem_id))
+    os.makedirs(base, exist_ok=True)
+    k = max(1, output_kb * 1024 // 12)
+    manifest = []
+    for i in range(cases):
+        name = f"{i + 1}"
+        with open(os.path.join(base, f"{name}.in"), "w") as f:
+            f.write(f"{k}\n")
+        out_path = os.path.join(base, f"{name}.out")
+        with open(out_path, "w") as f:
+            f.writelines(f"{j * j}\n" for j in range(k))
+        manifest.append({"name": name, "in": f"{name}.in", "out": f"{name}.out", "out_digest": digest_file(out_path)})
+    with open(os.path.join(base, "manifest.json"), "w") as f:
+        json.dump({"cases": manifest}, f)
+
+
+def _phase_means(results: List[dict]) -> Dict[str, float]:
+    phases: Dict[str, List[float]] = {}
+    for r in results:
+        for k, v in (r.get("timings") or {}).items():
+            phases.setdefault(k, []).append(v)
+    return {k: round(statistics.mean(v), 2) for k, v in phases.items()}
+
+
+def run_macro(args) -> Dict[str, float]:
+    from judge import judge_submission
+    from config import DATA_DIR
+    import sandbox as sandboxes
+
+    backends = []
+    for name in args.backends.split(","):
+        if name == "docker" and not shutil.which("docker"):
+            print("docker not found, skipping docker backend")
+            continue
+        backends.append(sandboxes.get(name))
+
+    mix = args.mix.split(",")
+    limitations = {"maxTime": args.time_limit, "maxMemory": args.mem_mb}
+    results = {}
+    problem_id = 0
+    header = f"{'backend':<8} {'lang':<7} {'cases':>5} {'out_kb':>7} {'subs/min':>9} {'bad':>4}  phases(ms, mean)"
+    print(header)
+    for cases in (int(c) for c in args.cases.split(",")):
+        for output_kb in (int(o) for o in args.output_kb.split(",")):
+            problem_id += 1
+            _write_problem(DATA_DIR, problem_id, cases, output_kb)
+            for language in args.languages.split(","):
+                missing = [t for t in TOOLCHAINS[language] if not shutil.which(t)]
+                if missing:
+                    print(f"skip {language}: {', '.join(missing)} not found")
+                    continue
+                for backend in backends:
+                    judged, bad = [], 0
+                    start = time.perf_counter()
+                    for i in range(args.submissions):
+                        verdict = mix[i % len(mix)]
+                        source = synth_source(language, verdict)
+                        if backend.batch:
+                            r = backend.judge(problem_id, language, source, limitations)
+                        else:
+                            r = judge_submission(BOX_ID, problem_id, language, source, limitations, sandbox=backend)
+                        if r.get("status") != EXPECTED[verdict]:
+                            bad += 1
+                        judged.append(r)
+                    elapsed = time.perf_counter() - start
+                    per_min = 60 * len(judged) / elapsed
+                    phases = _phase_means(judged)
+                    key = f"{backend.name}.{language}.c{cases}.o{output_kb}"
+                    results[key] = elapsed / len(judged)
+                    print(f"{backend.name:<8} {language:<7} {cases:>5} {output_kb:>7} {per_min:>9.1f} {bad:>4}  "
+                          + " ".join(f"{k}={v}" for k, v in phases.items()))
+    return results
+
+
+# ---------------------------------------------------------------- stability
+
+# 固定计算量：输出 sum(i * i % 7 for i in range(n))
+BUSY_PROGRAMS = {
+    "cpp": """#include <cstdio>
+int main() {
+    long long n, s = 0;
+    if (scanf("%lld", &n) != 1) return 0;
+    for (volatile long long i = 0; i < n; i++) s += i * i % 7;
+    printf("%lld\\n", s);
+}
+""",
+    "python": """n = int(input())
+s = 0
+for i in range(n):
+    s += i * i % 7
+print(s)
+""",
+}
+
+
+def _stability_worker(idx: int, cpu_set: List[int], args, problem_id: int, out) -> None:
+    from judge import judge_submission
+    import sandbox as sandboxes
+    import cpus
+    cpus.pin(cpu_set)
+    backend = sandboxes.get(args.backend)
+    limitations = {"maxTime": args.time_limit, "maxMemory": 256}
+    times = []
+    for _ in range(args.runs):
+        r = judge_submission(BOX_ID + 1 + idx, problem_id, args.language, BUSY_PROGRAMS[args.language],
+                             limitations, sandbox=backend)
+        times += [c["time"] for c in r["cases"] if c.get("time") is not None and c["status"] == "AC"]
+    out.put(times)
+
+
+def run_stability(args) -> Dict[str, float]:
+    import multiprocessing as mp
+    from config import DATA_DIR
+    import cpus
+
+    n = args.work or (100_000_000 if args.language == "cpp" else 5_000_000)
+    base = os.path.join(DATA_DIR, "1")
+    os.makedirs(base, exist_ok=True)
+    with open(os.path.join(base, "1.in"), "w") as f:
+        f.write(f"{n}\n")
+    with open(os.path.join(base, "1.out"), "w") as f:
+        f.write(f"{(n // 7) * 14 + sum(i * i % 7 for i in range(n % 7))}\n")
+
+    slots = cpus.judge_slots() or [cpus.layout()[1]]
+    workers = args.workers or len(slots)
+    results = {}
+    print(f"judge cpus={cpus.format_cpu_list(cpus.layout()[1])}, slots={len(slots)}, workers={workers}, "
+          f"runs={args.runs}, n={n}")
+    print(f"{'mode':<9} {'samples':>7} {'mean_ms':>9} {'stdev_ms':>9} {'cv%':>6} {'min_ms':>8} {'max_ms':>8}")
+    for mode in ("unpinned", "pinned"):
+        out = mp.Queue()
+        procs = []
+        for i in range(workers):
+            cpu_set = slots[i % len(slots)] if mode == "pinned" else cpus.layout()[1]
+            p = mp.Process(target=_stability_worker, args=(i, cpu_set, args, 1, out))
+            p.start()
+            procs.append(p)
+        times = [t for _ in procs for t in out.get()]
+        for p in procs:
+            p.join()
+        if not times:
+            print(f"{mode:<9} no accepted runs (raise --time-limit or lower --work)")
+            continue
+        mean = statistics.mean(times)
+        stdev = statistics.pstdev(times)
+        results[f"{mode}.stdev"] = stdev / 1000
+        results[f"{mode}.mean"] = mean / 1000
+        print(f"{mode:<9} {len(times):>7} {mean:>9.1f} {stdev:>9.2f} {100 * stdev / mean:>6.2f} "
+              f"{min(times):>8.1f} {max(times):>8.1f}")
+    if workers > len(slots):
+        print(f"note: {workers} workers share {len(slots)} slot(s), pinned runs still contend for cores")
+    return results
+
+
+# ---------------------------------------------------------------- main
+
+def _setup_fake_isolate(work: str) -> None:
+    """在导入判题模块之前设置环境变量（config 在导入时读取）"""
+    fake = os.path.join(HERE, "fake_isolate.py")
+    os.chmod(fake, 0o755)
+    os.environ["ISOLATE_BIN"] = fake
+    for name, sub in (("ISOLATE_BOX_ROOT", "boxes"), ("RLIMIT_SANDBOX_ROOT", "rlimit"), ("DATA_DIR", "data"),
+                      ("COMPILE_CACHE_DIR", "compile"), ("PCH_DIR", "pch")):
+        os.environ.setdefault(name, os.path.join(work, sub))
+
+
+def _check_baseline(results: Dict[str, float], path: str, tolerance: float) -> int:
+    with open(path) as f:
+        baseline = json.load(f)
+    regressions = 0
+    for name, sec in results.items():
+        base = baseline.get(name)
+        if base and sec > base * (1 + tolerance):
+            print(f"REGRESSION {name}: {sec * 1000:.3f}ms vs baseline {base * 1000:.3f}ms")
+            regressions += 1
+    print(f"{regressions} regression(s) against {path}")
+    return 1 if regressions else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="判题机基准测试")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_micro = sub.add_parser("micro", help="比较/摘要/meta 解析等热点路径")
+    p_micro.add_argument("--size-kb", type=int, default=4096, help="比较用输出文件大小")
+    p_micro.add_argument("--repeat", type=int, default=5)
+    p_macro = sub.add_parser("macro", help="合成提交的端到端判题")
+    p_macro.add_argument("--fake-isolate", action="store_true", help="使用 fake_isolate.py，不需要 root")
+    p_macro.add_argument("--languages", default="cpp,python")
+    p_macro.add_argument("--cases", default="1,10", help="测试点数网格")
+    p_macro.add_argument("--output-kb", default="1,256", help="每个测试点输出大小网格")
+    p_macro.add_argument("--mix", default="ac,wa", help=f"提交结果轮换，可选 {','.join(EXPECTED)}")
+    p_macro.add_argument("--submissions", type=int, default=4, help="每个网格点的提交数")
+    p_macro.add_argument("--time-limit", type=float, default=1.0)
+    p_macro.add_argument("--mem-mb", type=int, default=256)
+    p_macro.add_argument("--backends", default="isolate", help="逐个比较的沙箱后端：isolate,rlimit,docker")
+    p_stab = sub.add_parser("stability", help="绑核与不绑核的计时稳定性对比")
+    p_stab.add_argument("--fake-isolate", action="store_true", help="使用 fake_isolate.py，不需要 root")
+    p_stab.add_argument("--backend", default="isolate", help="isolate 或 rlimit")
+    p_stab.add_argument("--language", default="cpp", choices=sorted(BUSY_PROGRAMS))
+    p_stab.add_argument("--workers", type=int, default=0, help="并发进程数，默认等于判题 slot 数")
+    p_stab.add_argument("--runs", type=int, default=10, help="每个进程的提交数")
+    p_stab.add_argument("--work", type=int, default=0, help="循环次数，默认 cpp 1e8 / python 5e6")
+    p_stab.add_argument("--time-limit", type=float, default=10.0)
+    for p in (p_micro, p_macro, p_stab):
+        p.add_argument("--save", help="把结果（每项秒数）保存为 JSON")
+        p.add_argument("--baseline", help="与之前 --save 的结果比较")
+        p.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix="judge_bench_")
+    try:
+        if args.command in ("macro", "stability"):
+            if args.fake_isolate:
+                _setup_fake_isolate(work)
+            else:
+                os.environ.setdefault("DATA_DIR", os.path.join(work, "data"))
+        sys.path.insert(0, HERE)
+        runners = {"micro": run_micro, "macro": run_macro, "stability": run_stability}
+        results = runners[args.command](args)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        return _check_baseline(results, args.baseline, args.tolerance)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+# blobs.py
+"""
+Redis 中大字段的压缩与按内容寻址存储
+
+- pack / unpack：超过 COMPRESS_MIN_BYTES 的文本压缩为 "z:" + base64(zlib)，用于判题结果等字段
+  （连接使用 decode_responses=True，只能存文本）
+- put / get：源码、自测数据、重判时的旧测试点结果等大字段按 sha256 存一份 judge:blob:<sha256>（已压缩、带 TTL），
+  任务 JSON 里只放引用；重判、重复自测不会重复占用内存。每次 put 都会刷新 TTL。
+- offload / hydrate：在任务 JSON 与 blob 引用之间转换
+"""
+import json
+import zlib
+import base64
+import hashlib
+from config import BLOB_PREFIX, BLOB_TTL_SEC, BLOB_MIN_BYTES, COMPRESS_MIN_BYTES
+
+_ZMARK = "z:"
+# 任务中放进 blob 的字段 -> 引用字段名
+OFFLOAD_FIELDS = {"source_code": "source_ref", "test_cases": "test_cases_ref", "previous_cases": "previous_cases_ref"}
+
+
+class BlobMissing(Exception):
+    """引用的 blob 已过期或被删除"""
+    pass
+
+
+def pack(text: str) -> str:
+    if len(text) < COMPRESS_MIN_BYTES:
+        return text
+    return _ZMARK + base64.b64encode(zlib.compress(text.encode("utf-8"), 6)).decode("ascii")
+
+
+def unpack(value: str | None) -> str | None:
+    if value and value.startswith(_ZMARK):
+        return zlib.decompress(base64.b64decode(value[len(_ZMARK):])).decode("utf-8")
+    return value
+
+
+def put(rds, text: str) -> str:
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    key = BLOB_PREFIX + digest
+    # 已存在时只刷新 TTL，不必重新压缩上传
+    if not rds.expire(key, BLOB_TTL_SEC):
+        rds.set(key, pack(text), ex=BLOB_TTL_SEC)
+    return digest
+
+
+def get(rds, digest: str) -> str:
+    value = rds.get(BLOB_PREFIX + digest)
+    if value is None:
+        raise BlobMissing(f"blob {digest} expired")
+    return unpack(value)
+
+
+def offload(rds, job: dict) -> dict:
+    """把任务里较大的字段换成 blob 引用（原地修改并返回）"""
+    for field, ref in OFFLOAD_FIELDS.items():
+        value = job.get(field)
+        if value is None:
+            continue
+        text = value if isinstance(value, str) else json.dumps(value)
+        if len(text) >= BLOB_MIN_BYTES:
+            job[ref] = put(rds, text)
+            del job[field]
+    return job
+
+
+def hydrate(rds, job: dict) -> dict:
+    """worker 取到任务后还原 blob 引用，blob 已过期抛 BlobMissing"""
+    for field, ref in OFFLOAD_FIELDS.items():
+        digest = job.pop(ref, None)
+        if digest is None:
+            continue
+        text = get(rds, digest)
+        job[field] = text if field == "source_code" else json.loads(text)
+    return job
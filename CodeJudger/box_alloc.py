@@ -0,0 +1,60 @@
+# box_alloc.py
+"""
+本机 isolate box-id 分配器
+
+每个 box-id 对应 BOX_LOCK_DIR 下的一个锁文件，持有 flock 即持有该 box。
+进程退出（包括崩溃）时内核自动释放 flock，因此不会出现泄漏或两个进程共用同一个 box。
+"""
+import os
+import time
+import fcntl
+import threading
+from typing import Dict, List
+from config import BOX_ID_START, BOX_ID_COUNT, BOX_LOCK_DIR
+
+_held: Dict[int, int] = {}  # box_id -> 锁文件 fd
+_mutex = threading.Lock()
+
+
+def _box_ids() -> List[int]:
+    return [(BOX_ID_START + i) % 1000 for i in range(BOX_ID_COUNT)]
+
+
+def try_lease(count: int) -> List[int]:
+    """非阻塞地租用至多 count 个 box，返回实际租到的 box-id"""
+    os.makedirs(BOX_LOCK_DIR, exist_ok=True)
+    leased = []
+    with _mutex:
+        for box_id in _box_ids():
+            if len(leased) >= count:
+                break
+            if box_id in _held:
+                continue
+            fd = os.open(os.path.join(BOX_LOCK_DIR, f"{box_id}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                continue
+            _held[box_id] = fd
+            leased.append(box_id)
+    return leased
+
+
+def lease(count: int, poll_sec: float = 0.5) -> List[int]:
+    """阻塞直到租到 count 个 box"""
+    leased = []
+    while True:
+        leased += try_lease(count - len(leased))
+        if len(leased) >= count:
+            return leased
+        time.sleep(poll_sec)
+
+
+def release(box_ids: List[int]) -> None:
+    with _mutex:
+        for box_id in box_ids:
+            fd = _held.pop(box_id, None)
+            if fd is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
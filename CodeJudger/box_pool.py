@@ -0,0 +1,88 @@
+# box_pool.py
+"""
+worker 私有的沙箱 box 池
+
+判题前不再同步执行 cleanup + init：用过的 box 交给后台线程重置，
+下一次判题直接取一个已经 init 好的 box。box 的初始化与清理由所属的沙箱后端完成（见 sandbox.py）。
+重置失败（如 isolate cleanup 出错）时稍后重试，连续失败 RESET_RETRIES 次的 box 不再使用；
+所有 box 都不可用时 acquire 抛出 BoxPoolBroken，worker 据此退出、由 Supervisor 重启。
+"""
+import time
+import queue
+import threading
+from typing import List, Tuple
+from sandbox import Sandbox
+import cpus
+
+RESET_RETRIES = 3        # 同一个 box 连续重置失败的次数上限
+RESET_BACKOFF_SEC = 1.0  # 第 n 次失败后等待 n * RESET_BACKOFF_SEC 秒再重试
+
+
+class BoxPoolBroken(Exception):
+    """池中所有 box 都重置失败"""
+    pass
+
+
+class BoxPool:
+    def __init__(self, box_ids: List[int], sandbox: Sandbox):
+        self.sandbox = sandbox
+        self._ready: "queue.Queue[int]" = queue.Queue()
+        self._dirty: "queue.Queue[int]" = queue.Queue()
+        self._reset_ms = {}  # box_id -> 最近一次后台重置耗时(ms)
+        self._failures = {}  # box_id -> 连续重置失败次数
+        self._size = len(box_ids)
+        self._bad = set()    # 放弃使用的 box
+        for box_id in box_ids:
+            self._dirty.put(box_id)
+        threading.Thread(target=self._reset_loop, daemon=True).start()
+
+    def _reset_loop(self):
+        cpus.pin_housekeeping()  # cleanup / init 不占用 worker 的判题核
+        while True:
+            box_id = self._dirty.get()
+            start = time.perf_counter()
+            try:
+                self.sandbox.reset(box_id)
+                self.sandbox.prepare(box_id)
+            except Exception as e:
+                failures = self._failures[box_id] = self._failures.get(box_id, 0) + 1
+                if failures >= RESET_RETRIES:
+                    print(f"[BoxPool] box {box_id} failed to reset {failures} times, giving up: {e}")
+                    self._bad.add(box_id)
+                    continue
+                print(f"[BoxPool] box {box_id} failed to reset, retrying: {e}")
+                time.sleep(failures * RESET_BACKOFF_SEC)
+                self._dirty.put(box_id)
+                continue
+            self._failures.pop(box_id, None)
+            self._reset_ms[box_id] = (time.perf_counter() - start) * 1000
+            self._ready.put(box_id)
+
+    @property
+    def broken(self) -> bool:
+        return self._size > 0 and len(self._bad) >= self._size
+
+    def acquire(self) -> Tuple[int, float]:
+        """
+        取一个就绪的 box，阻塞直到有可用的；所有 box 都已放弃时抛出 BoxPoolBroken。
+        返回 (box_id, saved_ms)：saved_ms 为后台重置替本次判题省下的时间（扣除等待时间）
+        """
+        start = time.perf_counter()
+        while True:
+            try:
+                box_id = self._ready.get(timeout=1)
+                break
+            except queue.Empty:
+                if self.broken:
+                    raise BoxPoolBroken(f"all {self._size} {self.sandbox.name} boxes failed to reset")
+        waited_ms = (time.perf_counter() - start) * 1000
+        saved_ms = max(0.0, self._reset_ms.get(box_id, 0.0) - waited_ms)
+        return box_id, round(saved_ms, 2)
+
+    def reset_ms(self, box_id: int) -> float:
+        """该 box 最近一次后台重置（cleanup + init）耗时(ms)"""
+        return round(self._reset_ms.get(box_id, 0.0), 2)
+
+    def release(self, box_id: int) -> None:
+        """判题结束，交给后台线程重置"""
+        self._dirty.put(box_id)
@@ -0,0 +1,149 @@
+# callbacks.py
+"""
+判题结果回调：worker 只写 Redis 发件箱，由本机的回调发送进程批量投递
+
+发件箱：
+  CB_PENDING_KEY (hash)  submission_id -> {"url", "payload"}，同一提交的新状态覆盖旧状态（合并 Judging 与最终结果）
+  CB_DUE_KEY     (zset)  submission_id -> 下次投递时间
+发送进程领取到期的条目（领取时把投递时间推后 CALLBACK_CLAIM_SEC，避免多个节点重复发送），
+按后端分组 PUT 到 <callback_url 所在目录>/batch，一次事务提交。
+只有发件箱中的内容仍是刚发出的那一份时才删除，期间被新状态覆盖的条目会在下一轮继续发送。
+失败按指数退避重试；后端不支持批量接口时退回逐条 PUT callback_url。
+"""
+import json
+import time
+from typing import Dict, List, Tuple
+import redis
+import requests
+from requests.adapters import HTTPAdapter
+from config import (REDIS_URL, QUEUE_KEY, CALLBACK_BATCH_SIZE, CALLBACK_TIMEOUT,
+                    CALLBACK_CLAIM_SEC, CALLBACK_MAX_ATTEMPTS)
+import metrics
+import cpus
+
+CB_PENDING_KEY = f"{QUEUE_KEY}:cb:pending"
+CB_DUE_KEY = f"{QUEUE_KEY}:cb:due"
+CB_ATTEMPTS_KEY = f"{QUEUE_KEY}:cb:attempts"
+CB_BELL_KEY = f"{QUEUE_KEY}:cb:bell"
+
+# ARGV: pending, due, bell, submission_id, entry, now
+_POST_LUA = """
+redis.call('HSET', ARGV[1], ARGV[4], ARGV[5])
+redis.call('ZADD', ARGV[2], ARGV[6], ARGV[4])
+redis.call('RPUSH', ARGV[3], '1')
+redis.call('LTRIM', ARGV[3], -16, -1)
+"""
+
+# ARGV: pending, due, now, claim_until, limit
+_CLAIM_LUA = """
+local sids = redis.call('ZRANGEBYSCORE', ARGV[2], '-inf', ARGV[3], 'LIMIT', 0, tonumber(ARGV[5]))
+local out = {}
+for _, sid in ipairs(sids) do
+    local entry = redis.call('HGET', ARGV[1], sid)
+    if entry then
+        redis.call('ZADD', ARGV[2], ARGV[4], sid)
+        table.insert(out, sid)
+        table.insert(out, entry)
+    else
+        redis.call('ZREM', ARGV[2], sid)
+    end
+end
+return out
+"""
+
+# ARGV: pending, due, attempts, submission_id, 发出的 entry
+_DONE_LUA = """
+if redis.call('HGET', ARGV[1], ARGV[4]) == ARGV[5] then
+    redis.call('HDEL', ARGV[1], ARGV[4])
+    redis.call('ZREM', ARGV[2], ARGV[4])
+end
+redis.call('HDEL', ARGV[3], ARGV[4])
+"""
+
+
+def post(rds, task: dict, payload: dict) -> None:
+    """放入发件箱，立即返回；task 没有 callback_url（自测）时什么也不做"""
+    url = task.get("callback_url")
+    if not url:
+        return
+    entry = json.dumps({"url": url, "payload": payload})
+    rds.eval(_POST_LUA, 0, CB_PENDING_KEY, CB_DUE_KEY, CB_BELL_KEY, str(task["submission_id"]), entry, time.time())
+
+
+def _batch_url(callback_url: str) -> str:
+    # callback_url 形如 <PUBLIC_BASE_URL>/submissions/<id>
+    return callback_url.rsplit("/", 1)[0] + "/batch"
+
+
+def _deliver(session: requests.Session, batch_url: str, items: List[Tuple[str, dict]]) -> Dict[str, bool]:
+    """投递一组回调，返回 submission_id -> 是否已被后端处理（包括被拒绝，不再重试）"""
+    updates = [dict(entry["payload"], submission_id=int(sid)) for sid, entry in items]
+    resp = session.put(batch_url, json={"updates": updates}, timeout=CALLBACK_TIMEOUT)
+    if resp.status_code in (404, 405):
+        # 后端还没有批量接口，逐条投递
+        done = {}
+        for sid, entry in items:
+            try:
+                r = session.put(entry["url"], json=entry["payload"], timeout=CALLBACK_TIMEOUT)
+                done[sid] = r.status_code < 500
+            except requests.RequestException:
+                done[sid] = False
+        return done
+    resp.raise_for_status()
+    results = resp.json().get("results", {})
+    for sid, res in results.items():
+        if res != "ok":
+            print(f"[Callback] Submission {sid} rejected by backend: {res}")
+    return {sid: True for sid, _ in items}
+
+
+def _retry(rds, sid: str) -> None:
+    attempts = rds.hincrby(CB_ATTEMPTS_KEY, sid, 1)
+    if attempts >= CALLBACK_MAX_ATTEMPTS:
+        print(f"[Callback] Submission {sid} dropped after {attempts} attempts")
+        pipe = rds.pipeline()
+        pipe.hdel(CB_PENDING_KEY, sid)
+        pipe.zrem(CB_DUE_KEY, sid)
+        pipe.hdel(CB_ATTEMPTS_KEY, sid)
+        pipe.execute()
+        return
+    rds.zadd(CB_DUE_KEY, {sid: time.time() + min(2 ** attempts, 60)})
+
+
+def sender_loop():
+    cpus.pin_housekeeping()
+    rds = redis.from_url(REDIS_URL, decode_responses=True)
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    print("[Callback] sender start")
+    while True:
+        now = time.time()
+        claimed = rds.eval(_CLAIM_LUA, 0, CB_PENDING_KEY, CB_DUE_KEY, now, now + CALLBACK_CLAIM_SEC, CALLBACK_BATCH_SIZE)
+        if not claimed:
+            rds.blpop(CB_BELL_KEY, timeout=1)
+            continue
+
+        groups: Dict[str, List[Tuple[str, dict]]] = {}
+        raw_by_sid = {}
+        for sid, raw in zip(claimed[::2], claimed[1::2]):
+            entry = json.loads(raw)
+            raw_by_sid[sid] = raw
+            groups.setdefault(_batch_url(entry["url"]), []).append((sid, entry))
+
+        for batch_url, items in groups.items():
+            deliver_start = time.perf_counter()
+            try:
+                done = _deliver(session, batch_url, items)
+            except (requests.RequestException, ValueError) as e:
+                print(f"[Callback] Failed to deliver {len(items)} updates to {batch_url}: {e}")
+                done = {}
+            metrics.observe(rds, "judge_callback_seconds", time.perf_counter() - deliver_start,
+                            {"outcome": "ok" if done and all(done.values()) else "failed"})
+            for sid, _ in items:
+                if done.get(sid):
+                    rds.eval(_DONE_LUA, 0, CB_PENDING_KEY, CB_DUE_KEY, CB_ATTEMPTS_KEY, sid, raw_by_sid[sid])
+                else:
+                    _retry(rds, sid)
@@ -0,0 +1,260 @@
+# checkers.py
+"""
+特殊评测（checker）
+
+题目数据目录中的 checker.json / checker.cpp 由后端写进 manifest 的 "checker" 字段：
+  {"type": "exact"}                 默认，逐行比较（忽略行尾空白与末尾空行），见 compare.py
+  {"type": "tokens"}                按空白分隔的 token 逐个比较
+  {"type": "float", "eps": 1e-6}    token 比较，两个数值 token 的绝对或相对误差不超过 eps 即视为相同
+  {"type": "testlib", "source": "checker.cpp"}
+      testlib 风格的 C++ checker：checker <input> <output> <answer>，退出码 0 AC、1 WA、2 PE，其余视为 checker 出错
+
+内置比较器在 worker 进程内流式完成，不启动沙箱。
+testlib checker 与选手程序走同一个沙箱后端（Sandbox 接口）：在判题用的 slot 中编译（CHECKER_COMPILE_TIME_LIMIT），
+每台判题机按 沙箱后端 + 源码 + testlib.h + 编译器版本 编译一次，缓存在 CHECKER_CACHE_DIR/<key>/checker；
+运行时把 checker、输入与答案复制进 slot 的暂存目录，选手程序结束后在同一个 slot 中运行，判定完即删除。
+"""
+import io
+import os
+import time
+import fcntl
+import shutil
+import hashlib
+import tempfile
+from itertools import zip_longest
+from typing import Dict, Iterator, Optional, TextIO, Tuple
+from config import (CHECKER_CACHE_DIR, TESTLIB_DIR, CHECKER_TIME_LIMIT, CHECKER_COMPILE_TIME_LIMIT,
+                    CHECKER_MEM_MB, MAX_DIFF_LEN)
+from compare import CHUNK_SIZE, compare_files, compare_text, digest_file, _open_text
+from sandbox import Sandbox, COMPILE_MEM_MB
+import compile_cache
+
+CHECKER_COMPILER = "/usr/bin/g++"
+CHECKER_FLAGS = ["-O2", "-std=c++17"]
+KINDS = ("exact", "tokens", "float", "testlib")
+STAGE_DIR = "checker"  # slot 工作目录下编译、运行 checker 用的暂存目录，用完即删
+
+_compiled: Dict[Tuple[str, int, str], str] = {}  # (源码路径, mtime_ns, 沙箱后端) -> 编译好的 checker
+
+
+class CheckerError(Exception):
+    """checker 配置有误或编译失败，整份提交判为 IE"""
+    pass
+
+
+def _tokens(fp: TextIO) -> Iterator[str]:
+    carry = ""
+    while True:
+        data = fp.read(CHUNK_SIZE)
+        if not data:
+            if carry:
+                yield carry
+            return
+        parts = (carry + data).split()
+        # 块末尾不是空白时最后一个 token 可能还没读完
+        carry = "" if data[-1].isspace() or not parts else parts.pop()
+        yield from parts
+
+
+def _float_equal(expected: str, actual: str, eps: float) -> bool:
+    try:
+        e, a = float(expected), float(actual)
+    except ValueError:
+        return False
+    diff = abs(e - a)
+    return diff <= eps or diff <= eps * abs(e)
+
+
+def _compare_tokens(expected: TextIO, actual: TextIO, eps: Optional[float]) -> Tuple[bool, str]:
+    for i, (e, a) in enumerate(zip_longest(_tokens(expected), _tokens(actual)), 1):
+        if e == a or (eps is not None and e is not None and a is not None and _float_equal(e, a, eps)):
+            continue
+        diff_text = (f"Token {i}:\n"
+                     f"  Expected: {e[:MAX_DIFF_LEN] if e is not None else '<no token>'}\n"
+                     f"  Actual:   {a[:MAX_DIFF_LEN] if a is not None else '<no token>'}")
+        return False, diff_text[:MAX_DIFF_LEN]
+    return True, ""
+
+
+def _remove(path: str) -> None:
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.lexists(path):
+        os.unlink(path)
+
+
+def _stage(sandbox: Sandbox, slot: int) -> str:
+    """在 slot 的工作目录下新建空的暂存目录；选手程序可能在同一位置留下了同名文件或符号链接"""
+    stage = os.path.join(sandbox.workdir(slot), STAGE_DIR)
+    _remove(stage)
+    os.mkdir(stage)
+    os.chmod(stage, 0o777)  # 沙箱内的用户要在其中写入编译产物与 checker 的输出
+    return stage
+
+
+def _copy_in(src: str, dest: str) -> None:
+    """复制进暂存目录；src 可能位于选手程序写过的目录，不跟随符号链接，不存在时按空文件处理"""
+    try:
+        fd = os.open(src, os.O_RDONLY | os.O_NOFOLLOW)
+    except OSError:
+        fd = None
+    with open(dest, "wb") as out:
+        if fd is not None:
+            with os.fdopen(fd, "rb") as f:
+                shutil.copyfileobj(f, out)
+
+
+def _read_stage(stage: str, name: str) -> str:
+    try:
+        with _open_text(os.path.join(stage, name)) as f:
+            return f.read(MAX_DIFF_LEN).strip()
+    except OSError:
+        return ""
+
+
+def _build(source: str, include_dir: str, sandbox: Sandbox, slot: int, dest: str) -> None:
+    """在沙箱中编译 checker，成功后把可执行文件放到 dest/checker"""
+    stage = _stage(sandbox, slot)
+    tmp = None
+    try:
+        shutil.copyfile(source, os.path.join(stage, "checker.cpp"))
+        shutil.copyfile(os.path.join(include_dir, "testlib.h"), os.path.join(stage, "testlib.h"))
+        code, meta = sandbox.run(
+            slot, [CHECKER_COMPILER, *CHECKER_FLAGS, f"-I{STAGE_DIR}", "-o", f"{STAGE_DIR}/checker", f"{STAGE_DIR}/checker.cpp"],
+            CHECKER_COMPILE_TIME_LIMIT, COMPILE_MEM_MB,
+            stdout_file=f"{STAGE_DIR}/compile.out", stderr_file=f"{STAGE_DIR}/compile.err")
+        if code != 0:
+            if sandbox.collect_meta(meta).get("status") == "TO":
+                raise CheckerError(f"checker compilation timed out ({CHECKER_COMPILE_TIME_LIMIT:g}s)")
+            raise CheckerError(f"checker compilation failed:\n{_read_stage(stage, 'compile.err')}")
+        tmp = tempfile.mkdtemp(prefix=".tmp-", dir=CHECKER_CACHE_DIR)
+        shutil.copy(os.path.join(stage, "checker"), os.path.join(tmp, "checker"))
+        os.rename(tmp, dest)
+        tmp = None
+    finally:
+        _remove(stage)
+        if tmp:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _compile_testlib(source: str, include_dir: str, sandbox: Sandbox, slot: int) -> Tuple[str, Optional[float]]:
+    """返回 (checker 路径, 本次编译耗时 ms；命中缓存时为 None)"""
+    try:
+        mtime = os.stat(source).st_mtime_ns
+    except OSError:
+        raise CheckerError(f"checker source {os.path.basename(source)} not found")
+    cached = _compiled.get((source, mtime, sandbox.name))
+    if cached and os.path.exists(cached):
+        return cached, None
+
+    # 编译器在沙箱里：isolate / rlimit 与宿主机相同，docker 为镜像中的，产物按后端分开缓存
+    h = hashlib.sha256()
+    h.update(f"{sandbox.name}\0{getattr(sandbox, 'image', '')}\0".encode())
+    h.update(compile_cache.compiler_version(CHECKER_COMPILER).encode())
+    h.update("\0".join(CHECKER_FLAGS).encode())
+    for path in (source, os.path.join(include_dir, "testlib.h")):
+        with open(path, "rb") as f:
+            h.update(f.read())
+    dest = os.path.join(CHECKER_CACHE_DIR, h.hexdigest()[:24])
+    binary = os.path.join(dest, "checker")
+
+    compile_ms = None
+    if not os.path.exists(binary):
+        os.makedirs(CHECKER_CACHE_DIR, exist_ok=True)
+        # 多个 worker 同时遇到同一个新 checker 时只编译一次；锁按 checker 区分，
+        # 编译受沙箱的时间上限约束，不会让其它题目的判题一直等着
+        with open(dest + ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if not os.path.exists(binary):
+                start = time.perf_counter()
+                _build(source, include_dir, sandbox, slot, dest)
+                compile_ms = round((time.perf_counter() - start) * 1000, 3)
+    _compiled[(source, mtime, sandbox.name)] = binary
+    return binary, compile_ms
+
+
+class Checker:
+    def __init__(self, spec: Optional[dict] = None, base_dir: str = ""):
+        spec = spec or {}
+        self.kind = spec.get("type", "exact")
+        if self.kind not in KINDS:
+            raise CheckerError(f"unknown checker type: {self.kind}")
+        self.eps = float(spec.get("eps", 1e-6)) if self.kind == "float" else None
+        self.binary = None
+        self.compile_ms = None
+        if self.kind == "testlib":
+            self.source = os.path.join(base_dir, spec.get("source", "checker.cpp"))
+            self.include_dir = next(
+                (d for d in (base_dir, TESTLIB_DIR) if os.path.exists(os.path.join(d, "testlib.h"))), None)
+            if self.include_dir is None:
+                raise CheckerError("testlib.h not found (upload it with the test data or install it under TESTLIB_DIR)")
+
+    def compile(self, sandbox: Sandbox, slot: int) -> None:
+        """testlib checker 在 slot 中编译（本机已有缓存时跳过）；须在 slot 运行选手程序之前调用"""
+        if self.kind == "testlib":
+            self.binary, self.compile_ms = _compile_testlib(self.source, self.include_dir, sandbox, slot)
+
+    def _run_testlib(self, sandbox: Sandbox, slot: int, input_path: str, output_path: str,
+                     answer_path: str = "", answer: Optional[str] = None) -> Tuple[str, str]:
+        """
+        在 slot 中运行 checker。可执行文件、输入与答案复制到暂存目录，运行后连同目录一起删除，
+        同一个 box 接下来运行的选手程序看不到答案。
+        """
+        stage = _stage(sandbox, slot)
+        try:
+            shutil.copy(self.binary, os.path.join(stage, "checker"))
+            _copy_in(input_path, os.path.join(stage, "input"))
+            if answer is None:
+                shutil.copyfile(answer_path, os.path.join(stage, "answer"))
+            else:
+                with open(os.path.join(stage, "answer"), "w", encoding="utf-8") as f:
+                    f.write(answer)
+            output = os.path.relpath(output_path, sandbox.workdir(slot))
+            if output.startswith(os.pardir) or os.path.islink(output_path):
+                # 选手输出不在这个 slot 里（docker 整份提交判题时 checker 另用一个容器），或被选手程序换成了符号链接
+                output = f"{STAGE_DIR}/output"
+                _copy_in(output_path, os.path.join(stage, "output"))
+            code, meta = sandbox.run(
+                slot, [f"{STAGE_DIR}/checker", f"{STAGE_DIR}/input", output, f"{STAGE_DIR}/answer"],
+                CHECKER_TIME_LIMIT, CHECKER_MEM_MB,
+                stdout_file=f"{STAGE_DIR}/stdout", stderr_file=f"{STAGE_DIR}/message", fsize_kb=64)
+            message = _read_stage(stage, "message")
+        finally:
+            _remove(stage)
+        fields = sandbox.collect_meta(meta)
+        status = fields.get("status")
+        if code == 0 and not status:
+            return "AC", ""
+        if status == "RE" and fields.get("exitcode") in ("1", "2"):
+            return "WA", message
+        return "IE", f"checker failed ({fields.get('message', status)}): {message}"
+
+    def check(self, input_path: str, answer_path: str, output_path: str, answer_digest: Optional[str] = None,
+              sandbox: Optional[Sandbox] = None, slot: int = 0) -> Tuple[str, str]:
+        """
+        比较选手输出文件与标准答案文件，返回 (AC/WA/IE, diff 或 checker 信息)。
+        sandbox / slot：testlib checker 运行的位置（已 compile），内置比较器不使用
+        """
+        if self.kind == "testlib":
+            return self._run_testlib(sandbox, slot, input_path, output_path, answer_path=answer_path)
+        if self.kind == "exact":
+            ok, diff_text = compare_files(answer_path, output_path, answer_digest)
+        elif answer_digest and digest_file(output_path) == answer_digest:
+            # 规范化后完全相同，token / 浮点比较必然通过
+            ok, diff_text = True, ""
+        else:
+            with _open_text(answer_path) as fexp, _open_text(output_path) as fact:
+                ok, diff_text = _compare_tokens(fexp, fact, self.eps)
+        return ("AC" if ok else "WA"), diff_text
+
+    def check_text(self, input_path: str, answer: str, output_path: str,
+                   sandbox: Optional[Sandbox] = None, slot: int = 0) -> Tuple[str, str]:
+        """标准答案在内存中（自测模式）"""
+        if self.kind == "testlib":
+            return self._run_testlib(sandbox, slot, input_path, output_path, answer=answer)
+        if self.kind == "exact":
+            ok, diff_text = compare_text(answer, output_path)
+        else:
+            with _open_text(output_path) as fact:
+                ok, diff_text = _compare_tokens(io.StringIO(answer), fact, self.eps)
+        return ("AC" if ok else "WA"), diff_text
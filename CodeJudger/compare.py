@@ -0,0 +1,189 @@
+# compare.py
+"""
+流式输出比较
+
+与原来的 _normalize 规则一致：忽略每行行尾空白、忽略末尾空行。
+两个文件按块读取、边规范化边比较，遇到第一个不同之处即停止，
+只为出错的那一行生成 diff（长度不超过 MAX_DIFF_LEN），内存占用与输出大小无关。
+"""
+import io
+import os
+import re
+import hashlib
+from typing import Iterator, TextIO, Tuple
+from config import MAX_DIFF_LEN
+
+CHUNK_SIZE = 64 * 1024
+
+# 与 str.splitlines 相同的换行符（\r 与 \r\n 已由文本模式的通用换行转换为 \n）
+_LINE_BREAK = re.compile("[\v\f\x1c\x1d\x1e\x85\u2028\u2029]")
+
+
+def _normalized_chunks(fp: TextIO, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """
+    逐块产出规范化后的文本（只产出非空串）。
+    每块只处理以换行结尾的完整行，未结束的行留到下一块；末尾的换行先挂起，
+    等到后面出现非空内容时才输出，因此末尾空行自然被丢弃。
+    """
+    pending_nl = 0  # 挂起的换行数
+    carry = ""      # 未结束的行
+    while True:
+        data = fp.read(chunk_size)
+        buf = carry + data
+        if not data:
+            content = buf.rstrip()
+            if content:
+                yield "\n" * pending_nl + content
+            return
+
+        buf = _LINE_BREAK.sub("\n", buf)
+        cut = buf.rfind("\n") + 1
+        head, carry = buf[:cut], buf[cut:]
+        if len(carry) > chunk_size:
+            # 超长行：先输出非空白部分，只保留行尾空白
+            content = carry.rstrip()
+            head += content
+            carry = carry[len(content):]
+        if not head:
+            continue
+
+        text = "\n".join(map(str.rstrip, head.split("\n")))
+        content = text.rstrip("\n")
+        if content:
+            yield "\n" * pending_nl + content
+            pending_nl = len(text) - len(content)
+        else:
+            pending_nl += len(text)
+
+
+def _common_prefix_len(a: str, b: str) -> int:
+    n = min(len(a), len(b))
+    if a[:n] == b[:n]:
+        return n
+    lo, hi = 0, n  # a[:lo] == b[:lo]，a[:hi] != b[:hi]
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+
+class _Side:
+    """比较中的一侧：规范化块迭代器 + 未消费的缓冲"""
+
+    def __init__(self, fp: TextIO):
+        self.it = _normalized_chunks(fp)
+        self.buf = ""
+        self.eof = False
+
+    def fill(self) -> None:
+        if not self.buf and not self.eof:
+            self.buf = next(self.it, "")
+            self.eof = not self.buf
+
+    def rest_of_line(self, skip_newline: bool = False) -> str:
+        """从当前位置读到行尾（最多 MAX_DIFF_LEN 个字符），仅用于生成 diff"""
+        text = self.buf[1:] if skip_newline else self.buf
+        while "\n" not in text and len(text) < MAX_DIFF_LEN and not self.eof:
+            chunk = next(self.it, "")
+            if not chunk:
+                self.eof = True
+            text += chunk
+        return text.split("\n", 1)[0][:MAX_DIFF_LEN]
+
+
+def _format_diff(line_no: int, expected: str | None, actual: str | None) -> str:
+    diff_text = (f"Line {line_no}:\n"
+                 f"  Expected: {expected if expected is not None else '<no line>'}\n"
+                 f"  Actual:   {actual if actual is not None else '<no line>'}")
+    if len(diff_text) > MAX_DIFF_LEN:
+        diff_text = diff_text[:MAX_DIFF_LEN] + "\n...[truncated]..."
+    return diff_text
+
+
+def compare_streams(expected: TextIO, actual: TextIO) -> Tuple[bool, str]:
+    """
+    比较两个文本流，返回 (是否一致, diff)。
+    diff 只描述第一处不同所在的行。
+    """
+    exp, act = _Side(expected), _Side(actual)
+    line_no = 1
+    prefix = ""  # 已匹配部分中当前行的内容（只保留末尾 MAX_DIFF_LEN 个字符）
+
+    while True:
+        exp.fill()
+        act.fill()
+        if exp.eof and act.eof:
+            return True, ""
+        k = _common_prefix_len(exp.buf, act.buf)
+        if k:
+            matched = exp.buf[:k]
+            exp.buf, act.buf = exp.buf[k:], act.buf[k:]
+            nl = matched.rfind("\n")
+            if nl >= 0:
+                line_no += matched.count("\n")
+                prefix = matched[nl + 1:]
+            else:
+                prefix += matched
+            prefix = prefix[-MAX_DIFF_LEN:]
+            # 两侧缓冲长度不同，其中一侧消费完后重新填充再比较
+            if not exp.buf or not act.buf:
+                continue
+        break
+
+    # 一侧已结束、另一侧恰好还有更多行：报告多出来的那一行
+    if exp.buf.startswith("\n") and act.eof:
+        return False, _format_diff(line_no + 1, exp.rest_of_line(skip_newline=True), None)
+    if act.buf.startswith("\n") and exp.eof:
+        return False, _format_diff(line_no + 1, None, act.rest_of_line(skip_newline=True))
+
+    # 行很长时只展示不同之处前的一小段上下文
+    context = MAX_DIFF_LEN // 8
+    shown = prefix if len(prefix) <= context else "..." + prefix[-context:]
+    expected_line = None if exp.eof and not prefix else shown + exp.rest_of_line()
+    actual_line = None if act.eof and not prefix else shown + act.rest_of_line()
+    return False, _format_diff(line_no, expected_line, actual_line)
+
+
+def _open_text(path: str) -> TextIO:
+    if path and os.path.exists(path):
+        return open(path, "r", encoding="utf-8", errors="ignore")
+    return io.StringIO("")
+
+
+def _digest(fp: TextIO) -> str:
+    h = hashlib.sha256()
+    for chunk in _normalized_chunks(fp):
+        h.update(chunk.encode("utf-8"))
+    return h.hexdigest()
+
+
+def digest_file(path: str) -> str:
+    """规范化后内容的 sha256，与 manifest 中的 out_digest 同一口径"""
+    with _open_text(path) as fp:
+        return _digest(fp)
+
+
+def digest_text(text: str) -> str:
+    """同 digest_file，标准答案在内存中（自测模式）时使用"""
+    return _digest(io.StringIO(text, newline=None))
+
+
+def compare_files(expected_path: str, actual_path: str, expected_digest: str | None = None) -> Tuple[bool, str]:
+    """
+    比较标准答案文件与选手输出文件；文件不存在按空输出处理。
+    给出 expected_digest（来自 manifest）时先只读选手输出算摘要，
+    一致直接判对，不一致才打开标准答案生成 diff。
+    """
+    if expected_digest and digest_file(actual_path) == expected_digest:
+        return True, ""
+    with _open_text(expected_path) as fexp, _open_text(actual_path) as fact:
+        return compare_streams(fexp, fact)
+
+
+def compare_text(expected: str, actual_path: str) -> Tuple[bool, str]:
+    """标准答案在内存中（自测模式）时的比较"""
+    with _open_text(actual_path) as fact:
+        return compare_streams(io.StringIO(expected, newline=None), fact)
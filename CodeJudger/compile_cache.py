@@ -0,0 +1,135 @@
+# compile_cache.py
+"""
+编译产物缓存（每台判题机一份）
+
+key = sha256(语言, 编译器版本, 编译命令, 源码)
+目录结构: COMPILE_CACHE_DIR/<key>/<产物文件>
+命中时把产物拷贝进 box 并跳过编译；目录 mtime 作为最近使用时间，超出容量按 LRU 淘汰。
+多个 worker 进程并发写同一个 key 时，先写临时目录再 rename，保证条目要么完整要么不存在。
+"""
+import os
+import glob
+import shutil
+import hashlib
+import tempfile
+import subprocess
+from typing import List
+from config import COMPILE_CACHE_DIR, COMPILE_CACHE_MAX_MB
+
+_version_cache = {}
+
+
+def _enabled() -> bool:
+    return COMPILE_CACHE_MAX_MB > 0
+
+
+def compiler_version(compiler: str) -> str:
+    """
+    编译器版本串。以 (真实路径, mtime) 作为缓存键，升级编译器后自动失效。
+    """
+    try:
+        real = os.path.realpath(compiler)
+        stamp = (real, os.stat(real).st_mtime_ns)
+    except OSError:
+        return ""
+    if stamp not in _version_cache:
+        try:
+            proc = subprocess.run([compiler, "--version"], stdout=subprocess.PIPE,
+                                  stderr=subprocess.STDOUT, text=True, timeout=10)
+            _version_cache[stamp] = f"{real}@{stamp[1]}\n{proc.stdout.strip()}"
+        except Exception:
+            _version_cache[stamp] = f"{real}@{stamp[1]}"
+    return _version_cache[stamp]
+
+
+def cache_key(language: str, toolchain: str, compile_cmd: List[str], source_code: str) -> str:
+    """
+    toolchain: 编译环境标识（本机编译器版本串，或 docker 镜像 id）
+    """
+    h = hashlib.sha256()
+    for part in [language, toolchain, " ".join(compile_cmd)]:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    h.update(source_code.encode("utf-8"))
+    return h.hexdigest()
+
+
+def fetch(key: str, dest_dir: str) -> bool:
+    """命中则把产物拷贝到 dest_dir 并返回 True"""
+    if not _enabled():
+        return False
+    entry = os.path.join(COMPILE_CACHE_DIR, key)
+    if not os.path.isdir(entry):
+        return False
+    try:
+        for name in os.listdir(entry):
+            shutil.copy2(os.path.join(entry, name), os.path.join(dest_dir, name))
+        os.utime(entry)  # 更新最近使用时间
+    except OSError:
+        # 条目可能正被淘汰，按未命中处理
+        return False
+    return True
+
+
+def store(key: str, src_dir: str, patterns: List[str]) -> None:
+    """把 src_dir 下匹配 patterns 的产物存入缓存"""
+    if not _enabled():
+        return
+    files = []
+    for pattern in patterns:
+        files.extend(glob.glob(os.path.join(src_dir, pattern)))
+    if not files:
+        return
+
+    os.makedirs(COMPILE_CACHE_DIR, exist_ok=True)
+    entry = os.path.join(COMPILE_CACHE_DIR, key)
+    if os.path.isdir(entry):
+        return
+    tmp = tempfile.mkdtemp(prefix=".tmp_", dir=COMPILE_CACHE_DIR)
+    try:
+        for path in files:
+            shutil.copy2(path, os.path.join(tmp, os.path.basename(path)))
+        os.rename(tmp, entry)
+    except OSError:
+        # 其他进程已经写入同一个 key
+        shutil.rmtree(tmp, ignore_errors=True)
+        return
+    _evict(keep=entry)
+
+
+def _entry_size(entry: str) -> int:
+    total = 0
+    for name in os.listdir(entry):
+        try:
+            total += os.path.getsize(os.path.join(entry, name))
+        except OSError:
+            pass
+    return total
+
+
+def _evict(keep: str) -> None:
+    """总大小超过 COMPILE_CACHE_MAX_MB 时，从最久未使用的条目开始删除（keep 为刚写入的条目）"""
+    budget = COMPILE_CACHE_MAX_MB * 1024 * 1024
+    entries = []
+    total = 0
+    for name in os.listdir(COMPILE_CACHE_DIR):
+        if name.startswith(".tmp_"):
+            continue
+        entry = os.path.join(COMPILE_CACHE_DIR, name)
+        try:
+            size = _entry_size(entry)
+            entries.append((os.stat(entry).st_mtime, size, entry))
+        except OSError:
+            continue
+        total += size
+
+    if total <= budget:
+        return
+    entries.sort()
+    for _, size, entry in entries:
+        if total <= budget:
+            break
+        if entry == keep:
+            continue
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
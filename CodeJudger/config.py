@@ -4,11 +4,68 @@ import os
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 QUEUE_KEY = os.getenv("QUEUE_KEY", "judge:queue")
 SUB_HASH_PREFIX = os.getenv("SUB_HASH_PREFIX", "judge:sub:")  # 状态存储 hash 前缀
+RESULT_TTL_SEC = int(os.getenv("RESULT_TTL_SEC", str(7 * 86400)))      # 判题结果 hash 保留时间（结果已回调写入后端数据库）
+SELFTEST_TTL_SEC = int(os.getenv("SELFTEST_TTL_SEC", "3600"))          # 自测结果只供轮询，保留 1 小时
+# 大字段：源码/自测数据按内容存为 blob，任务 JSON 只放引用；较大的结果压缩存储（见 blobs.py）
+BLOB_PREFIX = os.getenv("BLOB_PREFIX", "judge:blob:")
+BLOB_TTL_SEC = int(os.getenv("BLOB_TTL_SEC", str(7 * 86400)))         # 须长于任务最长排队时间（批量重判）
+BLOB_MIN_BYTES = int(os.getenv("BLOB_MIN_BYTES", "1024"))              # 小于该长度的字段直接放在任务里
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "512"))       # 小于该长度不压缩
+# 判题结果缓存：相同 源码 + 语言 + 限制 + 测试数据版本 直接复用结果（见 result_cache.py）
+RESULT_CACHE_PREFIX = os.getenv("RESULT_CACHE_PREFIX", "judge:result:")
+RESULT_CACHE_TTL_SEC = int(os.getenv("RESULT_CACHE_TTL_SEC", str(86400)))  # 0 表示关闭结果缓存
+
+# 优先级队列（lane），按优先级从高到低；每个 lane 对应 Redis 列表 QUEUE_KEY:<lane>
+#   selftest: 出题自测  deadline: 临近截止的题单提交  live: 普通提交  rejudge: 批量重判
+QUEUE_LANES = ["selftest", "deadline", "live", "rejudge"]
+DEFAULT_LANE = "live"
+# 加权轮转：每 sum(weights) 次取任务中，各 lane 被优先尝试的次数，例如 "selftest:8,deadline:6,live:4,rejudge:1"
+LANE_WEIGHTS = {
+    lane: int(weight)
+    for lane, weight in (item.split(":") for item in os.getenv("LANE_WEIGHTS", "selftest:8,deadline:6,live:4,rejudge:1").split(","))
+}
+# 同一 lane 内按提交用户轮转；可选限制单个用户的在途提交数（排队 + 判题中），0 表示不限制
+MAX_INFLIGHT_PER_USER = int(os.getenv("MAX_INFLIGHT_PER_USER", "0"))
+INFLIGHT_CAP_LANES = ["deadline", "live"]                              # 受限的 lane（自测与批量重判不受限）
+INFLIGHT_STALE_SEC = int(os.getenv("INFLIGHT_STALE_SEC", "1800"))      # 超过该时长仍未释放的名额视为泄漏，自动清除
+
+# 可靠队列：worker 心跳过期时，由回收器把它手上的任务放回队列
+HEARTBEAT_INTERVAL = int(os.getenv("HEARTBEAT_INTERVAL", "5"))    # 心跳间隔（秒）
+HEARTBEAT_TTL = int(os.getenv("HEARTBEAT_TTL", "20"))             # 心跳键过期时间（秒），超过即认为 worker 已失联
+REAP_INTERVAL = int(os.getenv("REAP_INTERVAL", "15"))             # 回收器执行间隔（秒）
+# 墙钟兜底与看门狗（见 watchdog.py）：sleep / 阻塞读不消耗 CPU 时间，只限 CPU 时间时会一直占着 worker
+WALL_TIME_FACTOR = float(os.getenv("WALL_TIME_FACTOR", "3"))      # 单次运行的墙钟上限 = maxTime * WALL_TIME_FACTOR + WALL_TIME_EXTRA
+WALL_TIME_EXTRA = float(os.getenv("WALL_TIME_EXTRA", "1"))
+SUBMISSION_BUDGET_SEC = int(os.getenv("SUBMISSION_BUDGET_SEC", "300"))  # 单个提交的判题总时长上限，超过由看门狗判为 IE 并重启 worker
+MAX_JOB_ATTEMPTS = int(os.getenv("MAX_JOB_ATTEMPTS", "3"))        # 同一任务最多被领取的次数，用尽后判为 IE
 
 # 并发
-WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "4"))   # worker 进程数
+# worker 数由 supervisor 按积压、空闲核数与可用内存动态调整（见 supervisor.py）
+MIN_WORKERS = int(os.getenv("MIN_WORKERS", "1"))                                # 常驻 worker 数
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", os.getenv("WORKER_PROCESSES", "0")))  # 额外上限，0 表示只按核数/内存/box 数限制
+RESERVED_CORES = int(os.getenv("RESERVED_CORES", "1"))                          # 留给系统、Redis、回调进程的核数
+# CPU 绑定（见 cpus.py）：每个 worker 及其沙箱固定在专属的核上，杂务进程/线程放在保留核上；核列表格式如 "0-1,4"
+CPU_PINNING = os.getenv("CPU_PINNING", "1") == "1"
+HOUSEKEEPING_CPUS = os.getenv("HOUSEKEEPING_CPUS", "")  # 空表示可用核中的前 RESERVED_CORES 个
+JUDGE_CPUS = os.getenv("JUDGE_CPUS", "")                # 空表示其余可用核
+WORKER_MEM_MB = int(os.getenv("WORKER_MEM_MB", "512"))                          # 每个 worker 预估占用（含选手程序），扩容前检查可用内存
+MEM_HEADROOM_MB = int(os.getenv("MEM_HEADROOM_MB", "512"))                      # 扩容后至少保留的可用内存
+# 内存准入（见 mem_budget.py）：同一台机上所有 worker 判题中的提交，预留内存之和不超过节点预算
+NODE_MEM_BUDGET_MB = os.getenv("NODE_MEM_BUDGET_MB", "")                        # 空表示 MemTotal - MEM_HEADROOM_MB，0 表示不做准入控制
+COMPILE_HEADROOM_MB = int(os.getenv("COMPILE_HEADROOM_MB", "1024"))             # 需要编译的语言额外预留（与沙箱的编译内存上限一致）
+ADMISSION_WAIT_SEC = float(os.getenv("ADMISSION_WAIT_SEC", "5"))                # 放不下时原地等待的时长，超时后放回队列
+ADMISSION_HOLD_SEC = float(os.getenv("ADMISSION_HOLD_SEC", "60"))                # 放回队列的提交在本机保留等待位置的时长，期间后来的提交不能占用它等着的内存
+SUPERVISOR_INTERVAL = float(os.getenv("SUPERVISOR_INTERVAL", "2"))              # 监管循环间隔（秒）
+SCALE_DOWN_IDLE_SEC = int(os.getenv("SCALE_DOWN_IDLE_SEC", "60"))               # 队列空闲多久后开始缩容（每次一个）
+ISOLATE_BIN = os.getenv("ISOLATE_BIN", "isolate")                   # isolate 可执行文件；基准测试可指向 fake_isolate.py
+ISOLATE_BOX_ROOT = os.getenv("ISOLATE_BOX_ROOT", "/var/lib/isolate")  # 须与 isolate 配置中的 box_root 一致
 BOX_ID_START = int(os.getenv("BOX_ID_START", "100"))         # isolate box-id 起始（避免冲突）
+BOX_ID_COUNT = int(os.getenv("BOX_ID_COUNT", "64"))          # 本机可分配的 box 数：BOX_ID_START 起连续 BOX_ID_COUNT 个
+BOX_LOCK_DIR = os.getenv("BOX_LOCK_DIR", "/tmp/oj-judger-boxes")  # box 租约锁文件目录
+BOX_POOL_SIZE = int(os.getenv("BOX_POOL_SIZE", "2"))         # 每个 worker 预初始化的 box 数
+PARALLEL_BOXES = int(os.getenv("PARALLEL_BOXES", "1"))       # 单个提交并行跑测试点的 box 数，1 表示串行
 # 注意：同一台机所有进程的 box-id 必须唯一，且在 0..999 范围内
+# box 统一由 box_alloc 按锁文件租用，worker 池与并行辅助 box 都从中分配
 
 # 判题限制（可在题目 limitations 里覆盖）
 DEFAULT_TIME_LIMIT = float(os.getenv("DEFAULT_TIME_LIMIT", "2.0"))    # seconds
@@ -17,7 +74,48 @@ DEFAULT_OUTPUT_LIMIT_KB = int(os.getenv("DEFAULT_OUTPUT_LIMIT_KB", "4096"))  # i
 
 # 题目数据目录
 PROJECT_ROOT = os.path.dirname(os.getcwd())
-DATA_DIR = os.path.join(PROJECT_ROOT, "data")
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(PROJECT_ROOT, "data"))
 
 MAX_DIFF_LEN = 1024
 
+# 编译产物缓存（按 语言 + 编译器版本/参数 + 源码哈希 寻址，LRU 淘汰）
+COMPILE_CACHE_DIR = os.getenv("COMPILE_CACHE_DIR", os.path.join(PROJECT_ROOT, "cache", "compile"))
+COMPILE_CACHE_MAX_MB = int(os.getenv("COMPILE_CACHE_MAX_MB", "1024"))  # 0 表示关闭缓存
+
+# C++ <bits/stdc++.h> 预编译头（按 编译器版本 + 编译参数 生成，见 pch.py）
+PCH_DIR = os.getenv("PCH_DIR", os.path.join(PROJECT_ROOT, "cache", "pch"))
+PCH_ENABLED = os.getenv("PCH_ENABLED", "1") == "1"
+
+
+# 特殊评测（checker，见 checkers.py）
+CHECKER_CACHE_DIR = os.getenv("CHECKER_CACHE_DIR", os.path.join(PROJECT_ROOT, "cache", "checkers"))  # 编译好的 checker
+TESTLIB_DIR = os.getenv("TESTLIB_DIR", "/opt/judge/testlib")      # 本机 testlib.h 所在目录；题目数据自带 testlib.h 时优先使用
+CHECKER_TIME_LIMIT = float(os.getenv("CHECKER_TIME_LIMIT", "10"))  # 单次 checker 运行的 CPU 时间上限（秒）
+CHECKER_COMPILE_TIME_LIMIT = float(os.getenv("CHECKER_COMPILE_TIME_LIMIT", "30"))  # 在沙箱中编译 checker 的 CPU 时间上限（秒），testlib.h 较大
+CHECKER_MEM_MB = int(os.getenv("CHECKER_MEM_MB", "1024"))
+
+# 回调发件箱（见 callbacks.py）
+CALLBACK_BATCH_SIZE = int(os.getenv("CALLBACK_BATCH_SIZE", "100"))     # 每批最多合并的提交数
+CALLBACK_TIMEOUT = float(os.getenv("CALLBACK_TIMEOUT", "10"))          # 单次 HTTP 请求超时（秒）
+CALLBACK_CLAIM_SEC = int(os.getenv("CALLBACK_CLAIM_SEC", "30"))        # 领取后多久未确认可被其他发送进程重新领取
+CALLBACK_MAX_ATTEMPTS = int(os.getenv("CALLBACK_MAX_ATTEMPTS", "20"))  # 连续失败多少次后丢弃（退避上限 60 秒）
+
+# 沙箱后端（见 sandbox.py）：isolate / docker / rlimit，每台节点可按语言分别配置
+SANDBOX_BACKENDS = dict(
+    item.split(":") for item in os.getenv("SANDBOX_BACKENDS", "cpp:isolate,python:isolate,java:docker").split(",")
+)
+DEFAULT_SANDBOX = os.getenv("DEFAULT_SANDBOX", "isolate")                     # SANDBOX_BACKENDS 未列出的语言
+DOCKER_IMAGE = os.getenv("DOCKER_IMAGE", "judge_env")                         # docker 后端使用的镜像
+RLIMIT_SANDBOX_ROOT = os.getenv("RLIMIT_SANDBOX_ROOT", "/tmp/oj-judger-rlimit")  # rlimit 后端的工作目录根
+ALLOW_UNISOLATED_SANDBOX = os.getenv("ALLOW_UNISOLATED_SANDBOX", "0") == "1"  # 允许 SANDBOX_BACKENDS 选用 rlimit（无文件系统/用户隔离，仅限可信代码）
+
+# Docker 判题的预热容器池（见 container_pool.py）
+WARM_CONTAINERS = int(os.getenv("WARM_CONTAINERS", "1"))          # 每个 worker 每个镜像预热的容器数，0 表示每次 docker run
+CONTAINER_MAX_JOBS = int(os.getenv("CONTAINER_MAX_JOBS", "50"))   # 单个容器最多复用次数
+CONTAINER_WORK_ROOT = os.getenv("CONTAINER_WORK_ROOT", "/tmp/oj-judger-containers")  # 容器工作目录（挂载为 /app）
+
+# Java：JVM 参数、AppCDS 归档与单 JVM harness（见 jvm.py、judge_env/JudgeHarness.java）
+JAVA_SUPPORT_DIR = os.getenv("JAVA_SUPPORT_DIR", "/opt/judge")    # harness 与 java.jsa 所在目录（镜像内 / 宿主机）
+JAVA_NONHEAP_MB = int(os.getenv("JAVA_NONHEAP_MB", "64"))         # maxMemory 中留给元空间、代码缓存、线程栈的部分
+JAVA_STACK_MB = int(os.getenv("JAVA_STACK_MB", "64"))             # 选手 main 线程栈大小（独立 JVM 的 -Xss 与 harness 相同）
+JAVA_HARNESS = os.getenv("JAVA_HARNESS", "1") == "1"              # Docker 判题时所有测试点先在同一个 JVM 中运行
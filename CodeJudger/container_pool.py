@@ -0,0 +1,184 @@
+# container_pool.py
+"""
+Docker 判题的预热容器池（每个 worker 私有）
+
+每个镜像保持 WARM_CONTAINERS 个已启动的容器（无网络、只读根文件系统、/tmp 为 tmpfs、限制 pids/内存），
+宿主机工作目录挂载为 /app。容器不挂载题目数据目录：判题时只把本次要运行的输入文件复制到 /app/data，
+标准输出留在宿主机上，选手程序读不到任何题目的答案（见 docker_judge.py）。
+判题时把源码与脚本写进工作目录，docker update 调整内存上限后 docker exec 执行，省去每次 docker run 的启动开销。
+用完后杀掉容器内残留进程、清空 /tmp 与工作目录；执行 CONTAINER_MAX_JOBS 次或出现任何异常迹象
+（exec 返回非 0、清理失败、容器已退出）就销毁重建，重建在后台线程完成。
+
+容器的 1 号进程在 /app/.lease 超过 1 分钟未更新时退出（--rm 自动删除），
+池的后台线程定期 touch 该文件；worker 崩溃后遗留的容器因此会自行回收。
+"""
+import os
+import time
+import uuid
+import queue
+import shutil
+import threading
+import subprocess
+from typing import Dict, List, Optional, Tuple
+from config import (DEFAULT_MEM_LIMIT_MB, WARM_CONTAINERS, CONTAINER_MAX_JOBS, CONTAINER_WORK_ROOT)
+import cpus
+
+LEASE_FILE = ".lease"
+_IDLE_LOOP = f'while [ -n "$(find /app/{LEASE_FILE} -mmin -1 2>/dev/null)" ]; do sleep 5; done'
+_CLEANUP = "kill -9 -1 2>/dev/null; rm -rf /tmp/* /tmp/.[!.]* 2>/dev/null; true"
+
+
+def _docker(*args: str, timeout: float = 60) -> subprocess.CompletedProcess:
+    return subprocess.run(["docker", *args], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          text=True, timeout=timeout)
+
+
+def _clear_dir(path: str) -> None:
+    for name in os.listdir(path):
+        if name == LEASE_FILE:
+            continue
+        full = os.path.join(path, name)
+        if os.path.isdir(full) and not os.path.islink(full):
+            shutil.rmtree(full, ignore_errors=True)
+        else:
+            os.unlink(full)
+
+
+class WarmContainer:
+    def __init__(self, image: str):
+        self.image = image
+        self.name = f"oj-warm-{uuid.uuid4().hex[:12]}"
+        self.workdir = os.path.join(CONTAINER_WORK_ROOT, self.name)
+        self.mem_mb = DEFAULT_MEM_LIMIT_MB
+        self.cpuset = None
+        self.jobs = 0
+
+    def start(self) -> bool:
+        os.makedirs(self.workdir, exist_ok=True)
+        open(os.path.join(self.workdir, LEASE_FILE), "w").close()
+        proc = _docker(
+            "run", "-d", "--rm", "--name", self.name,
+            "--network=none",
+            f"--memory={self.mem_mb}m",
+            f"--memory-swap={self.mem_mb}m",
+            "--pids-limit=128",
+            "--read-only", "--tmpfs", "/tmp:rw,exec,size=64m",
+            "-v", f"{self.workdir}:/app:rw",
+            "-w", "/app",
+            self.image, "bash", "-c", _IDLE_LOOP,
+        )
+        if proc.returncode != 0:
+            print(f"[ContainerPool] failed to start {self.image}: {proc.stderr.strip()}")
+        return proc.returncode == 0
+
+    def set_limits(self, mem_mb: int, cpuset: Optional[str] = None) -> bool:
+        """调整内存上限与绑定的核（cpuset 为 None 表示不绑定），与当前相同时不调用 docker"""
+        args = []
+        if mem_mb != self.mem_mb:
+            args += [f"--memory={mem_mb}m", f"--memory-swap={mem_mb}m"]
+        if cpuset and cpuset != self.cpuset:
+            args.append(f"--cpuset-cpus={cpuset}")
+        if not args:
+            return True
+        proc = _docker("update", *args, self.name)
+        if proc.returncode == 0:
+            self.mem_mb = mem_mb
+            self.cpuset = cpuset or self.cpuset
+        return proc.returncode == 0
+
+    def exec(self, shell_cmd: str, timeout: Optional[float] = None,
+             input: Optional[str] = None) -> subprocess.CompletedProcess:
+        """
+        超过 timeout 秒抛 subprocess.TimeoutExpired，此时容器内可能仍有进程，调用方须把容器标记为不可复用。
+        input 作为命令的标准输入（docker exec -i）
+        """
+        self.jobs += 1
+        interactive = ["-i"] if input is not None else []
+        return subprocess.run(["docker", "exec", *interactive, "-w", "/app", self.name, "bash", "-lc", shell_cmd],
+                              input=input, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                              timeout=timeout)
+
+    def reset(self) -> bool:
+        """清理一次判题留下的痕迹，失败说明容器已不可信"""
+        try:
+            if _docker("exec", self.name, "bash", "-c", _CLEANUP, timeout=10).returncode != 0:
+                return False
+            _clear_dir(self.workdir)
+        except (OSError, subprocess.TimeoutExpired):
+            return False
+        return True
+
+    def destroy(self) -> None:
+        try:
+            _docker("rm", "-f", self.name, timeout=30)
+        except subprocess.TimeoutExpired:
+            pass
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class ContainerPool:
+    def __init__(self, size: int = WARM_CONTAINERS):
+        self._size = size
+        self._ready: Dict[str, "queue.Queue[WarmContainer]"] = {}
+        self._dirty: "queue.Queue[Tuple[WarmContainer, bool]]" = queue.Queue()
+        self._live: List[WarmContainer] = []
+        self._mutex = threading.Lock()
+        threading.Thread(target=self._recycle_loop, daemon=True).start()
+        threading.Thread(target=self._lease_loop, daemon=True).start()
+
+    @property
+    def enabled(self) -> bool:
+        return self._size > 0
+
+    def _spawn(self, image: str) -> None:
+        c = WarmContainer(image)
+        with self._mutex:
+            self._live.append(c)  # 启动中的也计入，避免重复补足
+        if c.start():
+            self._ready[image].put(c)
+        else:
+            self._retire(c)
+
+    def _retire(self, c: WarmContainer) -> None:
+        with self._mutex:
+            if c in self._live:
+                self._live.remove(c)
+        c.destroy()
+
+    def _recycle_loop(self):
+        cpus.pin_housekeeping()
+        while True:
+            c, healthy = self._dirty.get()
+            if healthy and c.jobs < CONTAINER_MAX_JOBS and c.reset():
+                self._ready[c.image].put(c)
+                continue
+            self._retire(c)
+            self._spawn(c.image)
+
+    def _lease_loop(self):
+        cpus.pin_housekeeping()
+        while True:
+            with self._mutex:
+                live = list(self._live)
+            for c in live:
+                try:
+                    os.utime(os.path.join(c.workdir, LEASE_FILE))
+                except OSError:
+                    pass
+            time.sleep(10)
+
+    def acquire(self, image: str, timeout: float = 30) -> WarmContainer:
+        """
+        取一个预热好的容器；首次使用某镜像（或之前启动失败）时在后台补足，
+        timeout 秒内拿不到抛 queue.Empty，由调用方退回冷启动
+        """
+        self._ready.setdefault(image, queue.Queue())
+        with self._mutex:
+            missing = self._size - sum(1 for c in self._live if c.image == image)
+        for _ in range(missing):
+            threading.Thread(target=self._spawn, args=(image,), daemon=True).start()
+        return self._ready[image].get(timeout=timeout)
+
+    def release(self, c: WarmContainer, healthy: bool = True) -> None:
+        """交还容器；healthy=False 时直接销毁重建"""
+        self._dirty.put((c, healthy))
@@ -0,0 +1,103 @@
+# cpus.py
+"""
+CPU 绑定
+
+多个 worker 及其沙箱抢同一批核时，选手程序的 CPU 时间会随负载抖动，造成误判 TLE。
+可用核（supervisor 启动时的 affinity）分为两部分：
+- 杂务核 HOUSEKEEPING_CPUS：supervisor、回调发送进程、box 重置 / 容器回收等后台线程
+- 判题核 JUDGE_CPUS：按 PARALLEL_BOXES 个一组切成 slot，每个 worker 用文件锁租一个 slot，
+  worker 主线程（以及由它启动的 isolate / rlimit 沙箱进程）绑定在该 slot 上；docker 后端通过 --cpuset-cpus 绑定
+租不到 slot（worker 数超过 slot 数）时绑定到全部判题核。
+Linux 上 affinity 按线程生效，后台线程各自调用 pin_housekeeping() 不影响 worker 主线程。
+"""
+import os
+import fcntl
+import threading
+from typing import Dict, List, Optional, Tuple
+from config import CPU_PINNING, HOUSEKEEPING_CPUS, JUDGE_CPUS, RESERVED_CORES, PARALLEL_BOXES, BOX_LOCK_DIR
+
+try:
+    _ORIGINAL = sorted(os.sched_getaffinity(0))  # 导入时（绑定之前）的可用核，fork 出的 worker 沿用
+except AttributeError:
+    _ORIGINAL = list(range(os.cpu_count() or 1))
+
+_held: Dict[int, int] = {}  # slot -> 锁文件 fd
+_mutex = threading.Lock()
+
+
+def parse_cpu_list(spec: str) -> List[int]:
+    """"0-3,6" -> [0, 1, 2, 3, 6]"""
+    cpus = set()
+    for part in spec.replace(" ", "").split(","):
+        if not part:
+            continue
+        lo, _, hi = part.partition("-")
+        cpus.update(range(int(lo), int(hi or lo) + 1))
+    return sorted(cpus)
+
+
+def format_cpu_list(cpus: List[int]) -> str:
+    return ",".join(str(c) for c in sorted(cpus))
+
+
+def layout() -> Tuple[List[int], List[int]]:
+    """(杂务核, 判题核)"""
+    house = parse_cpu_list(HOUSEKEEPING_CPUS) if HOUSEKEEPING_CPUS else _ORIGINAL[:RESERVED_CORES]
+    judge = parse_cpu_list(JUDGE_CPUS) if JUDGE_CPUS else [c for c in _ORIGINAL if c not in house]
+    return house, judge or _ORIGINAL
+
+
+def judge_slots() -> List[List[int]]:
+    _, judge = layout()
+    size = max(1, PARALLEL_BOXES)
+    return [judge[i:i + size] for i in range(0, len(judge) - size + 1, size)]
+
+
+def _try_lease_slot() -> Optional[List[int]]:
+    os.makedirs(BOX_LOCK_DIR, exist_ok=True)
+    with _mutex:
+        for slot, cpus in enumerate(judge_slots()):
+            if slot in _held:
+                continue
+            fd = os.open(os.path.join(BOX_LOCK_DIR, f"cpu-{slot}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                continue
+            _held[slot] = fd
+            return cpus
+    return None
+
+
+def pin(cpus: List[int]) -> bool:
+    """把调用线程（及之后由它创建的线程、子进程）绑定到 cpus"""
+    try:
+        os.sched_setaffinity(0, cpus)
+        return True
+    except (AttributeError, OSError) as e:
+        print(f"[cpus] failed to pin to {format_cpu_list(cpus)}: {e}")
+        return False
+
+
+def pin_worker() -> List[int]:
+    """worker 启动时在主线程调用，返回绑定的核（未启用时为空）"""
+    if not CPU_PINNING:
+        return []
+    cpus = _try_lease_slot() or layout()[1]
+    return cpus if pin(cpus) else []
+
+
+def pin_housekeeping() -> None:
+    if CPU_PINNING:
+        pin(layout()[0] or _ORIGINAL)
+
+
+def cpuset() -> Optional[str]:
+    """docker --cpuset-cpus 的取值：调用线程当前绑定的核；未启用时为 None"""
+    if not CPU_PINNING:
+        return None
+    try:
+        return format_cpu_list(list(os.sched_getaffinity(0)))
+    except AttributeError:
+        return None
@@ -1,13 +1,55 @@
 # docker_judge.py
 import os
+import time
 import shlex
 import json
+import queue
+import glob
+import inspect
+import shutil
+import secrets
 import tempfile
 import subprocess
 from datetime import datetime
 from typing import List, Dict, Optional, Tuple
-from glob import glob
 from config import *
+import compile_cache
+from testdata import load_testcases, load_checker, load_groups
+from checkers import Checker, CheckerError
+import compare
+from compare import digest_file, digest_text
+import groups as test_groups
+from judge import _skip_after_first_failure
+from container_pool import ContainerPool
+from jvm import jvm_flags, classpath, parse_harness_meta, HARNESS_CLASS
+from sandbox import wall_time_limit, COMPILE_TIME_LIMIT
+import sandbox as sandboxes
+import cpus
+
+# ACM 提前停止时容器内计算选手输出摘要的脚本：直接使用 compare.py 的规范化代码，与宿主机的 digest_file 完全同一口径。
+# 常驻进程，每行读入一个文件路径，输出其摘要（读不到输出空行，不据此停止）
+_DIGEST_PY = "\n".join([
+    "import hashlib, io, os, re, sys",
+    "from typing import Iterator, TextIO",
+    f"CHUNK_SIZE = {compare.CHUNK_SIZE}",
+    f"_LINE_BREAK = re.compile({compare._LINE_BREAK.pattern!r})",
+    inspect.getsource(compare._normalized_chunks),
+    inspect.getsource(compare._digest),
+    "for line in sys.stdin:",
+    "    path = line.rstrip('\\n')",
+    "    try:",
+    "        with open(path, 'r', encoding='utf-8', errors='ignore') as fp:",
+    "            print(_digest(fp), flush=True)",
+    "    except FileNotFoundError:",
+    "        print(_digest(io.StringIO('')), flush=True)",
+    "    except OSError:",
+    "        print('', flush=True)",
+])
+# 容器内提前停止时写入停止处的测试点名，之后的测试点没有运行
+ACM_STOP_FILE = "acm_stopped.txt"
+
+# testlib checker 在 docker 后端中使用的 slot（每个 worker 进程同一时间只判一份提交）
+CHECKER_SLOT = -1
 
 class JudgeError(Exception):
     pass
@@ -23,22 +65,15 @@ def _truncate_text(text: str, max_kb: int):
         return text
     return enc[:max_bytes].decode('utf-8', errors='ignore')
 
-def _get_diff(expected: str, actual: str) -> str:
-    expected_lines = expected.rstrip().splitlines()
-    actual_lines = actual.rstrip().splitlines()
-    diffs = []
-    for i in range(max(len(expected_lines), len(actual_lines))):
-        e = expected_lines[i] if i < len(expected_lines) else None
-        a = actual_lines[i] if i < len(actual_lines) else None
-        if e != a:
-            diffs.append(f"Line {i+1}:\n  Expected: {e if e is not None else '<no line>'}\n  Actual:   {a if a is not None else '<no line>'}")
-        if len("\n".join(diffs)) > MAX_DIFF_LEN:
-            diffs = ["[diff truncated]"]
-            break
-    return "\n".join(diffs)
-
-def _normalize(s: str) -> str:
-    return "\n".join([line.rstrip() for line in s.rstrip().splitlines()])
+def _stage_inputs(workdir: str, datadir: str, file_tests: List[Tuple]) -> None:
+    """
+    把本次要运行的输入文件复制到工作目录的 data/（容器内为 /app/data）。
+    不挂载题目数据目录，标准输出留在宿主机上；复制而不是硬链接，选手程序改写 /app/data 不会影响原数据。
+    """
+    stage = os.path.join(workdir, "data")
+    os.makedirs(stage, exist_ok=True)
+    for (name, in_basename, out_abs, out_digest) in file_tests:
+        shutil.copyfile(os.path.join(datadir, in_basename), os.path.join(stage, in_basename))
 
 def _run_docker_shell(
     image: str,
@@ -75,22 +110,19 @@ def _run_docker_shell(
     _safe_write(os.path.join(workdir, "docker_stderr.txt"), _truncate_text(stderr, DEFAULT_OUTPUT_LIMIT_KB))
     return proc.returncode, stdout, stderr
 
-def _collect_test_files(problem_id: int) -> Tuple[List[Tuple[str,str,str]], str]:
-    """
-    返回 ( [(name, in_filename, out_filepath), ...], base_dir )
-    in_filename 仅是文件名 (basename)，out_filepath 是宿主机绝对路径
-    """
-    base = os.path.join(DATA_DIR, str(problem_id))
-    if not os.path.isdir(base):
-        return [], base
-    ins = sorted(glob(os.path.join(base, "*.in")))
-    dataset = []
-    for in_path in ins:
-        name = os.path.splitext(os.path.basename(in_path))[0]
-        out_path = os.path.join(base, f"{name}.out")
-        if os.path.exists(out_path):
-            dataset.append((name, os.path.basename(in_path), out_path))
-    return dataset, base
+_image_ids: Dict[str, Tuple[float, str]] = {}
+
+def _image_id(image: str, ttl_sec: float = 60.0) -> str:
+    """镜像 id（作为编译缓存的工具链标识），短时间缓存避免每次都 docker inspect"""
+    now = datetime.now().timestamp()
+    cached = _image_ids.get(image)
+    if cached and now - cached[0] < ttl_sec:
+        return cached[1]
+    proc = subprocess.run(["docker", "image", "inspect", "-f", "{{.Id}}", image],
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    image_id = proc.stdout.strip() if proc.returncode == 0 else image
+    _image_ids[image] = (now, image_id)
+    return image_id
 
 def judge_submission_docker(
     image: str,
@@ -99,21 +131,57 @@ def judge_submission_docker(
     source_code: str,
     limitations: Dict,
     test_cases: Optional[List[Dict]] = None,
-    keep_workdir: bool = False
+    keep_workdir: bool = False,
+    pool: Optional[ContainerPool] = None,
+    reused: Optional[Dict[str, str]] = None
 ):
     """
     Single-container judge: compile (if needed) and run all tests inside one docker run.
     - image: docker 镜像名（需包含 python3, g++, javac/java, /usr/bin/time, timeout）
-    - test_cases is None => file mode, will mount DATA_DIR/<problem_id> as /app/data:ro
+    - test_cases is None => file mode, the inputs of DATA_DIR/<problem_id> are copied into workdir/data (/app/data)
     - test_cases provided => memory mode, the inputs will be written into workdir and mounted to /app
+    - expected outputs never enter the container; ACM early stop compares against their digests
     - keep_workdir=True -> do not delete workdir for debugging
+    - pool: 预热容器池，取到容器时用 docker exec 代替 docker run
+    - reused: 文件模式下沿用旧结果、不运行的测试点 -> 旧状态（增量重判，见 incremental.py）；
+      沿用的测试点失败时，同组及依赖该组的测试点也不运行
     """
     time_limit = float(limitations.get("maxTime", DEFAULT_TIME_LIMIT))
     mem_mb = int(limitations.get("maxMemory", DEFAULT_MEM_LIMIT_MB))
     fsize_kb = int(limitations.get("maxOutput", DEFAULT_OUTPUT_LIMIT_KB))
+    # judgeMode "acm": the script stops at the first failed case, the rest are reported as Skipped
+    fail_fast = str(limitations.get("judgeMode", "oi")).lower() == "acm"
+
+    judge_start = time.perf_counter()
+    # 各阶段墙钟耗时（ms）；编译（compile_ms）单独一次 exec/run，所有测试点在另一次 exec/run 中完成，只能整体计时（exec_ms）
+    timings = {}
+    try:
+        checker = Checker(load_checker(problem_id), os.path.join(DATA_DIR, str(problem_id))) if problem_id else Checker()
+    except CheckerError as e:
+        return {"status": "IE", "score": 0, "cases": [], "message": str(e)}
+    # 容器内只能按逐行精确比较决定是否提前停止；其它 checker 跑完全部测试点，判定后再标记 Skipped
+    stop_in_container = fail_fast and checker.kind == "exact"
+    # testlib checker 不进入选手的容器（答案不能出现在选手程序能看到的地方），另取一个容器编译、运行
+    checker_sandbox = sandboxes.get("docker") if checker.kind == "testlib" else None
+    # 优先使用预热容器；取不到或调整内存上限/绑定的核失败时退回 docker run
+    container = None
+    container_healthy = False
+    if pool is not None and pool.enabled and not keep_workdir:
+        try:
+            container = pool.acquire(image)
+        except queue.Empty:
+            container = None
+        if container is not None and not container.set_limits(mem_mb, cpus.cpuset()):
+            pool.release(container, healthy=False)
+            container = None
+        container_healthy = container is not None
+        timings["container_acquire_ms"] = round((time.perf_counter() - judge_start) * 1000, 3)
 
     # prepare workdir
-    if keep_workdir:
+    if container is not None:
+        workdir = container.workdir
+        temp_created = False
+    elif keep_workdir:
         workdir = os.path.abspath(f"./docker_judge_keep_{int(datetime.now().timestamp())}")
         os.makedirs(workdir, exist_ok=True)
         temp_created = False
@@ -122,21 +190,47 @@ def judge_submission_docker(
         temp_created = True
 
     try:
+        if checker_sandbox is not None:
+            checker_sandbox.prepare(CHECKER_SLOT)
+            try:
+                checker.compile(checker_sandbox, CHECKER_SLOT)
+            except CheckerError as e:
+                return {"status": "IE", "score": 0, "cases": [], "message": str(e)}
+            if checker.compile_ms is not None:
+                timings["checker_compile_ms"] = checker.compile_ms
+
         use_file_mode = test_cases is None
         file_tests = []
         datadir = ""
+        groups = None
+        blocked = []  # 因沿用的测试点失败而不运行的测试点
+        data_root = "/app/data"  # 容器内的输入文件目录
         if use_file_mode:
-            file_tests, datadir = _collect_test_files(problem_id)
+            file_tests, datadir = load_testcases(problem_id)
             if not file_tests:
                 return {"status":"IE", "score":0, "cases":[], "message":"No test files found"}
+            reused = reused or {}
+            file_tests = [t for t in file_tests if t[0] not in reused]
+            # 测试点分组：按组的顺序运行；容器内的脚本不做组内跳过，跑完后在宿主机上按组标记 Skipped 并计分
+            groups = load_groups(problem_id)
+            if groups:
+                plan = test_groups.GroupPlan(groups)
+                for name, status in reused.items():
+                    plan.record(name, status)
+                blocked = [test_groups.skipped(t[0], plan.skip_reason(t[0]))
+                           for t in file_tests if plan.skip_reason(t[0])]
+                file_tests = plan.order([t for t in file_tests if not plan.skip_reason(t[0])])
+            _stage_inputs(workdir, datadir, file_tests)
         else:
             # create list of names for tests
             file_tests = []
             for i, tc in enumerate(test_cases):
                 name = str(tc.get("id", f"{i+1}"))
-                file_tests.append((name, None, None))
+                file_tests.append((name, None, None, None))
 
         # write source on host (will be visible in container via mount)
+        compile_sh = ""
+        artifacts = []
         if language == "python":
             src_name = "main.py"
             _safe_write(os.path.join(workdir, src_name), source_code)
@@ -144,14 +238,25 @@ def judge_submission_docker(
         elif language == "cpp":
             src_name = "main.cpp"
             _safe_write(os.path.join(workdir, src_name), source_code)
+            compile_sh = "g++ -O2 -std=c++17 main.cpp -o main"
+            artifacts = ["main"]
             run_cmd = "./main"
         elif language == "java":
             src_name = "Main.java"
             _safe_write(os.path.join(workdir, src_name), source_code)
-            run_cmd = "java -cp . Main"
+            compile_sh = "javac Main.java"
+            artifacts = ["*.class"]
+            run_cmd = f"java {' '.join(jvm_flags(mem_mb))} -cp {classpath()} Main"
         else:
             return {"status":"IE", "score":0, "cases":[], "message":f"Unsupported language: {language}"}
 
+        # prepare expected mapping for memory mode (kept on the host)
+        input_text_and_expected_mapping = {}
+        if not use_file_mode:
+            for tc in test_cases:
+                name = str(tc.get("id", tc.get("name", "")))
+                input_text_and_expected_mapping[name] = tc.get("output", "")
+
         # memory-mode: write inputs into workdir as <name>.in
         if not use_file_mode:
             for i, tc in enumerate(test_cases):
@@ -159,19 +264,99 @@ def judge_submission_docker(
                 in_host = os.path.join(workdir, f"{name}.in")
                 _safe_write(in_host, tc.get("input", ""))
 
+        def run_script(script_name: str, script_lines: List[str], timeout: float,
+                       stdin: Optional[str] = None) -> subprocess.CompletedProcess:
+            """把脚本写入工作目录并在容器内执行（预热容器用 docker exec，否则单次 docker run），stdin 为脚本的标准输入"""
+            nonlocal container_healthy
+            script_path = os.path.join(workdir, script_name)
+            _safe_write(script_path, "\n".join(script_lines))
+            os.chmod(script_path, 0o755)
+            if container is not None:
+                try:
+                    proc = container.exec(f"/app/{script_name}", timeout=timeout, input=stdin)
+                    # 脚本总是以 0 退出，非 0 说明 exec 本身出了问题（容器退出、被 OOM 等），容器不再复用
+                    container_healthy = container_healthy and proc.returncode == 0
+                except subprocess.TimeoutExpired:
+                    # 容器内可能还有残留进程，不再复用；没写出 exitcode 的测试点按超时处理
+                    container_healthy = False
+                    proc = subprocess.CompletedProcess([], 137, "", "docker exec timed out")
+                return proc
+            # build docker run command (single run)
+            run_name = f"judge-run-{os.getpid()}-{int(time.time() * 1000)}"
+            docker_cmd = [
+                "docker", "run", "--rm", "--name", run_name,
+                *(["-i"] if stdin is not None else []),
+                "--network=none",
+                f"--memory={mem_mb}m",
+                f"--memory-swap={mem_mb}m",
+                "--pids-limit=128",
+                "-v", f"{os.path.abspath(workdir)}:/app:rw",
+                "-w", "/app"
+            ]
+            if cpus.cpuset():
+                docker_cmd.append(f"--cpuset-cpus={cpus.cpuset()}")
+            docker_cmd += [image, "bash", "-lc", f"/app/{script_name}"]
+            try:
+                return subprocess.run(docker_cmd, input=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                      text=True, timeout=timeout)
+            except subprocess.TimeoutExpired:
+                # 杀死 docker 客户端不会停止容器，按名字强制删除
+                subprocess.run(["docker", "rm", "-f", run_name], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                return subprocess.CompletedProcess(docker_cmd, 137, "", "docker run timed out")
+
+        # 编译单独一次 exec/run：编译产物在任何测试点运行之前存入编译缓存，
+        # 选手程序运行时可以改写 /app，运行之后的产物不能再进缓存
+        compile_cached = False
+        if compile_sh:
+            cache_key = compile_cache.cache_key(language, _image_id(image), compile_sh.split(), source_code)
+            compile_cached = compile_cache.fetch(cache_key, workdir)
+            if not compile_cached:
+                compile_start = time.perf_counter()
+                proc = run_script("compile.sh", ["#!/bin/bash", "cd /app", f"{compile_sh} 2> compile_stderr.txt"],
+                                  COMPILE_TIME_LIMIT * 3 + 30)
+                timings["compile_ms"] = round((time.perf_counter() - compile_start) * 1000, 3)
+                compile_stderr = ""
+                comp_err_path = os.path.join(workdir, "compile_stderr.txt")
+                if os.path.exists(comp_err_path):
+                    with open(comp_err_path, "r", encoding="utf-8", errors="ignore") as f:
+                        compile_stderr = f.read().strip()
+                if not glob.glob(os.path.join(workdir, artifacts[0])):
+                    return {"status": "CE", "score": 0, "cases": [],
+                            "message": compile_stderr or proc.stderr or proc.stdout, "timings": timings}
+                compile_cache.store(cache_key, workdir, artifacts)
+
         # Build run_all_tests.sh contents
         lines = ["#!/bin/bash", "set +e", "cd /app"]  # do not exit on first error
-        # compilation step (inside container)
-        if language == "cpp":
-            lines.append("g++ -O2 -std=c++17 main.cpp -o main 2> compile_stderr.txt || echo __COMPILE_FAILED__")
-        elif language == "java":
-            lines.append("javac Main.java 2> compile_stderr.txt || echo __COMPILE_FAILED__")
-        # if python, no compile step
+        if stop_in_container:
+            # 摘要由 compare.py 的代码计算（_DIGEST_PY），与宿主机判定一致；整个脚本只启动一次 python3。
+            # 摘要算不出来（_d 为空）时不停止，交给宿主机判定
+            _safe_write(os.path.join(workdir, "digest.py"), _DIGEST_PY)
+            lines.append(f"rm -f {ACM_STOP_FILE}")
+            lines.append("coproc DIGEST { python3 /app/digest.py; }")
+            lines.append("_digest() { _d=; echo \"/app/$1\" >&\"${DIGEST[1]}\" && read -r _d <&\"${DIGEST[0]}\"; }")
+
+        # Java：先在同一个 JVM 里跑完所有测试点（time 不含 JVM 启动），
+        # 没有留下 <name>.hmeta 的测试点（异常、超时、OOM、非 0 退出）再逐个用独立 JVM 重跑。
+        # 密钥经脚本的标准输入交给 harness（选手程序读不到），宿主机只认用它签名的 hmeta
+        use_harness = language == "java" and JAVA_HARNESS
+        harness_key = None
+        if use_harness:
+            harness_key = secrets.token_hex(32)
+            harness_list = []
+            for (name, in_basename, out_abs, out_digest) in file_tests:
+                container_input = f"{data_root}/{in_basename}" if use_file_mode else f"/app/{name}.in"
+                harness_list.append(f"{name}\t{container_input}")
+            _safe_write(os.path.join(workdir, "harness.list"), "\n".join(harness_list) + "\n")
+            budget = len(file_tests) * (time_limit + 0.2) + 5
+            lines.append(f"if [ -f Main.class ]; then timeout -s KILL {budget:.1f}s "
+                         f"java {' '.join(jvm_flags(mem_mb))} -cp {JAVA_SUPPORT_DIR} {HARNESS_CLASS} "
+                         f"/app harness.list {int(time_limit * 1000)} {JAVA_STACK_MB} "
+                         f"> harness_stdout.txt 2> harness_stderr.txt; fi")
 
         # Per-test commands: use timeout and /usr/bin/time and write exitcode
-        for (name, in_basename, out_abs) in file_tests:
+        for (name, in_basename, out_abs, out_digest) in file_tests:
             if use_file_mode:
-                container_input = f"/app/data/{in_basename}"
+                container_input = f"{data_root}/{in_basename}"
             else:
                 container_input = f"/app/{name}.in"
 
@@ -186,72 +371,63 @@ def judge_submission_docker(
             inner = (f"/usr/bin/time -f 'time:%e\\nmax-rss:%M' -o {meta_fname} -- {run_cmd} "
                      f"< {container_input} > {stdout_fname} 2> {stderr_fname}; echo \\$? > {exit_fname}")
             # outer timeout ensures hard time limit
-            lines.append(f"timeout -s KILL {time_limit}s bash -lc \"{inner}\" || true")
-
-        # Write the script to workdir
-        script_path = os.path.join(workdir, "run_all_tests.sh")
-        _safe_write(script_path, "\n".join(lines))
-        os.chmod(script_path, 0o755)
-
-        # build docker run command (single run)
-        docker_cmd = [
-            "docker", "run", "--rm",
-            "--network=none",
-            f"--memory={mem_mb}m",
-            f"--memory-swap={mem_mb}m",
-            "--pids-limit=128",
-            "-v", f"{os.path.abspath(workdir)}:/app:rw",
-            "-w", "/app"
-        ]
-        if use_file_mode:
-            # mount data dir read-only
-            docker_cmd += ["-v", f"{os.path.abspath(datadir)}:/app/data:ro"]
-        docker_cmd += [image, "bash", "-lc", "/app/run_all_tests.sh"]
-
-        # execute single docker run
-        proc = subprocess.run(docker_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            single_run = f"timeout -s KILL {time_limit}s bash -lc \"{inner}\" || true"
+            if use_harness:
+                # 只是跳过重跑的提示：选手伪造的 hmeta 在宿主机验不过 mac，该测试点没有 exitcode，只会判为 RE
+                single_run = f"if ! grep -qs '^status:ok' {name}.hmeta; then {single_run}; fi"
+            lines.append(single_run)
+            if stop_in_container:
+                if use_file_mode:
+                    expected_digest = out_digest or digest_file(out_abs)
+                else:
+                    expected_digest = digest_text(input_text_and_expected_mapping.get(name, ""))
+                exited_ok = f"[ \"$(cat {exit_fname} 2>/dev/null)\" = \"0\" ]"
+                if use_harness:
+                    # 在 harness 中正常结束的测试点没有独立重跑，也就没有 exitcode 文件
+                    exited_ok = f"grep -qs '^status:ok' {name}.hmeta || {exited_ok}"
+                lines.append(f"if ! {{ {exited_ok}; }} || "
+                             f"{{ _digest {stdout_fname}; [ -n \"$_d\" ] && [ \"$_d\" != \"{expected_digest}\" ]; }}; "
+                             f"then echo {shlex.quote(name)} > {ACM_STOP_FILE}; exit 0; fi")
+
+        # 整个脚本的墙钟上限：每个测试点的 timeout（+ harness），docker 客户端卡住时不会一直占着 worker
+        exec_timeout = len(file_tests) * (wall_time_limit(time_limit) + 1) + 30
+        if use_harness:
+            exec_timeout += budget
+        exec_start = time.perf_counter()
+        proc = run_script("run_all_tests.sh", lines, exec_timeout,
+                          stdin=harness_key + "\n" if use_harness else None)
+        timings["exec_ms"] = round((time.perf_counter() - exec_start) * 1000, 3)
         # save docker stdout/stderr for debugging
         _safe_write(os.path.join(workdir, "docker_stdout.txt"), _truncate_text(proc.stdout, DEFAULT_OUTPUT_LIMIT_KB))
         _safe_write(os.path.join(workdir, "docker_stderr.txt"), _truncate_text(proc.stderr, DEFAULT_OUTPUT_LIMIT_KB))
 
-        # If compilation failed, check compile_stderr.txt existence and return CE
-        compile_stderr = ""
-        comp_err_path = os.path.join(workdir, "compile_stderr.txt")
-        if os.path.exists(comp_err_path):
-            with open(comp_err_path, "r", encoding="utf-8", errors="ignore") as f:
-                compile_stderr = f.read().strip()
-        if language == "cpp" and not os.path.exists(os.path.join(workdir, "main")):
-            return {"status":"CE", "score":0, "cases":[], "message": compile_stderr or proc.stderr or proc.stdout}
-        if language == "java" and not os.path.exists(os.path.join(workdir, "Main.class")):
-            return {"status":"CE", "score":0, "cases":[], "message": compile_stderr or proc.stderr or proc.stdout}
-
         # parse per-test outputs
         results = []
         passed = 0
         max_time_ms = 0.0
         max_memory_kb = 0.0
 
-        # prepare expected mapping for memory mode
-        input_text_and_expected_mapping = {}
-        if not use_file_mode:
-            for tc in test_cases:
-                name = str(tc.get("id", tc.get("name", "")))
-                input_text_and_expected_mapping[name] = tc.get("output", "")
-
-        for idx, (name, in_basename, out_abs) in enumerate(file_tests):
+        # 容器内提前停止：之后的测试点没有运行，由 _skip_after_first_failure 标记为 Skipped（而不是没有 exitcode 的 RE）
+        stopped_at = None
+        if stop_in_container:
+            stop_path = os.path.join(workdir, ACM_STOP_FILE)
+            if os.path.exists(stop_path):
+                with open(stop_path, "r", encoding="utf-8", errors="ignore") as f:
+                    stopped_name = f.read().strip()
+                stopped_at = next((i for i, t in enumerate(file_tests) if t[0] == stopped_name), None)
+
+        for idx, (name, in_basename, out_abs, out_digest) in enumerate(file_tests):
+            if stopped_at is not None and idx > stopped_at:
+                break
             stdout_path = os.path.join(workdir, f"{name}.stdout")
             stderr_path = os.path.join(workdir, f"{name}.stderr")
             meta_path = os.path.join(workdir, f"{name}.meta")
             exit_path = os.path.join(workdir, f"{name}.exitcode")
 
-            stdout_text = ""
             stderr_text = ""
             meta_text = ""
             exit_code_inner = None
 
-            if os.path.exists(stdout_path):
-                with open(stdout_path, "r", encoding="utf-8", errors="ignore") as f:
-                    stdout_text = f.read()
             if os.path.exists(stderr_path):
                 with open(stderr_path, "r", encoding="utf-8", errors="ignore") as f:
                     stderr_text = f.read()
@@ -267,22 +443,27 @@ def judge_submission_docker(
             # parse meta
             time_used_ms = None
             peak_rss_kb = None
-            try:
-                for line in meta_text.splitlines():
-                    if line.startswith("time:"):
-                        time_used_ms = float(line.split(":",1)[1].strip()) * 1000.0
-                    elif line.startswith("max-rss:"):
-                        peak_rss_kb = float(line.split(":",1)[1].strip())
-            except Exception:
-                pass
-
-            expected_text = ""
-            if use_file_mode and out_abs and os.path.exists(out_abs):
-                with open(out_abs, "r", encoding="utf-8", errors="ignore") as f:
-                    expected_text = f.read()
+            harness_meta = (parse_harness_meta(os.path.join(workdir, f"{name}.hmeta"), name, harness_key)
+                            if use_harness else None)
+            if harness_meta is not None:
+                # 在 harness 中正常结束：time 为 main 的执行时间（ms），memory 为该测试点运行期间堆的峰值占用（KB）
+                exit_code_inner = 0
+                time_used_ms = harness_meta["time"]
+                peak_rss_kb = harness_meta["memory"]
+            else:
+                try:
+                    for line in meta_text.splitlines():
+                        if line.startswith("time:"):
+                            time_used_ms = float(line.split(":",1)[1].strip()) * 1000.0
+                        elif line.startswith("max-rss:"):
+                            peak_rss_kb = float(line.split(":",1)[1].strip())
+                except Exception:
+                    pass
 
             # determine status
+            compare_start = time.perf_counter()
             case_status = "AC"
+            diff_text = ""
             if exit_code_inner is None:
                 # if docker wrote something to stderr maybe timeout/killed
                 stderr_combined = (proc.stderr or "").lower()
@@ -299,12 +480,19 @@ def judge_submission_docker(
                     else:
                         case_status = "RE"
                 else:
-                    # compare outputs
+                    # built-in comparators stream the files on the host, testlib checkers run in the checker container
                     if use_file_mode:
-                        ok = _normalize(stdout_text) == _normalize(expected_text)
+                        case_status, diff_text = checker.check(os.path.join(datadir, in_basename), out_abs,
+                                                               stdout_path, out_digest,
+                                                               sandbox=checker_sandbox, slot=CHECKER_SLOT)
                     else:
-                        ok = _normalize(stdout_text) == _normalize(input_text_and_expected_mapping.get(name, ""))
-                    case_status = "AC" if ok else "WA"
+                        case_status, diff_text = checker.check_text(os.path.join(workdir, f"{name}.in"),
+                                                                    input_text_and_expected_mapping.get(name, ""),
+                                                                    stdout_path,
+                                                                    sandbox=checker_sandbox, slot=CHECKER_SLOT)
+            message = stderr_text or ""
+            if case_status == "IE":
+                message, diff_text = diff_text, ""
 
             if case_status == "AC":
                 passed += 1
@@ -313,23 +501,27 @@ def judge_submission_docker(
             if peak_rss_kb:
                 max_memory_kb = max(max_memory_kb, peak_rss_kb)
 
-            diff_text = ""
-            if case_status == "WA":
-                expected_for_diff = expected_text if use_file_mode else input_text_and_expected_mapping.get(name,"")
-                diff_text = _get_diff(expected_for_diff, stdout_text)
-
             results.append({
                 "name": name,
                 "status": case_status,
                 "time": time_used_ms,
                 "memory": peak_rss_kb,
-                "message": stderr_text or "",
-                "diff": diff_text
+                "message": message,
+                "diff": diff_text,
+                "timings": {"compare_ms": round((time.perf_counter() - compare_start) * 1000, 3)},
             })
 
+        if fail_fast:
+            results = _skip_after_first_failure(results, file_tests)
+        if groups:
+            results, group_score, group_results = test_groups.apply(groups, results + blocked)
+            passed = sum(1 for r in results if r["status"] == "AC")
+
         overall = "WA"
         if passed == len(results) and len(results) > 0:
             overall = "AC"
+        elif any(r["status"]=="IE" for r in results):
+            overall = "IE"  # checker 出错
         elif any(r["status"]=="RE" for r in results):
             overall = "RE"
         elif any(r["status"]=="MLE" for r in results):
@@ -341,20 +533,32 @@ def judge_submission_docker(
         elif any(r["status"]=="TLE" for r in results):
             overall = "TLE"
 
-        score = round(100.0 * passed / max(1, len(results)), 2)
+        score = group_score if groups else round(100.0 * passed / max(1, len(results)), 2)
+        timings["compare_ms"] = round(sum(r.get("timings", {}).get("compare_ms", 0) for r in results), 3)
+        timings["total_ms"] = round((time.perf_counter() - judge_start) * 1000, 3)
         ret = {
             "status": overall,
             "score": score,
             "max_time": max_time_ms,
             "max_memory": max_memory_kb,
             "cases": results,
+            "compile_cached": compile_cached,
+            "checker": checker.kind,
+            "timings": timings,
             "finished_at": datetime.now().isoformat()
         }
+        if groups:
+            ret["groups"] = group_results
         if keep_workdir:
             ret["workdir"] = workdir
         return ret
 
     finally:
+        if container is not None:
+            # 工作目录由容器池清理
+            pool.release(container, healthy=container_healthy)
+        if checker_sandbox is not None:
+            checker_sandbox.reset(CHECKER_SLOT)
         if temp_created and (not keep_workdir):
             try:
                 for root, dirs, files in os.walk(workdir, topdown=False):
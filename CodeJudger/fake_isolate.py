@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# fake_isolate.py
+"""
+无需 root 的 isolate 替身，供 bench.py 在任意 Linux 机器上跑判题流程
+
+只实现 judge.py 用到的参数：--box-id --init --cleanup --run --time --wall-time --mem --cg-mem --fsize
+--meta --dir --stdin -o -r -E -k（-p、--cg 接受但忽略）。
+box 目录为 $ISOLATE_BOX_ROOT/<box-id>/box，程序以 box 目录为工作目录直接在宿主机上运行，
+--dir 绑定通过改写命令行参数与 stdin 路径模拟。没有任何隔离，只能运行可信的代码。
+
+运行与 meta 生成复用 rlimit 沙箱后端（sandbox.exec_limited），meta 与 isolate 同口径。
+"""
+import os
+import sys
+import shutil
+from sandbox import exec_limited, map_path, map_arg, parse_dirs, format_meta
+
+BOX_ROOT = os.getenv("ISOLATE_BOX_ROOT", "/var/lib/isolate")
+
+
+def _parse(argv):
+    opts = {"dirs": [], "env": {}}
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg == "--":
+            opts["cmd"] = argv[i + 1:]
+            break
+        if arg.startswith("--") and "=" in arg:
+            key, value = arg[2:].split("=", 1)
+        elif arg in ("--meta", "--cg-mem", "-o", "-r", "-E", "-k", "-i"):
+            key, value = arg.lstrip("-"), argv[i + 1]
+            i += 1
+        else:
+            key, value = arg.lstrip("-"), True
+        if key == "dir":
+            opts["dirs"] += parse_dirs([value])
+        elif key == "E":
+            name, _, val = value.partition("=")
+            opts["env"][name] = val if val else os.environ.get(name, "")
+        else:
+            opts[key] = value
+        i += 1
+    return opts
+
+
+def _run(opts, box: str) -> int:
+    # 沙箱内的 /box 即 box 目录
+    dirs = opts["dirs"] + [("/box", box)]
+    fields = exec_limited(
+        box,
+        [map_arg(a, dirs) for a in opts.get("cmd", [])],
+        opts["env"] or {"PATH": "/usr/bin:/bin"},
+        stdin=map_path(opts["stdin"], dirs, box) if "stdin" in opts else "",
+        stdout=map_path(opts["o"], dirs, box) if "o" in opts else os.devnull,
+        stderr=map_path(opts["r"], dirs, box) if "r" in opts else os.devnull,
+        time_limit=float(opts.get("time", 0) or 0),
+        mem_kb=int(opts.get("cg-mem", opts.get("mem", 0)) or 0),
+        fsize_kb=int(opts.get("fsize", 0) or 0),
+        stack_kb=int(opts.get("k", 0) or 0),
+        wall_time=float(opts.get("wall-time", 0) or 0),
+    )
+    if opts.get("meta"):
+        with open(opts["meta"], "w") as f:
+            f.write(format_meta(fields))
+    return 0 if "status" not in fields else 1
+
+
+def main(argv) -> int:
+    opts = _parse(argv)
+    box = os.path.join(BOX_ROOT, str(opts.get("box-id", 0)), "box")
+    if opts.get("init"):
+        os.makedirs(box, exist_ok=True)
+        print(os.path.dirname(box))
+        return 0
+    if opts.get("cleanup"):
+        shutil.rmtree(os.path.dirname(box), ignore_errors=True)
+        return 0
+    if opts.get("run"):
+        if not os.path.isdir(box):
+            print("Box not initialized", file=sys.stderr)
+            return 2
+        return _run(opts, box)
+    print("fake_isolate: nothing to do", file=sys.stderr)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,90 @@
+# groups.py
+"""
+测试点分组（子任务）计分
+
+题目数据目录中的 groups.json 由后端展开后写进 manifest 的 "groups" 字段（见 backend/modules/testcases_processing.py）：
+  [{"name": "1", "weight": 30, "cases": ["1", "2"], "depends": []},
+   {"name": "2", "weight": 70, "cases": ["3", "4", "5"], "depends": ["1"]}]
+- 测试点按组的顺序运行；组内出现第一个非 AC 后，该组其余测试点标记 Skipped
+- 依赖的组（含间接依赖）未通过时，整组跳过
+- 组内全部 AC 且依赖的组都通过才得该组分数，总分 = 100 * 通过组的 weight 之和 / weight 总和
+
+GroupPlan 在判题过程中决定是否跳过（并行 box 共用，线程安全）；
+apply 对最终的测试点列表重新判定一遍，使串行/并行、增量重判合并后的结果一致。
+"""
+import threading
+from typing import Dict, List, Optional, Tuple
+
+
+class GroupPlan:
+    def __init__(self, groups: List[dict]):
+        self.groups = groups
+        self._group_of = {case: g["name"] for g in groups for case in g["cases"]}
+        self._depends = {g["name"]: g.get("depends", []) for g in groups}
+        self._failed = set()  # 出现非 AC 的组
+        self._lock = threading.Lock()
+
+    def order(self, tests: list) -> list:
+        """按组的顺序排列测试点，未归组的测试点排在最后"""
+        rank = {case: i for i, case in enumerate(c for g in self.groups for c in g["cases"])}
+        return sorted(tests, key=lambda t: rank.get(t[0], len(rank)))
+
+    def _blocked_by(self, group: str) -> Optional[str]:
+        for dep in self._depends.get(group, []):
+            if dep in self._failed or self._blocked_by(dep):
+                return dep
+        return None
+
+    def skip_reason(self, name: str) -> Optional[str]:
+        """该测试点应跳过时返回原因"""
+        group = self._group_of.get(name)
+        if group is None:
+            return None
+        with self._lock:
+            if group in self._failed:
+                return f"Skipped: an earlier case in group {group} failed"
+            dep = self._blocked_by(group)
+        if dep is not None:
+            return f"Skipped: group {group} depends on failed group {dep}"
+        return None
+
+    def passed(self, group: str) -> bool:
+        with self._lock:
+            return group not in self._failed and self._blocked_by(group) is None
+
+    def record(self, name: str, status: str) -> None:
+        group = self._group_of.get(name)
+        if group is not None and status != "AC":
+            with self._lock:
+                self._failed.add(group)
+
+
+def skipped(name: str, reason: str) -> dict:
+    """被跳过的测试点的结果"""
+    return {"name": name, "status": "Skipped", "time": None, "memory": None, "message": reason, "diff": ""}
+
+
+def apply(groups: List[dict], cases: List[dict]) -> Tuple[List[dict], float, List[dict]]:
+    """
+    按组重新判定跳过并计分，返回 (按组排序的测试点, 总分, 各组结果)。
+    cases 中缺少的测试点（增量重判时由调用方稍后合并）不补齐，也不影响其它测试点。
+    """
+    plan = GroupPlan(groups)
+    by_name: Dict[str, dict] = {c["name"]: c for c in cases}
+    ordered = []
+    for test in plan.order([(c["name"],) for c in cases]):
+        case = by_name[test[0]]
+        reason = plan.skip_reason(case["name"])
+        if reason:
+            case = {**skipped(case["name"], reason), **({"digest": case["digest"]} if "digest" in case else {})}
+        plan.record(case["name"], case["status"])
+        ordered.append(case)
+
+    group_results = []
+    for g in groups:
+        passed = plan.passed(g["name"]) and all(name in by_name for name in g["cases"])
+        group_results.append({"name": g["name"], "weight": g["weight"], "passed": passed,
+                              "score": g["weight"] if passed else 0})
+    total = sum(g["weight"] for g in groups)
+    score = round(100.0 * sum(r["score"] for r in group_results) / total, 2) if total > 0 else 0.0
+    return ordered, score, group_results
@@ -0,0 +1,108 @@
+# incremental.py
+"""
+增量重判
+
+每个测试点的结果带上 digest = sha256(该测试点 in/out 摘要, 源码, 语言, limitations, checker, 沙箱后端)，
+随回调写入提交的 extra。重判时后端把上一次的测试点结果放进任务（previous_cases），
+digest 未变的测试点直接沿用旧结果（标记 reused），只运行新增或改动的测试点，再重新计算总分与总状态。
+全部测试点都可沿用时不编译、不占用 box。
+
+以下情况不沿用、全部重跑：没有 manifest（旧数据没有逐测试点摘要）、ACM 模式（是否继续取决于前面的测试点）、
+任务带 no_cache（对时间敏感的重判）。旧结果为 IE / Skipped 的测试点总是重跑。
+"""
+import json
+import hashlib
+from datetime import datetime
+from typing import Dict, List, Optional
+from testdata import load_case_digests, load_checker
+from result_cache import normalize_source
+import groups as test_groups
+
+# 总状态：全部 AC 为 AC，否则按此顺序取第一个出现的状态（与 judge.py 一致）
+VERDICT_PRECEDENCE = ("IE", "RE", "MLE", "OLE", "WA", "TLE")
+
+
+def case_digests(task: dict, sandbox_name: str) -> Dict[str, str]:
+    """测试点名 -> digest，按测试点顺序；自测或没有 manifest 时为空"""
+    problem_id = task.get("problem_id")
+    if task.get("test_cases") is not None or not problem_id:
+        return {}
+    data = load_case_digests(problem_id)
+    if not data:
+        return {}
+    h = hashlib.sha256()
+    for part in [task["language"], json.dumps(task.get("limitations") or {}, sort_keys=True),
+                 json.dumps(load_checker(problem_id), sort_keys=True), sandbox_name]:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    h.update(normalize_source(task["source_code"]).encode("utf-8"))
+    run_key = h.hexdigest()
+    return {name: hashlib.sha256(f"{run_key}:{d}".encode("utf-8")).hexdigest() for name, d in data.items()}
+
+
+def plan(task: dict, digests: Dict[str, str]) -> Dict[str, dict]:
+    """可以沿用的旧测试点结果：测试点名 -> 结果"""
+    previous = task.get("previous_cases")
+    limitations = task.get("limitations") or {}
+    if not digests or not isinstance(previous, list) or task.get("no_cache"):
+        return {}
+    if str(limitations.get("judgeMode", "oi")).lower() == "acm":
+        return {}
+    reuse = {}
+    for case in previous:
+        if not isinstance(case, dict) or case.get("status") in (None, "IE", "Skipped"):
+            continue
+        name = case.get("name")
+        if name in digests and case.get("digest") == digests[name]:
+            reuse[name] = {k: v for k, v in case.items() if k != "timings"}
+            reuse[name]["reused"] = True
+    return reuse
+
+
+def merge(result: dict, reuse: Dict[str, dict], digests: Dict[str, str],
+          groups: Optional[List[dict]] = None) -> dict:
+    """
+    把本次运行的测试点与沿用的测试点按 manifest 顺序合并，给每个测试点标上 digest，重新计算总分与总状态。
+    有测试点分组时按组重新判定跳过与计分（沿用的测试点失败时，本次运行的同组后续测试点改为 Skipped）。
+    编译错误、判题机错误等没有测试点结果的情况原样返回。
+    """
+    if not digests:
+        return result
+    if reuse and not result.get("cases") and result.get("status") is not None:
+        return result
+    fresh = {c["name"]: c for c in result.get("cases", [])}
+    cases: List[dict] = []
+    for name, digest in digests.items():
+        case = fresh.get(name) or reuse.get(name)
+        if case is None:
+            continue
+        case["digest"] = digest
+        cases.append(case)
+    if not reuse:
+        result["cases"] = cases
+        return result
+
+    score = None
+    if groups:
+        cases, score, result["groups"] = test_groups.apply(groups, cases)
+    status_list = [c["status"] for c in cases]
+    passed = status_list.count("AC")
+    overall = "AC" if passed == len(status_list) else next(
+        (s for s in VERDICT_PRECEDENCE if s in status_list), "WA")
+    result.update({
+        "status": overall,
+        "score": score if groups else round(100.0 * passed / max(1, len(cases)), 2),
+        "max_time": max([c.get("time") or 0.0 for c in cases], default=0.0),
+        "max_memory": max([c.get("memory") or 0.0 for c in cases], default=0.0),
+        "cases": cases,
+        "reused_cases": len(reuse),
+    })
+    return result
+
+
+def reused_only(reuse: Dict[str, dict], digests: Dict[str, str],
+                groups: Optional[List[dict]] = None) -> Optional[dict]:
+    """所有测试点都可沿用时直接返回合并后的结果，无需编译运行；否则返回 None"""
+    if not reuse or any(name not in reuse for name in digests):
+        return None
+    return merge({"cases": [], "finished_at": datetime.now().isoformat()}, reuse, digests, groups)
@@ -0,0 +1,332 @@
+# job_queue.py
+"""
+判题任务队列
+
+两级调度：
+1. lane（优先级队列）：worker 以加权轮转的顺序尝试各 lane，
+   高优先级 lane 得到更多机会，低优先级 lane（批量重判）也不会饿死。
+2. 同一 lane 内按用户轮转：每个用户一个子队列 QUEUE_KEY:<lane>:u:<user_id>，
+   QUEUE_KEY:<lane>:users 是“有待判任务的用户”环，每次取环头用户的一个任务，
+   该用户还有任务就放回环尾。一个用户连续提交 30 次也只占一个轮转位置。
+
+入队/出队都在 Lua 脚本里完成，保证“用户在环中 <=> 子队列非空”这一不变量。
+没有任务时 worker 阻塞在门铃列表 QUEUE_KEY:bell 上，入队时按一下门铃。
+
+可靠队列：出队的同时把任务原子地放进该 worker 的处理中列表 QUEUE_KEY:processing:<worker_id>，
+并在 QUEUE_KEY:leases 里记录取走时间；判完 ack 才删除。worker 定期刷新心跳键（带 TTL），
+回收器发现心跳过期（进程崩溃 / 被 OOM kill）时把任务放回原用户子队列队首；同一任务被回收 MAX_JOB_ATTEMPTS 次后不再重试。
+心跳正常的 worker 手上的任务不回收，无论已经判了多久：判题时长由 worker 的看门狗限制（见 watchdog.py），
+否则耗时长但正常的判题会被另一个 worker 重复执行、回调两次。
+worker 取到任务后因节点内存放不下而放弃时（见 mem_budget.py），用 requeue 原样放回，不计入重试次数。
+"""
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+from config import (QUEUE_KEY, QUEUE_LANES, DEFAULT_LANE, LANE_WEIGHTS,
+                    MAX_INFLIGHT_PER_USER, INFLIGHT_CAP_LANES, INFLIGHT_STALE_SEC,
+                    HEARTBEAT_TTL, MAX_JOB_ATTEMPTS, REAP_INTERVAL)
+
+DEPTH_KEY = f"{QUEUE_KEY}:depth"        # hash: lane -> 待判任务数
+BELL_KEY = f"{QUEUE_KEY}:bell"          # 门铃
+INFLIGHT_PREFIX = f"{QUEUE_KEY}:inflight:"  # zset: 用户在途提交 submission_id -> 入队时间
+LEASES_KEY = f"{QUEUE_KEY}:leases"      # hash: worker_id -> 取走当前任务的时间
+ATTEMPTS_KEY = f"{QUEUE_KEY}:attempts"  # hash: submission_id -> 已被回收的次数
+REAPER_LOCK_KEY = f"{QUEUE_KEY}:reaper"
+ANONYMOUS = "_"
+
+# ARGV: prefix, lane, user_id, job, front, inflight_key, submission_id, cap, now, stale_before
+_ENQUEUE_LUA = """
+local prefix, lane, uid, job, front = ARGV[1], ARGV[2], ARGV[3], ARGV[4], ARGV[5]
+local inflight, sid, cap = ARGV[6], ARGV[7], tonumber(ARGV[8])
+if inflight ~= '' then
+    redis.call('ZREMRANGEBYSCORE', inflight, '-inf', ARGV[10])
+    if cap > 0 and not redis.call('ZSCORE', inflight, sid) and redis.call('ZCARD', inflight) >= cap then
+        return -1
+    end
+    redis.call('ZADD', inflight, ARGV[9], sid)
+end
+local ring = prefix .. ':' .. lane .. ':users'
+local uq = prefix .. ':' .. lane .. ':u:' .. uid
+local n
+if front == '1' then
+    n = redis.call('LPUSH', uq, job)
+else
+    n = redis.call('RPUSH', uq, job)
+end
+if n == 1 then
+    redis.call('RPUSH', ring, uid)
+end
+redis.call('HINCRBY', prefix .. ':depth', lane, 1)
+redis.call('RPUSH', prefix .. ':bell', '1')
+redis.call('LTRIM', prefix .. ':bell', -1024, -1)
+return n
+"""
+
+# ARGV: inflight_key, submission_id, cap, now, stale_before
+# 只占用户的在途名额，不入队；已占有时直接返回
+_RESERVE_LUA = """
+local inflight, sid, cap = ARGV[1], ARGV[2], tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', inflight, '-inf', ARGV[5])
+if redis.call('ZSCORE', inflight, sid) then
+    return 0
+end
+if cap > 0 and redis.call('ZCARD', inflight) >= cap then
+    return -1
+end
+redis.call('ZADD', inflight, ARGV[4], sid)
+return 1
+"""
+
+# ARGV: prefix, worker_id, now, lane1, lane2, ...（按尝试顺序）
+_DEQUEUE_LUA = """
+local prefix, wid, now = ARGV[1], ARGV[2], ARGV[3]
+local function take(job)
+    redis.call('RPUSH', prefix .. ':processing:' .. wid, job)
+    redis.call('HSET', prefix .. ':leases', wid, now)
+end
+for i = 4, #ARGV do
+    local lane = ARGV[i]
+    local ring = prefix .. ':' .. lane .. ':users'
+    local uid = redis.call('LPOP', ring)
+    if uid then
+        local uq = prefix .. ':' .. lane .. ':u:' .. uid
+        local job = redis.call('LPOP', uq)
+        if redis.call('LLEN', uq) > 0 then
+            redis.call('RPUSH', ring, uid)
+        end
+        if job then
+            redis.call('HINCRBY', prefix .. ':depth', lane, -1)
+            take(job)
+            return {lane, job}
+        end
+    end
+end
+-- 升级前遗留的单一队列 / 按 lane 的队列
+for i = 4, #ARGV do
+    local job = redis.call('LPOP', prefix .. ':' .. ARGV[i])
+    if job then
+        take(job)
+        return {ARGV[i], job}
+    end
+end
+local job = redis.call('LPOP', prefix)
+if job then
+    take(job)
+    return {'', job}
+end
+return nil
+"""
+
+# ARGV: prefix, max_attempts, default_lane
+# 返回超过重试次数、放弃重试的任务
+_REAP_LUA = """
+local prefix, max_attempts, default_lane = ARGV[1], tonumber(ARGV[2]), ARGV[3]
+local leases = redis.call('HGETALL', prefix .. ':leases')
+local dead = {}
+for i = 1, #leases, 2 do
+    local wid = leases[i]
+    if redis.call('EXISTS', prefix .. ':hb:' .. wid) == 0 then
+        local pk = prefix .. ':processing:' .. wid
+        while true do
+            local raw = redis.call('RPOP', pk)
+            if not raw then break end
+            local job = cjson.decode(raw)
+            local sid = tostring(job['submission_id'])
+            if redis.call('HINCRBY', prefix .. ':attempts', sid, 1) >= max_attempts then
+                redis.call('HDEL', prefix .. ':attempts', sid)
+                table.insert(dead, raw)
+            else
+                local lane = job['lane']
+                if type(lane) ~= 'string' or lane == '' then lane = default_lane end
+                local uid = job['user_id']
+                if uid == nil or uid == cjson.null or uid == '' then uid = '_' else uid = tostring(uid) end
+                local uq = prefix .. ':' .. lane .. ':u:' .. uid
+                if redis.call('LPUSH', uq, raw) == 1 then
+                    redis.call('RPUSH', prefix .. ':' .. lane .. ':users', uid)
+                end
+                redis.call('HINCRBY', prefix .. ':depth', lane, 1)
+                redis.call('RPUSH', prefix .. ':bell', '1')
+            end
+        end
+        redis.call('HDEL', prefix .. ':leases', wid)
+    end
+end
+return dead
+"""
+
+
+# ARGV: prefix, worker_id, default_lane
+# 把 worker 处理中的任务放回原用户子队列队首（不计入重试次数），返回放回的任务数
+_REQUEUE_LUA = """
+local prefix, wid, default_lane = ARGV[1], ARGV[2], ARGV[3]
+local pk = prefix .. ':processing:' .. wid
+local n = 0
+while true do
+    local raw = redis.call('RPOP', pk)
+    if not raw then break end
+    local job = cjson.decode(raw)
+    local lane = job['lane']
+    if type(lane) ~= 'string' or lane == '' then lane = default_lane end
+    local uid = job['user_id']
+    if uid == nil or uid == cjson.null or uid == '' then uid = '_' else uid = tostring(uid) end
+    local uq = prefix .. ':' .. lane .. ':u:' .. uid
+    if redis.call('LPUSH', uq, raw) == 1 then
+        redis.call('RPUSH', prefix .. ':' .. lane .. ':users', uid)
+    end
+    redis.call('HINCRBY', prefix .. ':depth', lane, 1)
+    redis.call('RPUSH', prefix .. ':bell', '1')
+    n = n + 1
+end
+redis.call('HDEL', prefix .. ':leases', wid)
+return n
+"""
+
+class QueueFull(Exception):
+    """用户在途提交数达到上限"""
+    pass
+
+
+def normalize_lane(lane: Optional[str]) -> str:
+    return lane if lane in QUEUE_LANES else DEFAULT_LANE
+
+
+def _user_of(job: dict) -> str:
+    user_id = job.get("user_id")
+    return str(user_id) if user_id not in (None, "") else ANONYMOUS
+
+
+def _inflight_key(job: dict, lane: str) -> str:
+    user = _user_of(job)
+    if lane in INFLIGHT_CAP_LANES and user != ANONYMOUS:
+        return INFLIGHT_PREFIX + user
+    return ""
+
+
+def reserve(rds, job: dict, lane: Optional[str]) -> None:
+    """
+    入队前先占用户的在途名额，超过 MAX_INFLIGHT_PER_USER 抛 QueueFull；之后 enqueue 同一提交不再重复检查。
+    用于入队前还要写其它数据（如源码 blob）的场景：名额不够时什么都不写。
+    占到名额后没有入队的，调用方用 finish 释放。
+    """
+    inflight_key = _inflight_key(job, normalize_lane(lane))
+    if not inflight_key:
+        return
+    now = time.time()
+    ret = rds.eval(_RESERVE_LUA, 0, inflight_key, str(job.get("submission_id", "")),
+                   MAX_INFLIGHT_PER_USER, now, now - INFLIGHT_STALE_SEC)
+    if int(ret) < 0:
+        raise QueueFull(f"user {_user_of(job)} has {MAX_INFLIGHT_PER_USER} submissions in flight")
+
+
+def enqueue(rds, job: dict, lane: Optional[str], front: bool = False) -> str:
+    """
+    入队，返回实际 lane。
+    lane 属于 INFLIGHT_CAP_LANES 时检查该用户的在途提交数，超过 MAX_INFLIGHT_PER_USER 抛 QueueFull。
+    front=True 放回用户子队列队首（用于任务重新入队）。
+    """
+    lane = normalize_lane(lane)
+    job["lane"] = lane
+    user = _user_of(job)
+    inflight_key = _inflight_key(job, lane)
+    now = time.time()
+    ret = rds.eval(
+        _ENQUEUE_LUA, 0,
+        QUEUE_KEY, lane, user, json.dumps(job), "1" if front else "0",
+        inflight_key, str(job.get("submission_id", "")), MAX_INFLIGHT_PER_USER,
+        now, now - INFLIGHT_STALE_SEC,
+    )
+    if int(ret) < 0:
+        raise QueueFull(f"user {user} has {MAX_INFLIGHT_PER_USER} submissions in flight")
+    return lane
+
+
+def heartbeat(rds, worker_id: str) -> None:
+    rds.set(f"{QUEUE_KEY}:hb:{worker_id}", int(time.time()), ex=HEARTBEAT_TTL)
+
+
+def finish(rds, job: dict) -> None:
+    """释放用户的在途名额"""
+    user = _user_of(job)
+    if user != ANONYMOUS:
+        rds.zrem(INFLIGHT_PREFIX + user, str(job.get("submission_id", "")))
+
+
+def ack(rds, worker_id: str, job: dict) -> None:
+    """任务判完：移出处理中列表，释放用户的在途名额"""
+    pipe = rds.pipeline()
+    pipe.delete(f"{QUEUE_KEY}:processing:{worker_id}")
+    pipe.hdel(LEASES_KEY, worker_id)
+    pipe.hdel(ATTEMPTS_KEY, str(job.get("submission_id", "")))
+    finish(pipe, job)
+    pipe.execute()
+
+
+def requeue(rds, worker_id: str) -> None:
+    """
+    把手上还没开始判的任务放回队列（如节点内存放不下，见 mem_budget.py），不计入重试次数，用户的在途名额保持不变。
+    放回用户子队列队首；该用户没有其它待判任务时排到轮转环尾，其它用户的任务先被取走。
+    """
+    rds.eval(_REQUEUE_LUA, 0, QUEUE_KEY, worker_id, DEFAULT_LANE)
+
+
+def unregister(rds, worker_id: str) -> None:
+    """worker 正常退出（此前已 ack 完手上的任务）"""
+    pipe = rds.pipeline()
+    pipe.delete(f"{QUEUE_KEY}:hb:{worker_id}")
+    pipe.hdel(LEASES_KEY, worker_id)
+    pipe.execute()
+
+
+def reap(rds, worker_id: str) -> List[dict]:
+    """
+    回收失联 worker 手上的任务。多个 worker 都会调用，靠 REAPER_LOCK_KEY 保证每 REAP_INTERVAL 秒只执行一次。
+    返回重试次数用尽、需要直接判为 IE 的任务。
+    """
+    if not rds.set(REAPER_LOCK_KEY, worker_id, nx=True, ex=REAP_INTERVAL):
+        return []
+    dead = rds.eval(_REAP_LUA, 0, QUEUE_KEY, MAX_JOB_ATTEMPTS, DEFAULT_LANE)
+    return [json.loads(raw) for raw in dead or []]
+
+
+def lane_depths(rds) -> Dict[str, int]:
+    depths = rds.hgetall(DEPTH_KEY)
+    return {lane: max(0, int(depths.get(lane, 0))) for lane in QUEUE_LANES}
+
+
+class LaneScheduler:
+    """平滑加权轮转（与 nginx 相同的算法），生成每次取任务时的 lane 尝试顺序"""
+
+    def __init__(self, weights: Dict[str, int] = LANE_WEIGHTS):
+        self._weights = {lane: max(0, weights.get(lane, 1)) for lane in QUEUE_LANES}
+        self._current = {lane: 0 for lane in QUEUE_LANES}
+        self._total = sum(self._weights.values())
+
+    def next_order(self) -> List[str]:
+        if self._total == 0:
+            return list(QUEUE_LANES)
+        for lane, weight in self._weights.items():
+            self._current[lane] += weight
+        first = max(QUEUE_LANES, key=lambda lane: self._current[lane])
+        self._current[first] -= self._total
+        return [first] + [lane for lane in QUEUE_LANES if lane != first]
+
+
+def dequeue(rds, scheduler: LaneScheduler, worker_id: str, timeout: int = 0) -> Optional[Tuple[str, dict]]:
+    """
+    取一个任务并记入 worker_id 的处理中列表，判完须调用 ack。
+    返回 (lane, job)；队列为空时在门铃上阻塞，timeout 秒后仍无任务返回 None（0 表示一直等）。
+    """
+    deadline = time.time() + timeout if timeout else None
+    while True:
+        item = rds.eval(_DEQUEUE_LUA, 0, QUEUE_KEY, worker_id, time.time(), *scheduler.next_order())
+        if item:
+            lane, raw = item
+            job = json.loads(raw)
+            return job.get("lane") or lane or DEFAULT_LANE, job
+        wait = 1
+        if deadline is not None:
+            wait = min(wait, deadline - time.time())
+            if wait <= 0:
+                return None
+        # 门铃可能多按了几次，醒来后队列为空也没关系，回到循环再取
+        rds.blpop(BELL_KEY, timeout=max(wait, 0.01))
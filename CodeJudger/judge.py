@@ -1,122 +1,151 @@
 import os
 import json
-import tempfile
-import subprocess
+import time
+import queue
+import shutil
+import threading
 from glob import glob
 from datetime import datetime
-from typing import List, Tuple
-from config import DATA_DIR, DEFAULT_TIME_LIMIT, DEFAULT_MEM_LIMIT_MB, DEFAULT_OUTPUT_LIMIT_KB, MAX_DIFF_LEN
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+from config import DATA_DIR, DEFAULT_TIME_LIMIT, DEFAULT_MEM_LIMIT_MB, JAVA_SUPPORT_DIR
+import compile_cache
+from testdata import load_testcases, load_checker, load_groups
+from checkers import Checker, CheckerError
+import groups as test_groups
+from jvm import jvm_flags, classpath
+import pch
+import sandbox as sandboxes
+from sandbox import Sandbox
 
 class JudgeError(Exception):
     pass
 
-def _run_cmd(cmd: List[str]) -> subprocess.CompletedProcess:
-    return subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-
-def _ensure_box(box_id: int) -> None:
-    _run_cmd(["isolate", f"--box-id={box_id}", "--init", "--cg"])
-
-def _cleanup_box(box_id: int) -> None:
-    _run_cmd(["isolate", f"--box-id={box_id}", "--cleanup", "--cg"])
-
-def _run_in_isolate(
+CPP_COMPILER = "/usr/bin/g++"
+CPP_FLAGS = ["-O2", "-std=c++17"]  # 预编译头按这组参数生成，修改后会自动重建
+
+def _ms_since(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 3)
+
+def _skip_after_first_failure(results: List[dict], tests: list) -> List[dict]:
+    """
+    ACM 模式：保留第一个非 AC 测试点及其之前的结果，之后的测试点标记为 Skipped。
+    results 可能短于 tests（串行提前停止），或含 None（并行时未执行）。
+    """
+    merged = []
+    failed = False
+    for i, test in enumerate(tests):
+        r = results[i] if i < len(results) else None
+        if failed or r is None:
+            merged.append({
+                "name": test[0],
+                "status": "Skipped",
+                "time": None,
+                "memory": None,
+                "message": "Skipped: judging stopped at the first failed case (ACM mode)",
+                "diff": ""
+            })
+            continue
+        merged.append(r)
+        if r["status"] != "AC":
+            failed = True
+    return merged
+
+
+def _prepare_helper_box(sandbox: Sandbox, box_id: int, src_box_dir: str, artifacts: List[str]) -> None:
+    """初始化辅助 box，并从主 box 拷入可执行产物"""
+    sandbox.reset(box_id)
+    dest = sandbox.prepare(box_id)
+    os.makedirs(f"{dest}/data", exist_ok=True)
+    for pattern in artifacts:
+        for path in glob(os.path.join(src_box_dir, pattern)):
+            shutil.copy2(path, os.path.join(dest, os.path.basename(path)))
+
+
+def _judge_case(
+    sandbox: Sandbox,
     box_id: int,
+    name: str,
+    input_data_or_file: str,
+    expected_output_or_file: str,
+    expected_digest: str | None,
     run_cmd: List[str],
-    workdir: str,
+    use_files: bool,
+    datadir: str,
     time_limit: float,
-    mem_limit_mb: int,
-    datadir: str = '',
-    stdin_file: str = '',
-    stdout_file: str = "stdout.txt",
-    stderr_file: str = "stderr.txt",
-    fsize_kb: int = DEFAULT_OUTPUT_LIMIT_KB
-) -> Tuple[int, str, str, str] | None:
-
-    with tempfile.NamedTemporaryFile(prefix="iso_meta_", delete=False) as meta_tmp:
-        meta_path = meta_tmp.name
-
-    args = [
-        "isolate",
-        f"--box-id={box_id}",
-        "--run",
-        "--cg",
-        f"--time={time_limit}",
-        f"--mem={mem_limit_mb * 1024}",
-        f"--fsize={fsize_kb}",
-        "--meta", meta_path,
-        "--cg-mem", str(mem_limit_mb * 1024),
-        "-p",
-        "-E", "PATH=/usr/bin:/usr/bin",
-        "-o", stdout_file,
-        "-r", stderr_file,
-        "-k", "65536",
-        "--"
-    ] + run_cmd
-
-    # stdin/stdout/stderr 使用沙箱路径
-    if datadir:
-        args.insert(3, f"--dir=/data={datadir}",)
-        args.insert(3, f"--stdin=/data/{stdin_file}")
-    elif stdin_file:
-        args.insert(3, f"--stdin=data/{stdin_file}")
-
-    proc = _run_cmd(args)
-
-    # 宿主机上的对应文件路径
-    stdout_path = os.path.join(workdir, stdout_file)
-    stderr_path = os.path.join(workdir, stderr_file)
-
-    out, err = "", ""
-    if os.path.exists(stdout_path):
-        with open(stdout_path, "r", encoding="utf-8", errors="ignore") as f:
-            out = f.read()
-    if os.path.exists(stderr_path):
-        with open(stderr_path, "r", encoding="utf-8", errors="ignore") as f:
-            err = f.read()
-
-    # 读取 meta
-    meta = ""
+    mem_mb: int,
+    checker: Checker,
+    extra_dirs: List[str] = (),
+) -> dict:
+    """在指定 box 中运行单个测试点并判定"""
+    box_dir = sandbox.workdir(box_id)
+    run_start = time.perf_counter()
+    if use_files:
+        # 正常提交模式，绑定文件
+        code, meta, err = sandbox.run_case(box_id, run_cmd, name, input_data_or_file, datadir,
+                                           time_limit, mem_mb, extra_dirs)
+    else:
+        # 自测模式，直接在 box 创建输入文件
+        input_path = os.path.join(box_dir, f"data/{name}.in")
+        with open(input_path, "w", encoding="utf-8") as f:
+            f.write(input_data_or_file)
+        code, meta, err = sandbox.run_case(box_id, run_cmd, name, f"{name}.in", "",
+                                           time_limit, mem_mb, extra_dirs)
+
+    run_ms = _ms_since(run_start)
+
+    # 解析 meta
+    meta_lines = sandbox.collect_meta(meta)
+    time_used = None
+    peek_memory = None
     try:
-        with open(meta_path, "r") as f:
-            meta = f.read()
-    finally:
-        os.unlink(meta_path)
-
-    return proc.returncode, meta, out, err
-
-
-def _load_testcases(problem_id: int):
-    base = os.path.join(DATA_DIR, str(problem_id))
-    ins = sorted(glob(os.path.join(base, "*.in")))
-    dataset = []
-    for in_path in ins:
-        name = os.path.splitext(os.path.basename(in_path))[0]
-        out_path = os.path.join(base, f"{name}.out")
-        if os.path.exists(out_path):
-            # 保存相对路径
-            dataset.append((name, os.path.basename(in_path), out_path))
-    return dataset, base
-
-def _normalize(s: str) -> str:
-    return "\n".join([line.rstrip() for line in s.rstrip().splitlines()])
+        time_used = float(meta_lines.get("time", "0")) * 1000
+        peek_memory = float(meta_lines.get("max-rss", "0"))
+        status_meta = meta_lines.get("status", "")
+    except ValueError:
+        status_meta = ""
+
+    # 判定状态
+    compare_start = time.perf_counter()
+    if status_meta in ("TO", "TL"):
+        case_status = "TLE"
+    elif status_meta in ("RE", "SG"):
+        if meta_lines.get("exitsig") == "25":
+            case_status = "OLE"
+        elif meta_lines.get("exitsig") == "11" or meta_lines.get("cg-oom-killed"):
+            case_status = "MLE"
+        else:
+            case_status = "RE"
+    elif code != 0:
+        case_status = "RE"
+    else:
+        # 内置比较器流式比较输出文件，不把整份输出读入内存；testlib checker 在同一个 box 中运行
+        stdout_path = os.path.join(box_dir, f"{name}.stdout")
+        if use_files:
+            case_status, diff_text = checker.check(os.path.join(datadir, input_data_or_file),
+                                                   expected_output_or_file, stdout_path, expected_digest,
+                                                   sandbox=sandbox, slot=box_id)
+        else:
+            case_status, diff_text = checker.check_text(os.path.join(box_dir, f"data/{name}.in"),
+                                                        expected_output_or_file, stdout_path,
+                                                        sandbox=sandbox, slot=box_id)
+    message = err.strip() if err else ""
+    if case_status == "IE":
+        message, diff_text = diff_text, ""
+    elif case_status != "WA":
+        diff_text = ""
 
-def _get_diff(expected: str, actual: str) -> str:
-    """生成简易 diff（只取前 MAX_DIFF_LEN 字符）"""
-    expected_lines = expected.splitlines()
-    actual_lines = actual.splitlines()
-    diffs = []
-    for i, (e, a) in enumerate(zip(expected_lines, actual_lines)):
-        if e != a:
-            diffs.append(f"Line {i+1}:\n  Expected: {e}\n  Actual:   {a}")
-    # 多余行
-    for i in range(len(actual_lines), len(expected_lines)):
-        diffs.append(f"Line {i+1}:\n  Expected: {expected_lines[i]}\n  Actual:   <no line>")
-    for i in range(len(expected_lines), len(actual_lines)):
-        diffs.append(f"Line {i+1}:\n  Expected: <no line>\n  Actual:   {actual_lines[i]}")
-    diff_text = "\n".join(diffs)
-    if len(diff_text) > MAX_DIFF_LEN:
-        diff_text = diff_text[:MAX_DIFF_LEN] + "\n...[truncated]..."
-    return diff_text
+    return {
+        "name": name,
+        "status": case_status,
+        "time": time_used,
+        "memory": peek_memory,
+        "message": message,
+        "diff": diff_text,
+        # 墙钟耗时（含沙箱开销），用于定位慢提交，与 time（选手 CPU 时间）不同
+        "timings": {"run_ms": run_ms, "compare_ms": _ms_since(compare_start)},
+    }
 
 
 def judge_submission(
@@ -126,159 +155,219 @@ def judge_submission(
     source_code: str,
     limitations: dict,
     test_cases: list | None = None,
+    box_ready: bool = False,
+    extra_boxes: List[int] = (),
+    sandbox: Sandbox | None = None,
+    reused: Dict[str, str] | None = None,
 ):
+    """
+    box_ready=True 表示 box 已由 BoxPool 初始化好，本函数不再 init / cleanup，
+    判题结束后由调用方归还给 BoxPool 重置。
+    extra_boxes: 调用方从 box_alloc 租到的辅助 box，非空时测试点在 [box_id] + extra_boxes 上并行运行，
+    结果仍按原顺序合并。辅助 box 由本函数 init / cleanup，归还租约由调用方负责。
+    sandbox: 沙箱后端，默认按 SANDBOX_BACKENDS 为该语言配置的后端（box_ready 时须与 BoxPool 使用的一致）
+    reused: 增量重判时沿用旧结果的测试点 -> 旧状态（见 incremental.py）。这些测试点不运行，结果由调用方合并，
+    但计入分组：沿用的测试点失败时，同组及依赖该组的测试点同样跳过
+    """
+    if sandbox is None:
+        sandbox = sandboxes.for_language(language)
+    judge_start = time.perf_counter()
+    # 各阶段墙钟耗时（ms），随结果返回并由 worker 记入 metrics
+    timings = {}
     time_limit = float(limitations.get("maxTime", DEFAULT_TIME_LIMIT))
     mem_mb = int(limitations.get("maxMemory", DEFAULT_MEM_LIMIT_MB))
+    # judgeMode: "oi" 跑完全部测试点；"acm" 遇到第一个非 AC 即停止，其余标记 Skipped
+    fail_fast = str(limitations.get("judgeMode", "oi")).lower() == "acm"
 
     # 如果没有传入 test_cases，就按原来的读取文件
     if test_cases is None:
-        tests, datadir = _load_testcases(problem_id)
+        tests, datadir = load_testcases(problem_id)
         if not tests:
             return {"status": "IE", "score": 0, "cases": [], "extra": "No testcases"}
+        reused = reused or {}
+        tests = [t for t in tests if t[0] not in reused]
         use_files = True
+        # 测试点分组：按组的顺序运行，组内失败或依赖的组失败后跳过（见 groups.py）
+        groups = load_groups(problem_id)
+        plan = test_groups.GroupPlan(groups) if groups else None
+        if plan:
+            tests = plan.order(tests)
+            for name, status in reused.items():
+                plan.record(name, status)
     else:
-        # 将 test_cases 转成 [(name, input_file, expected_output_file)] 的形式，但这里不读文件
+        # 将 test_cases 转成 [(name, input_data, expected_output, None)] 的形式，与文件模式对齐
         tests = []
         for i, tc in enumerate(test_cases):
             name = tc.get("id", f"case_{i}")
-            tests.append((name, tc.get("input", ""), tc.get("output", "")))
+            tests.append((name, tc.get("input", ""), tc.get("output", ""), None))
         use_files = False
         datadir = ""  # 不需要绑定目录
+        groups, plan = None, None
 
-    box_dir = f"/var/lib/isolate/{box_id}/box"
-
-    _cleanup_box(box_id)
-    _ensure_box(box_id)
+    # 特殊评测：自测提交带 problem_id 时同样使用该题的 checker
+    try:
+        checker = Checker(load_checker(problem_id), os.path.join(DATA_DIR, str(problem_id))) if problem_id else Checker()
+    except CheckerError as e:
+        return {"status": "IE", "score": 0, "cases": [], "message": str(e)}
+
+    def release_box():
+        if not box_ready:
+            sandbox.reset(box_id)
+
+    if not box_ready:
+        init_start = time.perf_counter()
+        sandbox.reset(box_id)
+        sandbox.prepare(box_id)
+        timings["box_init_ms"] = _ms_since(init_start)
+    box_dir = sandbox.workdir(box_id)
     os.makedirs(f"{box_dir}/data", exist_ok=True)
 
+    # testlib checker 在写入选手源码之前于同一个 box 中编译
+    try:
+        checker.compile(sandbox, box_id)
+    except CheckerError as e:
+        release_box()
+        return {"status": "IE", "score": 0, "cases": [], "message": str(e)}
+    if checker.compile_ms is not None:
+        timings["checker_compile_ms"] = checker.compile_ms
+
     # 写入源文件
+    compile_cached = False
+    extra_dirs = []
     if language == "python":
         src_path = os.path.join(box_dir, "main.py")
         with open(src_path, "w") as f:
             f.write(source_code)
+        artifacts = ["main.py"]
         run_cmd = ["/usr/bin/python3", "main.py"]
     elif language == "cpp":
         src_path = os.path.join(box_dir, "main.cpp")
         with open(src_path, "w") as f:
             f.write(source_code)
-        code, meta, out, err = _run_in_isolate(
-            box_id,
-            ["/usr/bin/g++", "-O2", "-std=c++17", "-o", "main", "main.cpp"],
-            workdir=box_dir,
-            time_limit=10.0,
-            mem_limit_mb=1024
-        )
-        if code != 0:
-            _cleanup_box(box_id)
-            return {"status": "CE", "score": 0, "cases": [], "message": err or out}
+        compile_cmd = [CPP_COMPILER, *CPP_FLAGS, "-o", "main", "main.cpp"]
+        artifacts = ["main"]
+        cache_key = compile_cache.cache_key(
+            language, compile_cache.compiler_version(compile_cmd[0]), compile_cmd, source_code)
+        compile_cached = compile_cache.fetch(cache_key, box_dir)
+        if not compile_cached:
+            # <bits/stdc++.h> 预编译头：只读绑定为 /pch 并放在 include 搜索路径最前面
+            pch_dir = pch.lookup(CPP_COMPILER, CPP_FLAGS)
+            compile_dirs = []
+            if pch_dir:
+                compile_cmd = [CPP_COMPILER, "-I/pch", *compile_cmd[1:]]
+                compile_dirs = [f"/pch={pch_dir}"]
+            compile_start = time.perf_counter()
+            code, meta, out, err = sandbox.compile(box_id, compile_cmd, extra_dirs=compile_dirs)
+            timings["compile_ms"] = _ms_since(compile_start)
+            if code != 0:
+                release_box()
+                timings["total_ms"] = _ms_since(judge_start)
+                return {"status": "CE", "score": 0, "cases": [], "message": err or out, "timings": timings}
+            compile_cache.store(cache_key, box_dir, artifacts)
         run_cmd = ["./main"]
     elif language == "java":
         src_path = os.path.join(box_dir, "Main.java")
         with open(src_path, "w") as f:
             f.write(source_code)
         # 编译
-        code, meta, out, err = _run_in_isolate(
-            box_id,
-            ["/usr/bin/javac", "Main.java"],
-            workdir=box_dir,
-            time_limit=10.0,
-            mem_limit_mb=1024
-        )
-        if code != 0:
-            _cleanup_box(box_id)
-            return {"status": "CE", "score": 0, "cases": [], "message": err or out}
-
-        # 运行
-        run_cmd = ["/usr/bin/java", "-cp", ".", "Main"]
+        compile_cmd = ["/usr/bin/javac", "Main.java"]
+        artifacts = ["*.class"]
+        cache_key = compile_cache.cache_key(
+            language, compile_cache.compiler_version(compile_cmd[0]), compile_cmd, source_code)
+        compile_cached = compile_cache.fetch(cache_key, box_dir)
+        if not compile_cached:
+            compile_start = time.perf_counter()
+            code, meta, out, err = sandbox.compile(box_id, compile_cmd)
+            timings["compile_ms"] = _ms_since(compile_start)
+            if code != 0:
+                release_box()
+                timings["total_ms"] = _ms_since(judge_start)
+                return {"status": "CE", "score": 0, "cases": [], "message": err or out, "timings": timings}
+            compile_cache.store(cache_key, box_dir, artifacts)
+
+        # 运行：堆上限按 maxMemory 计算；宿主机有 AppCDS 归档时绑定进 box 使用
+        run_cmd = ["/usr/bin/java", *jvm_flags(mem_mb), "-cp", classpath(), "Main"]
+        if os.path.isdir(JAVA_SUPPORT_DIR):
+            extra_dirs = [JAVA_SUPPORT_DIR]
     else:
-        _cleanup_box(box_id)
+        release_box()
         return {"status": "IE", "score": 0, "cases": [], "message": f"Unsupported language: {language}"}
 
-    results = []
-    passed = 0
-    max_time = 0.0
-    max_memory = 0.0
-
-    for name, input_data_or_file, expected_output_or_file in tests:
-        if use_files:
-            # 正常提交模式，绑定文件
-            code, meta, out, err = _run_in_isolate(
-                box_id,
-                run_cmd=run_cmd,
-                workdir=box_dir,
-                datadir=datadir,
-                time_limit=time_limit,
-                mem_limit_mb=mem_mb,
-                stdin_file=input_data_or_file,
-                stdout_file=f"{name}.stdout",
-                stderr_file=f"{name}.stderr",
-            )
-            with open(expected_output_or_file, "r", encoding="utf-8", errors="ignore") as fexp:
-                expected = fexp.read()
-        else:
-            # 自测模式，直接在 box 创建输入文件
-            input_path = os.path.join(box_dir, f"data/{name}.in")
-            with open(input_path, "w", encoding="utf-8") as f:
-                f.write(input_data_or_file)
-            expected = expected_output_or_file
-            code, meta, out, err = _run_in_isolate(
-                box_id,
-                run_cmd=run_cmd,
-                workdir=box_dir,
-                time_limit=time_limit,
-                mem_limit_mb=mem_mb,
-                stdin_file=f"{name}.in",
-                stdout_file=f"{name}.stdout",
-                stderr_file=f"{name}.stderr",
-            )
-
-        # 解析 meta
-        time_used = None
-        peek_memory = None
-        try:
-            meta_lines = {kv.split(":", 1)[0].strip(): kv.split(":", 1)[1].strip()
-                          for kv in meta.splitlines() if ":" in kv}
-            time_used = float(meta_lines.get("time", "0")) * 1000
-            peek_memory = float(meta_lines.get("max-rss", "0"))
-            status_meta = meta_lines.get("status", "")
-        except Exception:
-            status_meta = ""
-
-        # 判定状态
-        if status_meta in ("TO", "TL"):
-            case_status = "TLE"
-        elif status_meta in ("RE", "SG"):
-            if meta_lines.get("exitsig") == "25":
-                case_status = "OLE"
-            elif meta_lines.get("exitsig") == "11":
-                case_status = "MLE"
-            else:
-                case_status = "RE"
-        elif code != 0:
-            case_status = "RE"
-        else:
-            ok = _normalize(out) == _normalize(expected)
-            case_status = "AC" if ok else "WA"
-
-        if case_status == "AC":
-            passed += 1
-        max_time = max(max_time, time_used)
-        max_memory = max(max_memory, peek_memory)
-        diff_text = _get_diff(expected, out) if case_status == "WA" else ""
-
-        results.append({
-            "name": name,
-            "status": case_status,
-            "time": time_used,
-            "memory": peek_memory,
-            "message": err.strip() if err else "",
-            "diff": diff_text
-        })
+    boxes = [box_id]
+    if extra_boxes:
+        # 并行模式：辅助 box 初始化后拷入编译产物
+        with ThreadPoolExecutor(max_workers=len(extra_boxes)) as ex:
+            list(ex.map(lambda b: _prepare_helper_box(sandbox, b, box_dir, artifacts), extra_boxes))
+        boxes += list(extra_boxes)
+
+    judge_case = partial(
+        _judge_case,
+        sandbox,
+        run_cmd=run_cmd,
+        use_files=use_files,
+        datadir=datadir,
+        time_limit=time_limit,
+        mem_mb=mem_mb,
+        checker=checker,
+        extra_dirs=extra_dirs,
+    )
+    if len(boxes) == 1:
+        results = []
+        for test in tests:
+            if plan and plan.skip_reason(test[0]):
+                results.append(None)
+                continue
+            results.append(judge_case(box_id, *test))
+            if plan:
+                plan.record(test[0], results[-1]["status"])
+            if fail_fast and results[-1]["status"] != "AC":
+                break
+    else:
+        free_boxes = queue.Queue()
+        for b in boxes:
+            free_boxes.put(b)
+        stop = threading.Event()
+
+        def run_on_free_box(test):
+            if stop.is_set() or (plan and plan.skip_reason(test[0])):
+                return None
+            b = free_boxes.get()
+            try:
+                if stop.is_set() or (plan and plan.skip_reason(test[0])):
+                    return None
+                r = judge_case(b, *test)
+                if plan:
+                    plan.record(test[0], r["status"])
+                if fail_fast and r["status"] != "AC":
+                    stop.set()
+                return r
+            finally:
+                free_boxes.put(b)
+
+        # map 保持原顺序返回
+        with ThreadPoolExecutor(max_workers=len(boxes)) as ex:
+            results = list(ex.map(run_on_free_box, tests))
+        for b in extra_boxes:
+            sandbox.reset(b)
+
+    if fail_fast:
+        results = _skip_after_first_failure(results, tests)
+    if groups:
+        # 并行时后面组的测试点可能先于失败的测试点运行，按组重新判定跳过，结果与串行一致
+        results, group_score, group_results = test_groups.apply(
+            groups, [r or test_groups.skipped(t[0], plan.skip_reason(t[0]) or "Skipped")
+                     for r, t in zip(results, tests)])
+
+    passed = sum(1 for r in results if r["status"] == "AC")
+    max_time = max([r["time"] or 0.0 for r in results], default=0.0)
+    max_memory = max([r["memory"] or 0.0 for r in results], default=0.0)
 
     status_list = [r["status"] for r in results]
     overall = "WA"
     if passed == len(status_list):
         overall = "AC"
+    elif "IE" in status_list:
+        overall = "IE"  # checker 出错
     elif "RE" in status_list:
         overall = "RE"
     elif "MLE" in status_list:
@@ -290,14 +379,23 @@ def judge_submission(
     elif "TLE" in status_list:
         overall = "TLE"
 
-    score = round(100.0 * passed / max(1, len(results)), 2)
-    _cleanup_box(box_id)
+    score = group_score if groups else round(100.0 * passed / max(1, len(results)), 2)
+    release_box()
+    timings["run_ms"] = round(sum(r.get("timings", {}).get("run_ms", 0) for r in results), 3)
+    timings["compare_ms"] = round(sum(r.get("timings", {}).get("compare_ms", 0) for r in results), 3)
+    timings["total_ms"] = _ms_since(judge_start)
 
-    return {
+    ret = {
         "status": overall,
         "score": score,
         "max_time": max_time,
         "max_memory": max_memory,
         "cases": results,
+        "compile_cached": compile_cached,
+        "checker": checker.kind,
+        "timings": timings,
         "finished_at": datetime.now().isoformat()
     }
+    if groups:
+        ret["groups"] = group_results
+    return ret
@@ -0,0 +1,291 @@
+import java.io.*;
+import java.lang.management.ManagementFactory;
+import java.lang.management.ManagementPermission;
+import java.lang.management.MemoryPoolMXBean;
+import java.lang.management.MemoryType;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.lang.reflect.ReflectPermission;
+import java.net.URL;
+import java.net.URLClassLoader;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.*;
+import java.security.CodeSource;
+import java.security.Permission;
+import java.security.Policy;
+import java.security.ProtectionDomain;
+import java.security.SecurityPermission;
+import java.util.*;
+import javax.crypto.Mac;
+import javax.crypto.spec.SecretKeySpec;
+
+/**
+ * 在同一个 JVM 里依次运行选手程序的所有测试点，省去每个测试点的 JVM 启动时间。
+ *
+ * 用法：java -cp /opt/judge JudgeHarness <选手 class 目录> <测试点列表> <时限 ms> <线程栈 MB>
+ * 标准输入的第一行是判题机本次生成的密钥，在运行任何选手代码之前读入。
+ * 测试点列表每行 "name\tinput_path"；每个测试点输出 name.stdout / name.stderr，
+ * 只有正常结束（main 返回或 System.exit(0)）、未超时且没有留下线程的测试点才写 name.hmeta（status/time/memory），
+ * 并附上用密钥计算的 HMAC（mac），判题机只认 mac 正确的记录，选手程序伪造的 hmeta 无效。
+ * 其余测试点没有 hmeta，由判题脚本逐个用独立 JVM 重跑得到权威结果。
+ *
+ * 每个测试点用新的 ClassLoader 加载 Main，在单独的线程组中运行，静态字段随之重置；
+ * time 只统计 main 的执行时间，memory 为该测试点运行期间堆的峰值占用（KB，测试点之间先 GC）。
+ * 选手线程栈大小与独立 JVM 的 -Xss 相同。
+ * 选手代码不能打开文件、访问标准输入输出的文件描述符、反射访问非公开成员或使用管理接口（见 ContestantPolicy），
+ * 被拒绝的测试点同样回退到独立 JVM。不支持 SecurityManager 的 JDK 上 harness 不运行任何测试点。
+ * 超时、OutOfMemoryError 或测试点结束后选手创建的线程仍在运行时，堆与线程状态不可信，直接退出，剩余测试点全部回退。
+ *
+ * 不带参数的 --warmup 模式用于构建镜像时生成 AppCDS 归档（-XX:ArchiveClassesAtExit）。
+ */
+public class JudgeHarness {
+
+    static final class ExitTrap extends SecurityException {
+        final int status;
+
+        ExitTrap(int status) {
+            super("System.exit(" + status + ")");
+            this.status = status;
+        }
+    }
+
+    /** 拦截选手线程的 System.exit；权限检查按 ContestantPolicy（默认的 AccessController 栈检查） */
+    static final class Guard extends SecurityManager {
+        volatile Thread target;
+        volatile ThreadGroup contestant;
+        volatile boolean halting;
+
+        boolean inContestant() {
+            ThreadGroup sandbox = contestant;
+            ThreadGroup group = Thread.currentThread().getThreadGroup();
+            return sandbox != null && group != null && sandbox.parentOf(group);
+        }
+
+        void halt() {
+            halting = true;
+            Runtime.getRuntime().halt(0);
+        }
+
+        @Override
+        public void checkExit(int status) {
+            if (halting) {
+                return;
+            }
+            if (Thread.currentThread() == target) {
+                throw new ExitTrap(status);
+            }
+            if (inContestant()) {
+                // 选手的其它线程调用 System.exit：本测试点及之后的测试点交给独立 JVM 重跑
+                halt();
+            }
+        }
+    }
+
+    /**
+     * 选手 class 目录中加载的代码（及其创建的线程）不能打开文件（包括 /proc/self/mem）、访问标准输入输出的文件描述符、
+     * 反射访问非公开成员、使用管理接口或修改安全设置；JDK 自身在 doPrivileged 中的操作不受影响，其余代码不受限制。
+     */
+    static final class ContestantPolicy extends Policy {
+        final String classDir;
+
+        ContestantPolicy(URL classDir) {
+            this.classDir = classDir.toString();
+        }
+
+        @Override
+        public boolean implies(ProtectionDomain domain, Permission perm) {
+            CodeSource source = domain.getCodeSource();
+            if (source == null || !classDir.equals(String.valueOf(source.getLocation()))) {
+                return true;
+            }
+            if (perm instanceof FilePermission || perm instanceof ReflectPermission || perm instanceof ManagementPermission
+                    || perm instanceof SecurityPermission) {
+                return false;
+            }
+            if (perm instanceof RuntimePermission) {
+                switch (perm.getName()) {
+                    case "setIO", "readFileDescriptor", "writeFileDescriptor", "setSecurityManager",
+                            "createSecurityManager", "shutdownHooks", "accessDeclaredMembers":
+                        return false;
+                    default:
+                        return true;
+                }
+            }
+            return true;
+        }
+    }
+
+    static String readKey() throws IOException {
+        ByteArrayOutputStream key = new ByteArrayOutputStream();
+        for (int b = System.in.read(); b != -1 && b != '\n'; b = System.in.read()) {
+            key.write(b);
+        }
+        return key.toString(StandardCharsets.UTF_8).trim();
+    }
+
+    static String hex(byte[] bytes) {
+        StringBuilder sb = new StringBuilder();
+        for (byte b : bytes) {
+            sb.append(String.format("%02x", b));
+        }
+        return sb.toString();
+    }
+
+    /** 选手线程组中仍在运行的线程 */
+    static List<Thread> liveThreads(ThreadGroup group) {
+        Thread[] threads = new Thread[group.activeCount() + 16];
+        int n = group.enumerate(threads, true);
+        List<Thread> live = new ArrayList<>();
+        for (int i = 0; i < n; i++) {
+            if (threads[i].isAlive()) {
+                live.add(threads[i]);
+            }
+        }
+        return live;
+    }
+
+    public static void main(String[] args) throws Exception {
+        if (args.length == 1 && args[0].equals("--warmup")) {
+            warmup();
+            return;
+        }
+        URL classDir = new File(args[0]).toURI().toURL();
+        List<String> cases = Files.readAllLines(Paths.get(args[1]));
+        long timeLimitMs = Long.parseLong(args[2]);
+        long stackBytes = Long.parseLong(args[3]) << 20;
+        String key = readKey();
+        if (key.isEmpty()) {
+            System.exit(0);
+        }
+        Mac mac = Mac.getInstance("HmacSHA256");
+        mac.init(new SecretKeySpec(key.getBytes(StandardCharsets.UTF_8), "HmacSHA256"));
+        List<MemoryPoolMXBean> heapPools = new ArrayList<>();
+        for (MemoryPoolMXBean pool : ManagementFactory.getMemoryPoolMXBeans()) {
+            if (pool.getType() == MemoryType.HEAP && pool.isValid()) {
+                heapPools.add(pool);
+            }
+        }
+
+        PrintStream realOut = System.out;
+        PrintStream realErr = System.err;
+        InputStream realIn = System.in;
+        Guard guard = new Guard();
+        try {
+            Policy.setPolicy(new ContestantPolicy(classDir));
+            System.setSecurityManager(guard);
+        } catch (UnsupportedOperationException e) {
+            // 不支持 SecurityManager 的 JDK：无法阻止选手代码伪造结果，全部测试点交给独立 JVM
+            System.exit(0);
+        }
+
+        for (String line : cases) {
+            if (line.isEmpty()) {
+                continue;
+            }
+            String[] parts = line.split("\t", 2);
+            String name = parts[0];
+            final boolean[] ok = {false};
+            ThreadGroup group = new ThreadGroup("contestant-" + name);
+
+            try (InputStream in = new BufferedInputStream(new FileInputStream(parts[1]));
+                 PrintStream out = new PrintStream(new BufferedOutputStream(new FileOutputStream(name + ".stdout"), 1 << 16), false);
+                 PrintStream err = new PrintStream(new FileOutputStream(name + ".stderr"), true);
+                 URLClassLoader loader = new URLClassLoader(new URL[]{classDir}, JudgeHarness.class.getClassLoader().getParent())) {
+                System.setIn(in);
+                System.setOut(out);
+                System.setErr(err);
+
+                Thread runner = new Thread(group, () -> {
+                    try {
+                        Method m = loader.loadClass("Main").getMethod("main", String[].class);
+                        m.invoke(null, (Object) new String[0]);
+                        ok[0] = true;
+                    } catch (InvocationTargetException e) {
+                        Throwable cause = e.getCause();
+                        if (cause instanceof ExitTrap) {
+                            ok[0] = ((ExitTrap) cause).status == 0;
+                        } else if (cause instanceof OutOfMemoryError) {
+                            guard.halt();
+                        } else {
+                            cause.printStackTrace(err);
+                        }
+                    } catch (ExitTrap e) {
+                        ok[0] = e.status == 0;
+                    } catch (Throwable e) {
+                        e.printStackTrace(err);
+                    }
+                }, "main", stackBytes);
+                guard.target = runner;
+                guard.contestant = group;
+
+                System.gc();
+                for (MemoryPoolMXBean pool : heapPools) {
+                    pool.resetPeakUsage();
+                }
+                long start = System.nanoTime();
+                long deadline = start + (timeLimitMs + 100) * 1_000_000;
+                runner.start();
+                runner.join(timeLimitMs + 100);
+                // 独立 JVM 要等所有非守护线程结束才退出：同样在时限内等待
+                for (Thread t : liveThreads(group)) {
+                    long left = (deadline - System.nanoTime()) / 1_000_000;
+                    if (!t.isDaemon() && left > 0) {
+                        t.join(left);
+                    }
+                }
+                long elapsedMs = (System.nanoTime() - start) / 1_000_000;
+                out.flush();
+                if (!liveThreads(group).isEmpty()) {
+                    // 无法安全地停止选手线程：本测试点及之后的测试点交给独立 JVM 重跑
+                    guard.halt();
+                }
+                guard.contestant = null;
+                long memoryKb = 0;
+                for (MemoryPoolMXBean pool : heapPools) {
+                    memoryKb += pool.getPeakUsage().getUsed() / 1024;
+                }
+                if (ok[0] && !out.checkError() && elapsedMs <= timeLimitMs) {
+                    String body = "status:ok\ntime:" + elapsedMs + "\nmemory:" + memoryKb + "\n";
+                    String sig = hex(mac.doFinal((name + "\n" + body).getBytes(StandardCharsets.UTF_8)));
+                    Files.write(Paths.get(name + ".hmeta"), (body + "mac:" + sig + "\n").getBytes(StandardCharsets.UTF_8));
+                }
+            } finally {
+                guard.contestant = null;
+                System.setIn(realIn);
+                System.setOut(realOut);
+                System.setErr(realErr);
+            }
+        }
+        System.exit(0);
+    }
+
+    /** 加载选手程序常用的类，供 AppCDS 归档 */
+    static void warmup() throws IOException {
+        String text = "3 4\n1 2 3\nhello world\n";
+        BufferedReader br = new BufferedReader(new InputStreamReader(new ByteArrayInputStream(text.getBytes())));
+        StringTokenizer st = new StringTokenizer(br.readLine());
+        int a = Integer.parseInt(st.nextToken()) + Integer.parseInt(st.nextToken());
+        StreamTokenizer tok = new StreamTokenizer(new StringReader(text));
+        tok.nextToken();
+        Scanner sc = new Scanner(text);
+        long b = sc.nextLong() + sc.nextInt();
+        sc.nextLine();
+        List<Integer> list = new ArrayList<>(Arrays.asList(3, 1, 2));
+        Collections.sort(list);
+        Map<String, Integer> map = new HashMap<>();
+        map.merge("k", 1, Integer::sum);
+        TreeMap<Integer, Integer> tree = new TreeMap<>();
+        tree.put(a, map.get("k"));
+        Deque<Integer> dq = new ArrayDeque<>(list);
+        PriorityQueue<long[]> pq = new PriorityQueue<>((x, y) -> Long.compare(x[0], y[0]));
+        pq.add(new long[]{b});
+        StringBuilder sb = new StringBuilder();
+        sb.append(String.format("%d %.3f%n", a, Math.sqrt(b)));
+        sb.append(String.join(",", "x", "y")).append(new java.math.BigInteger("12345678901234567890").multiply(java.math.BigInteger.TWO));
+        sb.append(list.stream().mapToInt(Integer::intValue).sum()).append(tree.size()).append(dq.peek());
+        PrintWriter pw = new PrintWriter(new BufferedWriter(new OutputStreamWriter(new ByteArrayOutputStream())));
+        pw.println(sb);
+        pw.printf("%s%n", Arrays.toString(new int[]{1, 2}));
+        pw.flush();
+    }
+}
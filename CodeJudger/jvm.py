@@ -0,0 +1,59 @@
+# jvm.py
+"""
+Java 运行参数
+
+- 堆上限按题目 maxMemory 扣除非堆开销（JAVA_NONHEAP_MB）得到，串行 GC、关闭 perf 数据文件，启动更快、占用更少
+- 使用 judge_env 镜像构建时生成的 AppCDS 归档（JAVA_SUPPORT_DIR/java.jsa），-Xshare:auto 在归档不可用时静默退回
+- -Xlog:disable：JVM 的警告默认写到 stdout，会污染选手输出
+- harness 的结果（<name>.hmeta）带有用判题机每次生成的密钥计算的 HMAC，选手程序能写 /app 也无法伪造
+"""
+import os
+import hmac
+import hashlib
+from typing import List
+from config import JAVA_SUPPORT_DIR, JAVA_NONHEAP_MB, JAVA_STACK_MB
+
+HARNESS_CLASS = "JudgeHarness"
+
+
+def jvm_flags(mem_mb: int, support_dir: str = JAVA_SUPPORT_DIR) -> List[str]:
+    heap_mb = max(32, mem_mb - JAVA_NONHEAP_MB)
+    return [
+        f"-Xmx{heap_mb}m",
+        f"-Xms{min(heap_mb, 64)}m",
+        f"-Xss{JAVA_STACK_MB}m",
+        "-XX:+UseSerialGC",
+        "-XX:-UsePerfData",
+        "-Xlog:disable",
+        "-Xshare:auto",
+        f"-XX:SharedArchiveFile={os.path.join(support_dir, 'java.jsa')}",
+    ]
+
+
+def classpath(support_dir: str = JAVA_SUPPORT_DIR) -> str:
+    # AppCDS 要求运行时 classpath 以归档时的 classpath 开头
+    return f"{support_dir}:."
+
+
+def harness_mac(key: str, name: str, body: str) -> str:
+    """与 JudgeHarness 相同：HMAC-SHA256(key, name + "\\n" + body)"""
+    return hmac.new(key.encode(), f"{name}\n{body}".encode(), hashlib.sha256).hexdigest()
+
+
+def parse_harness_meta(path: str, name: str, key: str) -> dict | None:
+    """读取 harness 写的 <name>.hmeta，没有、mac 不对（选手伪造）或不完整时返回 None（需回退重跑）"""
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        lines = f.read().splitlines()
+    body = "".join(line + "\n" for line in lines if not line.startswith("mac:"))
+    macs = [line[len("mac:"):] for line in lines if line.startswith("mac:")]
+    if len(macs) != 1 or not hmac.compare_digest(macs[0], harness_mac(key, name, body)):
+        return None
+    meta = dict(line.split(":", 1) for line in lines if ":" in line)
+    if meta.get("status") != "ok":
+        return None
+    try:
+        return {"time": float(meta["time"]), "memory": float(meta["memory"])}
+    except (KeyError, ValueError):
+        return None
@@ -0,0 +1,166 @@
+# mem_budget.py
+"""
+节点内存准入
+
+题目的 maxMemory 可达数 GB，编译还要 COMPILE_HEADROOM_MB；各 worker 互不知道对方手上的提交占多少内存，
+大内存题目同时判时可能触发 OOM killer，杀掉的选手程序会被误判为 RE / MLE。
+同一台机（按主机名区分）的所有 worker 在 Redis 里共用一份预留表：
+  QUEUE_KEY:mem:<host>       hash  worker_id -> 判题中的提交预留的内存（MB）
+  QUEUE_KEY:mem-wait:<host>  hash  worker_id -> "<MB>:<开始等待的时间>"，正在等待准入的提交
+                                  job:<submission_id> -> "<MB>:<开始等待的时间>:<过期时间>"，等不到而放回队列的提交
+worker 取到任务后先预留 maxMemory * 并行 box 数 + 编译余量（Python 不编译，不加），预留之和超过节点预算时原地等待
+ADMISSION_WAIT_SEC，仍放不下就把任务放回队列（job_queue.requeue），先去判别的任务。
+- 更早开始等待的提交的需求也计入已用，后来的小任务不能插队占掉正在释放的内存
+- 放回队列的提交在本机保留等待位置 ADMISSION_HOLD_SEC 秒：这期间它的需求仍计入已用，再次取到时沿用最初的等待时间，
+  大内存提交不会因为反复放回队列而被源源不断的小提交饿死
+- 本机没有其它判题中的提交、也没有更早的等待者时总能准入，需求超过整个预算的提交独占节点运行
+- 心跳键过期的 worker（崩溃 / 被 OOM kill）的预留在下次准入时清除
+"""
+import time
+import socket
+from typing import Optional
+from config import (QUEUE_KEY, NODE_MEM_BUDGET_MB, MEM_HEADROOM_MB, COMPILE_HEADROOM_MB, ADMISSION_WAIT_SEC,
+                    ADMISSION_HOLD_SEC, DEFAULT_MEM_LIMIT_MB)
+
+NODE = socket.gethostname()
+HELD_KEY = f"{QUEUE_KEY}:mem:{NODE}"
+WAIT_KEY = f"{QUEUE_KEY}:mem-wait:{NODE}"
+POLL_INTERVAL = 0.5
+
+# ARGV: prefix, held_key, wait_key, worker_id, need, budget, since, now, job（等待位置 job:<submission_id>，可为空）
+# 返回 1 表示已预留，0 表示放不下（已登记为等待者）
+_RESERVE_LUA = """
+local prefix, held, waiting, wid = ARGV[1], ARGV[2], ARGV[3], ARGV[4]
+local need, budget, since, now, job = tonumber(ARGV[5]), tonumber(ARGV[6]), tonumber(ARGV[7]), tonumber(ARGV[8]), ARGV[9]
+if job ~= '' then
+    -- 放回队列时保留的等待位置由本次等待接替
+    redis.call('HDEL', waiting, job)
+end
+local function alive(w)
+    if redis.call('EXISTS', prefix .. ':hb:' .. w) == 1 then
+        return true
+    end
+    redis.call('HDEL', held, w)
+    redis.call('HDEL', waiting, w)
+    return false
+end
+local used, running = 0, 0
+local entries = redis.call('HGETALL', held)
+for i = 1, #entries, 2 do
+    if entries[i] ~= wid and alive(entries[i]) then
+        used = used + tonumber(entries[i + 1])
+        running = running + 1
+    end
+end
+local ahead = 0
+entries = redis.call('HGETALL', waiting)
+for i = 1, #entries, 2 do
+    local w = entries[i]
+    local mb, t, expires = string.match(entries[i + 1], '^(%d+):([^:]+):?(.*)$')
+    local live
+    if expires ~= '' and expires ~= nil then
+        live = tonumber(expires) > now
+        if not live then
+            redis.call('HDEL', waiting, w)
+        end
+    else
+        live = alive(w)
+    end
+    if w ~= wid and mb and tonumber(t) < since and live then
+        ahead = ahead + tonumber(mb)
+    end
+end
+if (running == 0 and ahead == 0) or used + ahead + need <= budget then
+    redis.call('HSET', held, wid, need)
+    redis.call('HDEL', waiting, wid)
+    return 1
+end
+redis.call('HSET', waiting, wid, need .. ':' .. ARGV[7])
+return 0
+"""
+
+
+def _mem_total_mb() -> Optional[int]:
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return None
+
+
+def budget_mb() -> Optional[int]:
+    """节点预算（MB）；None 表示不做准入控制"""
+    if NODE_MEM_BUDGET_MB:
+        budget = int(NODE_MEM_BUDGET_MB)
+    else:
+        total = _mem_total_mb()
+        if total is None:
+            return None
+        budget = total - MEM_HEADROOM_MB
+    return budget if budget > 0 else None
+
+
+def job_mem_mb(task: dict, parallel: int = 1) -> int:
+    """提交需要预留的内存：maxMemory * 同时运行的测试点数 + 编译余量"""
+    try:
+        mem_mb = int((task.get("limitations") or {}).get("maxMemory", DEFAULT_MEM_LIMIT_MB))
+    except (TypeError, ValueError):
+        mem_mb = DEFAULT_MEM_LIMIT_MB
+    headroom = 0 if task.get("language") == "python" else COMPILE_HEADROOM_MB
+    return max(0, mem_mb) * max(1, parallel) + headroom
+
+
+def _job_field(submission_id) -> str:
+    return f"job:{submission_id}" if submission_id is not None else ""
+
+
+def reserve(rds, worker_id: str, need: int, budget: int, since: float, submission_id=None) -> bool:
+    return bool(int(rds.eval(_RESERVE_LUA, 0, QUEUE_KEY, HELD_KEY, WAIT_KEY, worker_id, need, budget, since,
+                             time.time(), _job_field(submission_id))))
+
+
+def _held_since(rds, submission_id) -> Optional[float]:
+    """提交上次放回队列时保留的等待位置的开始时间"""
+    if submission_id is None:
+        return None
+    raw = rds.hget(WAIT_KEY, _job_field(submission_id))
+    try:
+        return float(raw.split(":")[1]) if raw else None
+    except (IndexError, ValueError):
+        return None
+
+
+def admit(rds, worker_id: str, need: int, submission_id=None, wait_sec: float = ADMISSION_WAIT_SEC) -> str:
+    """
+    为 worker_id 手上的提交预留 need MB，放不下时最多等待 wait_sec 秒。
+    返回 "admitted"（立即准入）、"waited"（等待后准入）或 "deferred"（仍放不下，调用方放回队列）。
+    deferred 时为 submission_id 保留等待位置（见模块说明），再次取到时从最初开始等待的时间算起。
+    """
+    budget = budget_mb()
+    if budget is None:
+        return "admitted"
+    now = time.time()
+    since = min(now, _held_since(rds, submission_id) or now)
+    if reserve(rds, worker_id, need, budget, since, submission_id):
+        return "admitted"
+    deadline = now + wait_sec
+    while time.time() < deadline:
+        time.sleep(POLL_INTERVAL)
+        if reserve(rds, worker_id, need, budget, since):
+            return "waited"
+    pipe = rds.pipeline()
+    pipe.hdel(WAIT_KEY, worker_id)
+    if submission_id is not None:
+        pipe.hset(WAIT_KEY, _job_field(submission_id), f"{need}:{since}:{time.time() + ADMISSION_HOLD_SEC}")
+    pipe.execute()
+    return "deferred"
+
+
+def release(rds, worker_id: str) -> None:
+    pipe = rds.pipeline()
+    pipe.hdel(HELD_KEY, worker_id)
+    pipe.hdel(WAIT_KEY, worker_id)
+    pipe.execute()
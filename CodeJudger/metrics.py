@@ -0,0 +1,120 @@
+# metrics.py
+"""
+判题机指标（Prometheus 文本格式）
+
+所有 worker 把直方图与计数写到 Redis，app.py 的 /metrics 汇总输出：
+  judge:metrics:hist:<name>     hash  "<labels>|<le>" -> 落在该桶的次数（输出时再累加），"<labels>|sum" / "<labels>|count"
+  judge:metrics:counter:<name>  hash  "<labels>" -> 次数
+labels 编码为 k1=v1,k2=v2。直方图单位为秒。
+"""
+from typing import Dict, List, Optional
+from config import QUEUE_KEY
+
+METRICS_PREFIX = f"{QUEUE_KEY}:metrics"
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300]
+
+# 直方图名 -> 说明
+HISTOGRAMS = {
+    "judge_queue_wait_seconds": "从入队（created_at）到被 worker 取走的时间",
+    "judge_box_acquire_seconds": "worker 等待就绪 box 的时间",
+    "judge_box_init_seconds": "box 初始化（cleanup + init）耗时",
+    "judge_compile_seconds": "编译耗时（不含编译缓存命中）",
+    "judge_case_run_seconds": "单个测试点运行耗时（含沙箱开销的墙钟时间）",
+    "judge_case_compare_seconds": "单个测试点输出比较（checker）耗时",
+    "judge_checker_compile_seconds": "testlib checker 编译耗时（每台判题机每个 checker 一次）",
+    "judge_container_exec_seconds": "Docker 判题单次 exec/run 耗时",
+    "judge_total_seconds": "单次判题总耗时",
+    "judge_callback_seconds": "回调批量投递的 HTTP 往返耗时",
+}
+COUNTERS = {
+    "judge_verdicts_total": "按结果与语言统计的判题次数",
+    "judge_result_cache_total": "判题结果缓存查找次数（hit / miss / bypass）",
+    "judge_reused_cases_total": "增量重判中沿用旧结果、未重新运行的测试点数",
+    "judge_watchdog_kills_total": "超过单次提交判题时间上限、被看门狗结束的提交数",
+    "judge_mem_admission_total": "节点内存准入结果（admitted / waited / deferred，deferred 表示放回队列）",
+}
+
+
+def _labels(labels: Optional[Dict[str, str]]) -> str:
+    return ",".join(f"{k}={v}" for k, v in sorted((labels or {}).items()))
+
+
+def observe(pipe, name: str, seconds: float, labels: Optional[Dict[str, str]] = None) -> None:
+    """记录一次观测值；pipe 可以是 Redis 连接或 pipeline"""
+    key = f"{METRICS_PREFIX}:hist:{name}"
+    lb = _labels(labels)
+    le = next((str(b) for b in BUCKETS if seconds <= b), "+Inf")
+    pipe.hincrby(key, f"{lb}|{le}", 1)
+    pipe.hincrbyfloat(key, f"{lb}|sum", seconds)
+    pipe.hincrby(key, f"{lb}|count", 1)
+
+
+def inc(pipe, name: str, labels: Optional[Dict[str, str]] = None, amount: int = 1) -> None:
+    pipe.hincrby(f"{METRICS_PREFIX}:counter:{name}", _labels(labels), amount)
+
+
+def observe_result(rds, result: dict, language: str) -> None:
+    """记录 judge_submission / judge_submission_docker 返回的各阶段耗时与结果"""
+    pipe = rds.pipeline(transaction=False)
+    timings = result.get("timings") or {}
+    lang = {"language": language}
+    if "box_init_ms" in timings:
+        observe(pipe, "judge_box_init_seconds", timings["box_init_ms"] / 1000)
+    if timings.get("compile_ms") is not None:
+        observe(pipe, "judge_compile_seconds", timings["compile_ms"] / 1000, lang)
+    if "checker_compile_ms" in timings:
+        observe(pipe, "judge_checker_compile_seconds", timings["checker_compile_ms"] / 1000)
+    if "exec_ms" in timings:
+        observe(pipe, "judge_container_exec_seconds", timings["exec_ms"] / 1000, lang)
+    if "total_ms" in timings:
+        observe(pipe, "judge_total_seconds", timings["total_ms"] / 1000, lang)
+    for case in result.get("cases", []):
+        case_timings = case.get("timings") or {}
+        if "run_ms" in case_timings:
+            observe(pipe, "judge_case_run_seconds", case_timings["run_ms"] / 1000, lang)
+        if "compare_ms" in case_timings:
+            observe(pipe, "judge_case_compare_seconds", case_timings["compare_ms"] / 1000,
+                    {"checker": result.get("checker", "exact")})
+    inc(pipe, "judge_verdicts_total", {"verdict": result.get("status", "error"), "language": language})
+    pipe.execute()
+
+
+def _prom_labels(lb: str, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in (item.split("=", 1) for item in lb.split(",") if item)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def render(rds, lane_depths: Dict[str, int]) -> str:
+    lines: List[str] = [
+        "# HELP judge_queue_depth 各优先级队列待判任务数",
+        "# TYPE judge_queue_depth gauge",
+    ]
+    for lane, depth in lane_depths.items():
+        lines.append(f'judge_queue_depth{{lane="{lane}"}} {depth}')
+
+    for name, help_text in HISTOGRAMS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        raw = rds.hgetall(f"{METRICS_PREFIX}:hist:{name}")
+        series: Dict[str, Dict[str, str]] = {}
+        for field, value in raw.items():
+            lb, _, part = field.rpartition("|")
+            series.setdefault(lb, {})[part] = value
+        for lb, parts in sorted(series.items()):
+            cumulative = 0
+            for b in BUCKETS:
+                cumulative += int(parts.get(str(b), 0))
+                le = 'le="%s"' % b
+                lines.append(f"{name}_bucket{_prom_labels(lb, le)} {cumulative}")
+            cumulative += int(parts.get("+Inf", 0))
+            inf = _prom_labels(lb, 'le="+Inf"')
+            lines.append(f"{name}_bucket{inf} {cumulative}")
+            lines.append(f"{name}_sum{_prom_labels(lb)} {float(parts.get('sum', 0))}")
+            lines.append(f"{name}_count{_prom_labels(lb)} {int(parts.get('count', 0))}")
+
+    for name, help_text in COUNTERS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for lb, value in sorted(rds.hgetall(f"{METRICS_PREFIX}:counter:{name}").items()):
+            lines.append(f"{name}{_prom_labels(lb)} {int(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,89 @@
+# pch.py
+"""
+<bits/stdc++.h> 预编译头
+
+按 编译器版本 + 编译参数 生成目录 PCH_DIR/<key>/bits/stdc++.h.gch，
+编译时把该目录只读绑定进 box 并放在 include 搜索路径最前面：
+g++ 在搜索 <bits/stdc++.h> 时先检查同目录下的 .gch，参数一致就直接载入，否则照常使用原头文件。
+编译器升级后 key 随之改变，第一次用到时在后台重新生成，生成完成前照常编译。
+"""
+import os
+import fcntl
+import shutil
+import hashlib
+import tempfile
+import threading
+import subprocess
+from typing import List, Optional
+from config import PCH_DIR, PCH_ENABLED
+import compile_cache
+
+HEADER = "bits/stdc++.h"
+
+_building = set()  # 本进程正在后台生成的 key
+_mutex = threading.Lock()
+
+
+def _key(compiler: str, flags: List[str]) -> str:
+    h = hashlib.sha256()
+    h.update(compile_cache.compiler_version(compiler).encode())
+    h.update("\0".join(flags).encode())
+    return h.hexdigest()[:16]
+
+
+def _build(compiler: str, flags: List[str], key: str) -> None:
+    dest = os.path.join(PCH_DIR, key)
+    os.makedirs(PCH_DIR, exist_ok=True)
+    # 多个 worker 进程同时发现缺失时只生成一次
+    with open(os.path.join(PCH_DIR, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.exists(os.path.join(dest, HEADER + ".gch")):
+            return
+        tmp = tempfile.mkdtemp(prefix=".tmp-", dir=PCH_DIR)
+        try:
+            wrapper = os.path.join(tmp, "pch.h")
+            with open(wrapper, "w") as f:
+                f.write(f"#include <{HEADER}>\n")
+            os.makedirs(os.path.join(tmp, os.path.dirname(HEADER)))
+            proc = subprocess.run(
+                [compiler, *flags, "-x", "c++-header", wrapper, "-o", os.path.join(tmp, HEADER + ".gch")],
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            if proc.returncode != 0:
+                print(f"[PCH] failed to build {HEADER}: {proc.stderr.strip()}")
+                return
+            os.unlink(wrapper)
+            os.rename(tmp, dest)
+            tmp = None
+        finally:
+            if tmp:
+                shutil.rmtree(tmp, ignore_errors=True)
+        # 旧编译器 / 旧参数生成的 PCH 不再使用
+        for name in os.listdir(PCH_DIR):
+            if name not in (key, ".lock") and not name.startswith(".tmp-"):
+                shutil.rmtree(os.path.join(PCH_DIR, name), ignore_errors=True)
+
+
+def _build_in_background(compiler: str, flags: List[str], key: str) -> None:
+    try:
+        _build(compiler, flags, key)
+    finally:
+        with _mutex:
+            _building.discard(key)
+
+
+def lookup(compiler: str, flags: List[str]) -> Optional[str]:
+    """
+    返回可用的 PCH 目录（宿主机路径），还没有时在后台生成并返回 None。
+    flags 须与实际编译时影响代码生成的参数完全一致（如 -O2 -std=c++17）。
+    """
+    if not PCH_ENABLED:
+        return None
+    key = _key(compiler, flags)
+    dest = os.path.join(PCH_DIR, key)
+    if os.path.exists(os.path.join(dest, HEADER + ".gch")):
+        return dest
+    with _mutex:
+        if key not in _building:
+            _building.add(key)
+            threading.Thread(target=_build_in_background, args=(compiler, flags, key), daemon=True).start()
+    return None
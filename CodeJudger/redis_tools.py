@@ -0,0 +1,131 @@
+# redis_tools.py
+"""
+判题机 Redis 维护工具
+
+  python redis_tools.py report             按键族统计键数、内存占用（MEMORY USAGE）与未设置 TTL 的键数
+  python redis_tools.py compact [--dry-run]
+      - judge:sub:* 没有 TTL 的（升级前写入的）按 finished_at/created_at 补上剩余 TTL，已过期的直接删除
+      - 未压缩的大 result 字段改为压缩存储
+      - 没有 TTL 的 blob 补上 BLOB_TTL_SEC
+"""
+import re
+import argparse
+from datetime import datetime
+from typing import Dict, Iterator, List
+import redis
+import blobs
+from config import (REDIS_URL, SUB_HASH_PREFIX, BLOB_PREFIX, RESULT_TTL_SEC, SELFTEST_TTL_SEC,
+                    BLOB_TTL_SEC, COMPRESS_MIN_BYTES)
+
+_ID_PART = re.compile(r"\d+|[0-9a-f]{16,}|selftest_[0-9a-f]+")
+BATCH = 500
+
+
+def family(key: str) -> str:
+    """把键中的 id 部分替换为 *，例如 judge:queue:live:u:42 -> judge:queue:live:u:*"""
+    return ":".join("*" if _ID_PART.fullmatch(part) else part for part in key.split(":"))
+
+
+def _batches(rds, match: str = "*") -> Iterator[List[str]]:
+    batch = []
+    for key in rds.scan_iter(match=match, count=1000):
+        batch.append(key)
+        if len(batch) >= BATCH:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def report(rds) -> None:
+    stats: Dict[str, List[int]] = {}  # family -> [键数, 字节, 无 TTL 键数]
+    for batch in _batches(rds):
+        pipe = rds.pipeline(transaction=False)
+        for key in batch:
+            pipe.memory_usage(key)
+            pipe.ttl(key)
+        replies = pipe.execute()
+        for key, usage, ttl in zip(batch, replies[::2], replies[1::2]):
+            s = stats.setdefault(family(key), [0, 0, 0])
+            s[0] += 1
+            s[1] += usage or 0
+            s[2] += 1 if ttl == -1 else 0
+
+    total = sum(s[1] for s in stats.values()) or 1
+    print(f"{'family':<48} {'keys':>10} {'memory':>12} {'share':>7} {'no-ttl':>8}")
+    for name, (count, usage, no_ttl) in sorted(stats.items(), key=lambda kv: -kv[1][1]):
+        print(f"{name:<48} {count:>10} {usage / 1024 / 1024:>10.2f}MB {100 * usage / total:>6.1f}% {no_ttl:>8}")
+    print(f"{'total':<48} {sum(s[0] for s in stats.values()):>10} {total / 1024 / 1024:>10.2f}MB")
+
+
+def _age_sec(fields: dict) -> float:
+    for name in ("finished_at", "created_at"):
+        try:
+            return (datetime.now() - datetime.fromisoformat(fields[name])).total_seconds()
+        except (KeyError, ValueError):
+            continue
+    return 0.0
+
+
+def compact(rds, dry_run: bool = False) -> None:
+    expired = ttl_set = packed = blob_ttl = 0
+    for batch in _batches(rds, SUB_HASH_PREFIX + "*"):
+        pipe = rds.pipeline(transaction=False)
+        for key in batch:
+            pipe.ttl(key)
+            pipe.hgetall(key)
+        replies = pipe.execute()
+
+        pipe = rds.pipeline(transaction=False)
+        for key, ttl, fields in zip(batch, replies[::2], replies[1::2]):
+            if ttl == -1:
+                limit = SELFTEST_TTL_SEC if key[len(SUB_HASH_PREFIX):].startswith("selftest_") else RESULT_TTL_SEC
+                remaining = int(limit - max(0.0, _age_sec(fields)))
+                if remaining <= 0:
+                    pipe.delete(key)
+                    expired += 1
+                    continue
+                pipe.expire(key, remaining)
+                ttl_set += 1
+            result = fields.get("result") or ""
+            if len(result) >= COMPRESS_MIN_BYTES and blobs.unpack(result) == result:
+                pipe.hset(key, "result", blobs.pack(result))
+                packed += 1
+        if not dry_run:
+            pipe.execute()
+
+    for batch in _batches(rds, BLOB_PREFIX + "*"):
+        pipe = rds.pipeline(transaction=False)
+        for key in batch:
+            pipe.ttl(key)
+        ttls = pipe.execute()
+        pipe = rds.pipeline(transaction=False)
+        for key, ttl in zip(batch, ttls):
+            if ttl == -1:
+                pipe.expire(key, BLOB_TTL_SEC)
+                blob_ttl += 1
+        if not dry_run:
+            pipe.execute()
+
+    prefix = "[dry-run] would have" if dry_run else ""
+    print(f"{prefix} deleted {expired} expired results, set TTL on {ttl_set} results, "
+          f"compressed {packed} results, set TTL on {blob_ttl} blobs".strip())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="判题机 Redis 维护工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("report", help="按键族统计内存占用")
+    p_compact = sub.add_parser("compact", help="补 TTL、删除过期结果、压缩大字段")
+    p_compact.add_argument("--dry-run", action="store_true", help="只统计，不修改")
+    args = parser.parse_args()
+
+    rds = redis.from_url(REDIS_URL, decode_responses=True)
+    if args.command == "report":
+        report(rds)
+    else:
+        compact(rds, dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
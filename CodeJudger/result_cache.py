@@ -0,0 +1,68 @@
+# result_cache.py
+"""
+判题结果缓存（所有判题机共用 Redis）
+
+学生重复提交一字不差的代码、重判数据未改动的题目时，直接复用上一次的结果，跳过编译与运行。
+key = sha256(规范化源码, 语言, limitations, 测试数据版本, 沙箱后端)
+  - 规范化只统一换行符（CRLF -> LF）并去掉文件末尾的空白，不改动代码内容
+  - 测试数据版本为 manifest.json 的 version，随测试数据与 checker 变化；没有 manifest 的旧数据不缓存
+  - 自测（任务自带测试数据）不缓存
+存储: RESULT_CACHE_PREFIX<key> -> 结果 JSON（压缩，带 RESULT_CACHE_TTL_SEC 过期）
+IE 结果不缓存（多为判题机自身问题）；缓存中去掉各阶段耗时，命中时不计入耗时指标。
+对时间敏感的重判可在任务里带 no_cache 跳过查找（仍会用新结果刷新缓存）。
+"""
+import json
+import hashlib
+from datetime import datetime
+from typing import Optional
+from config import RESULT_CACHE_PREFIX, RESULT_CACHE_TTL_SEC
+from testdata import load_version
+import blobs
+
+
+def _enabled() -> bool:
+    return RESULT_CACHE_TTL_SEC > 0
+
+
+def normalize_source(source_code: str) -> str:
+    return source_code.replace("\r\n", "\n").rstrip()
+
+
+def cache_key(problem_id, language: str, source_code: str, limitations: dict, sandbox_name: str) -> Optional[str]:
+    """不可缓存（已关闭、没有题目或测试数据版本）时返回 None"""
+    if not _enabled() or not problem_id:
+        return None
+    version = load_version(problem_id)
+    if not version:
+        return None
+    h = hashlib.sha256()
+    for part in [language, json.dumps(limitations or {}, sort_keys=True), version, sandbox_name]:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    h.update(normalize_source(source_code).encode("utf-8"))
+    return h.hexdigest()
+
+
+def lookup(rds, key: str) -> Optional[dict]:
+    """命中时返回缓存的结果，标记 cached / cached_from，finished_at 为本次时间"""
+    value = rds.get(RESULT_CACHE_PREFIX + key)
+    if value is None:
+        return None
+    try:
+        entry = json.loads(blobs.unpack(value))
+    except ValueError:
+        return None
+    result = entry["result"]
+    result["cached"] = True
+    result["cached_from"] = entry["submission_id"]
+    result["finished_at"] = datetime.now().isoformat()
+    return result
+
+
+def store(rds, key: str, result: dict, submission_id: str) -> None:
+    if result.get("status") in (None, "IE"):
+        return
+    result = {k: v for k, v in result.items() if k not in ("timings", "box_setup_saved_ms", "cached", "cached_from")}
+    result["cases"] = [{k: v for k, v in case.items() if k != "timings"} for case in result.get("cases", [])]
+    entry = {"submission_id": submission_id, "result": result}
+    rds.set(RESULT_CACHE_PREFIX + key, blobs.pack(json.dumps(entry)), ex=RESULT_CACHE_TTL_SEC)
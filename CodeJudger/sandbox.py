@@ -0,0 +1,563 @@
+# sandbox.py
+"""
+判题沙箱后端
+
+judge_submission 只通过 Sandbox 接口使用沙箱，一个 slot（isolate 的 box-id / rlimit 的目录 / 一个容器）上依次：
+  prepare(slot)                      初始化，返回宿主机上的工作目录
+  compile(slot, cmd)                 在工作目录中编译，返回 (code, meta, out, err)
+  run_case(slot, cmd, name, ...)     运行一个测试点，输出写到工作目录下 <name>.stdout，返回 (code, meta, err)
+  collect_meta(meta)                 把 meta 文本解析为 dict（统一为 isolate 的 key：time、max-rss、status、exitsig…）
+  reset(slot)                        清理
+code 非 0 表示程序没有正常结束（与 isolate 的退出码一致）。
+
+后端：
+  isolate  isolate + cgroup，默认
+  docker   预热容器中 docker exec（见 container_pool.py）；另有整份提交一次 exec 的快速路径 judge()，worker 优先使用
+  rlimit   直接在宿主机上以 setrlimit 限制运行，有 libseccomp 的 Python 绑定时再加 seccomp 过滤网络等系统调用。
+           内存由 RLIMIT_DATA 硬性限制，但没有文件系统、用户与 cgroup 隔离，只适合可信代码或外层已有隔离（如整台节点是一次性 VM）
+
+每台节点通过 SANDBOX_BACKENDS（语言:后端）选择各语言的后端；没有隔离的后端（rlimit）须同时设置 ALLOW_UNISOLATED_SANDBOX=1。
+"""
+import os
+import math
+import time
+import errno
+import shlex
+import shutil
+import signal
+import ctypes
+import resource
+import tempfile
+import threading
+import subprocess
+from typing import Dict, List, Tuple
+from config import (ISOLATE_BIN, ISOLATE_BOX_ROOT, DEFAULT_OUTPUT_LIMIT_KB, SANDBOX_BACKENDS,
+                    DEFAULT_SANDBOX, DOCKER_IMAGE, RLIMIT_SANDBOX_ROOT, WALL_TIME_FACTOR, WALL_TIME_EXTRA,
+                    ALLOW_UNISOLATED_SANDBOX)
+import cpus
+
+try:
+    import seccomp  # libseccomp 的 Python 绑定（python3-seccomp），可选
+except ImportError:
+    seccomp = None
+
+COMPILE_TIME_LIMIT = 10.0
+COMPILE_MEM_MB = 1024
+STACK_KB = 65536
+SANDBOX_PATH = "PATH=/usr/bin:/usr/bin"
+
+# rlimit 后端禁止的系统调用（返回 EPERM）
+_DENIED_SYSCALLS = ["socket", "socketpair", "connect", "bind", "listen", "ptrace", "process_vm_readv",
+                    "process_vm_writev", "mount", "umount2", "unshare", "setns", "chroot", "pivot_root",
+                    "kexec_load", "reboot", "bpf", "keyctl", "add_key", "request_key", "perf_event_open"]
+_PR_SET_NO_NEW_PRIVS = 38
+_PR_SET_SECCOMP = 22
+_SECCOMP_MODE_FILTER = 2
+# 分配失败（超过 RLIMIT_DATA）时各语言运行时在 stderr 留下的痕迹，据此把异常退出判为 MLE
+_OOM_MARKERS = (b"std::bad_alloc", b"MemoryError", b"java.lang.OutOfMemoryError", b"Cannot allocate memory")
+
+
+def wall_time_limit(time_limit: float) -> float:
+    """由 CPU 时间上限推出的墙钟上限（秒）"""
+    return round(time_limit * WALL_TIME_FACTOR + WALL_TIME_EXTRA, 3)
+
+
+def _run_cmd(cmd: List[str]) -> subprocess.CompletedProcess:
+    return subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+
+def _read(path: str) -> str:
+    if not os.path.exists(path):
+        return ""
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        return f.read()
+
+
+def parse_meta(meta: str) -> dict:
+    """解析 isolate --meta 输出（每行 key:value）"""
+    fields = {}
+    for line in meta.splitlines():
+        key, sep, value = line.partition(":")
+        if sep:
+            fields[key.strip()] = value.strip()
+    return fields
+
+
+def format_meta(fields: dict) -> str:
+    return "".join(f"{k}:{v}\n" for k, v in fields.items())
+
+
+class Sandbox:
+    name = ""
+    batch = False     # True 表示后端另有整份提交一次完成的 judge()，worker 直接调用
+    isolated = True   # False 表示没有文件系统 / 网络 / 用户隔离，不能用来运行不可信的提交
+
+    def workdir(self, slot: int) -> str:
+        raise NotImplementedError
+
+    def prepare(self, slot: int) -> str:
+        raise NotImplementedError
+
+    def reset(self, slot: int) -> None:
+        raise NotImplementedError
+
+    def run(
+        self,
+        slot: int,
+        cmd: List[str],
+        time_limit: float,
+        mem_mb: int,
+        stdin_file: str = "",
+        stdout_file: str = "stdout.txt",
+        stderr_file: str = "stderr.txt",
+        datadir: str = "",
+        fsize_kb: int = DEFAULT_OUTPUT_LIMIT_KB,
+        extra_dirs: List[str] = (),
+    ) -> Tuple[int, str]:
+        """
+        在 slot 的工作目录中运行 cmd，返回 (code, meta 文本)。
+        stdin_file：datadir 非空时为 datadir 下的文件名，否则为工作目录下 data/ 中的文件名。
+        extra_dirs：额外只读可见的目录，"path"（沙箱内外路径相同）或 "沙箱内路径=宿主机路径"
+        """
+        raise NotImplementedError
+
+    def compile(self, slot: int, cmd: List[str], extra_dirs: List[str] = ()) -> Tuple[int, str, str, str]:
+        code, meta = self.run(slot, cmd, COMPILE_TIME_LIMIT, COMPILE_MEM_MB, extra_dirs=extra_dirs)
+        workdir = self.workdir(slot)
+        return code, meta, _read(os.path.join(workdir, "stdout.txt")), _read(os.path.join(workdir, "stderr.txt"))
+
+    def run_case(
+        self,
+        slot: int,
+        cmd: List[str],
+        name: str,
+        stdin_file: str,
+        datadir: str,
+        time_limit: float,
+        mem_mb: int,
+        extra_dirs: List[str] = (),
+    ) -> Tuple[int, str, str]:
+        """输出留在工作目录下的 <name>.stdout，由调用方流式比较"""
+        code, meta = self.run(slot, cmd, time_limit, mem_mb, stdin_file=stdin_file,
+                              stdout_file=f"{name}.stdout", stderr_file=f"{name}.stderr",
+                              datadir=datadir, extra_dirs=extra_dirs)
+        return code, meta, _read(os.path.join(self.workdir(slot), f"{name}.stderr"))
+
+    def collect_meta(self, meta: str) -> dict:
+        return parse_meta(meta)
+
+
+class IsolateSandbox(Sandbox):
+    name = "isolate"
+
+    def workdir(self, slot: int) -> str:
+        return os.path.join(ISOLATE_BOX_ROOT, str(slot), "box")
+
+    def _box_cmd(self, slot: int, action: str) -> None:
+        proc = _run_cmd([ISOLATE_BIN, f"--box-id={slot}", action, "--cg"])
+        if proc.returncode != 0:
+            raise RuntimeError(f"isolate {action} of box {slot} failed with exit code {proc.returncode}: "
+                               f"{proc.stderr.strip()}")
+
+    def prepare(self, slot: int) -> str:
+        self._box_cmd(slot, "--init")
+        return self.workdir(slot)
+
+    def reset(self, slot: int) -> None:
+        self._box_cmd(slot, "--cleanup")
+
+    def run(self, slot, cmd, time_limit, mem_mb, stdin_file="", stdout_file="stdout.txt",
+            stderr_file="stderr.txt", datadir="", fsize_kb=DEFAULT_OUTPUT_LIMIT_KB, extra_dirs=()):
+        with tempfile.NamedTemporaryFile(prefix="iso_meta_", delete=False) as meta_tmp:
+            meta_path = meta_tmp.name
+
+        args = [
+            ISOLATE_BIN,
+            f"--box-id={slot}",
+            "--run",
+            "--cg",
+            f"--time={time_limit}",
+            f"--wall-time={wall_time_limit(time_limit)}",
+            f"--mem={mem_mb * 1024}",
+            f"--fsize={fsize_kb}",
+            "--meta", meta_path,
+            "--cg-mem", str(mem_mb * 1024),
+            "-p",
+            "-E", SANDBOX_PATH,
+            "-o", stdout_file,
+            "-r", stderr_file,
+            "-k", str(STACK_KB),
+            "--"
+        ] + list(cmd)
+
+        for d in extra_dirs:
+            args.insert(3, f"--dir={d}")
+
+        # stdin/stdout/stderr 使用沙箱路径
+        if datadir:
+            args.insert(3, f"--dir=/data={datadir}",)
+            args.insert(3, f"--stdin=/data/{stdin_file}")
+        elif stdin_file:
+            args.insert(3, f"--stdin=data/{stdin_file}")
+
+        proc = _run_cmd(args)
+        try:
+            meta = _read(meta_path)
+        finally:
+            os.unlink(meta_path)
+        return proc.returncode, meta
+
+
+class _SockFprog(ctypes.Structure):
+    """struct sock_fprog"""
+    _fields_ = [("len", ctypes.c_ushort), ("filter", ctypes.c_void_p)]
+
+
+_prctl = ctypes.CDLL(None, use_errno=True).prctl
+_prctl.argtypes = [ctypes.c_int, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_ulong]
+_prctl.restype = ctypes.c_int
+_seccomp_lock = threading.Lock()
+_seccomp_prog = None  # (BPF 指令缓冲区, sock_fprog)，首次使用时生成
+
+
+def _seccomp_program():
+    """
+    把 _DENIED_SYSCALLS 过滤器编译成 BPF 程序，每个进程只编译一次。
+    编译（libseccomp 分配内存等）在父进程中完成，子进程 exec 前只需调用 prctl。
+    """
+    global _seccomp_prog
+    with _seccomp_lock:
+        if _seccomp_prog is None:
+            f = seccomp.SyscallFilter(defaction=seccomp.ALLOW)
+            for name in _DENIED_SYSCALLS:
+                try:
+                    f.add_rule(seccomp.ERRNO(errno.EPERM), name)
+                except (RuntimeError, ValueError):
+                    pass  # 当前架构没有该系统调用
+            with tempfile.TemporaryFile() as tmp:
+                f.export_bpf(tmp)
+                tmp.seek(0)
+                code = tmp.read()
+            buf = ctypes.create_string_buffer(code, len(code))
+            _seccomp_prog = (buf, _SockFprog(len(code) // 8, ctypes.addressof(buf)))
+        return _seccomp_prog[1]
+
+
+def _child_setup(limits: List[Tuple[int, int]], harden: bool):
+    """
+    返回 Popen 的 preexec_fn。worker 是多线程的，fork 之后到 exec 之前的子进程里只能做异步信号安全的事：
+    参数全部在父进程中准备好，子进程里只调用 setrlimit / prctl 系统调用。
+    harden：禁止提权，可用时加载 seccomp 过滤。
+    """
+    prog = ctypes.addressof(_seccomp_program()) if harden and seccomp is not None else None
+    prctl = _prctl
+
+    def setup():
+        for res, value in limits:
+            resource.setrlimit(res, (value, value))
+        if harden:
+            prctl(_PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0)
+        if prog is not None:
+            if prctl(_PR_SET_SECCOMP, _SECCOMP_MODE_FILTER, prog, 0, 0) != 0:
+                os._exit(127)
+
+    return setup
+
+
+def exec_limited(
+    cwd: str,
+    cmd: List[str],
+    env: Dict[str, str],
+    stdin: str,
+    stdout: str,
+    stderr: str,
+    time_limit: float = 0,
+    mem_kb: int = 0,
+    fsize_kb: int = 0,
+    stack_kb: int = 0,
+    harden: bool = True,
+    wall_time: float = 0,
+) -> dict:
+    """
+    以 setrlimit 限制运行 cmd（subprocess.Popen 启动，见 _child_setup），返回 isolate 口径的 meta 字段：
+    time / time-wall（秒）、max-rss（KB）、exitcode、exitsig、status（RE/SG/TO）、message。
+    mem_kb 通过 RLIMIT_DATA（堆与匿名映射）硬性限制，超过的分配直接失败；不用 RLIMIT_AS，
+    JVM 等运行时预留的虚拟地址空间远大于实际使用。max-rss 超过 mem_kb、或异常退出且 stderr 中有分配失败的痕迹时，
+    视为被 OOM 杀死（status:SG exitsig:9 cg-oom-killed:1）。
+    wall_time：墙钟上限（秒），0 表示按 time_limit 推出（wall_time_limit），超时整个进程组被杀死并判为 TO。
+    """
+    limits = [(resource.RLIMIT_CORE, 0)]
+    if time_limit:
+        limits.append((resource.RLIMIT_CPU, math.ceil(time_limit) + 1))
+    if fsize_kb:
+        limits.append((resource.RLIMIT_FSIZE, fsize_kb * 1024))
+    if stack_kb:
+        limits.append((resource.RLIMIT_STACK, stack_kb * 1024))
+    if mem_kb:
+        limits.append((resource.RLIMIT_DATA, mem_kb * 1024))
+    start = time.monotonic()
+    stdout, stderr = os.path.join(cwd, stdout), os.path.join(cwd, stderr)
+    try:
+        with open(os.path.join(cwd, stdin) if stdin else os.devnull, "rb") as fin, \
+                open(stdout, "wb") as fout, open(stderr, "wb") as ferr:
+            proc = subprocess.Popen(cmd, cwd=cwd, env=env, stdin=fin, stdout=fout, stderr=ferr,
+                                    start_new_session=True, preexec_fn=_child_setup(limits, harden))
+    except (OSError, subprocess.SubprocessError) as e:
+        with open(stderr, "a") as f:
+            f.write(f"exec failed: {e}\n")
+        return {"time": "0.000", "time-wall": f"{time.monotonic() - start:.3f}", "max-rss": 0,
+                "exitcode": 127, "status": "RE", "message": "Exited with error status 127"}
+    pid = proc.pid
+
+    # 墙钟兜底：只限 CPU 时间时防止 sleep / 阻塞读的程序一直占着 slot
+    timed_out = threading.Event()
+
+    def _kill():
+        timed_out.set()
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    wall_time = wall_time or (wall_time_limit(time_limit) if time_limit else 0)
+    timer = threading.Timer(wall_time, _kill) if wall_time else None
+    if timer:
+        timer.start()
+    _, status, usage = os.wait4(pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)  # 已由 wait4 回收
+    if timer:
+        timer.cancel()
+    try:
+        os.killpg(pid, signal.SIGKILL)  # 选手程序留下的子进程
+    except (ProcessLookupError, PermissionError):
+        pass
+
+    cpu_time = usage.ru_utime + usage.ru_stime
+    fields = {
+        "time": f"{cpu_time:.3f}",
+        "time-wall": f"{time.monotonic() - start:.3f}",
+        "max-rss": usage.ru_maxrss,
+        "csw-voluntary": usage.ru_nvcsw,
+        "csw-forced": usage.ru_nivcsw,
+    }
+    failed = os.WIFSIGNALED(status) or os.WEXITSTATUS(status) != 0
+    if mem_kb and (usage.ru_maxrss > mem_kb or (failed and _allocation_failed(stderr))):
+        fields.update({"cg-oom-killed": 1, "exitsig": 9, "status": "SG", "message": "Caught fatal signal 9"})
+    elif timed_out.is_set() or (time_limit and cpu_time > time_limit) or \
+            (os.WIFSIGNALED(status) and os.WTERMSIG(status) == signal.SIGXCPU):
+        fields.update({"killed": 1, "status": "TO",
+                       "message": "Time limit exceeded (wall clock)" if timed_out.is_set() else "Time limit exceeded"})
+    elif os.WIFSIGNALED(status):
+        sig = os.WTERMSIG(status)
+        fields.update({"exitsig": sig, "status": "SG", "message": f"Caught fatal signal {sig}"})
+    elif os.WEXITSTATUS(status) != 0:
+        code = os.WEXITSTATUS(status)
+        fields.update({"exitcode": code, "status": "RE", "message": f"Exited with error status {code}"})
+    else:
+        fields["exitcode"] = 0
+    return fields
+
+
+def _allocation_failed(stderr_path: str) -> bool:
+    """stderr 末尾是否有分配失败的痕迹"""
+    try:
+        with open(stderr_path, "rb") as f:
+            f.seek(max(0, os.fstat(f.fileno()).st_size - 4096))
+            tail = f.read()
+    except OSError:
+        return False
+    return any(marker in tail for marker in _OOM_MARKERS)
+
+
+def map_path(path: str, dirs: List[Tuple[str, str]], cwd: str) -> str:
+    """沙箱内路径 -> 宿主机路径；dirs 为 [(沙箱内路径, 宿主机路径)]"""
+    for inside, host in dirs:
+        if path == inside or path.startswith(inside + "/"):
+            return host + path[len(inside):]
+    return path if os.path.isabs(path) else os.path.join(cwd, path)
+
+
+def map_arg(arg: str, dirs: List[Tuple[str, str]]) -> str:
+    """改写形如 /pch/x、-I/pch 的命令行参数"""
+    for prefix in ("", "-I"):
+        rest = arg[len(prefix):]
+        if arg.startswith(prefix) and rest.startswith("/"):
+            for inside, host in dirs:
+                if rest == inside or rest.startswith(inside + "/"):
+                    return prefix + host + rest[len(inside):]
+    return arg
+
+
+def parse_dirs(extra_dirs: List[str]) -> List[Tuple[str, str]]:
+    dirs = []
+    for d in extra_dirs:
+        inside, _, host = d.partition("=")
+        dirs.append((inside.rstrip("/"), (host or inside).rstrip("/")))
+    return dirs
+
+
+class RlimitSandbox(Sandbox):
+    name = "rlimit"
+    isolated = False
+
+    def workdir(self, slot: int) -> str:
+        return os.path.join(RLIMIT_SANDBOX_ROOT, str(slot), "box")
+
+    def prepare(self, slot: int) -> str:
+        os.makedirs(self.workdir(slot), exist_ok=True)
+        return self.workdir(slot)
+
+    def reset(self, slot: int) -> None:
+        subprocess.run(["rm", "-rf", os.path.dirname(self.workdir(slot))])
+
+    def run(self, slot, cmd, time_limit, mem_mb, stdin_file="", stdout_file="stdout.txt",
+            stderr_file="stderr.txt", datadir="", fsize_kb=DEFAULT_OUTPUT_LIMIT_KB, extra_dirs=()):
+        cwd = self.workdir(slot)
+        dirs = parse_dirs(extra_dirs)
+        if datadir:
+            stdin = os.path.join(datadir, stdin_file)
+        else:
+            stdin = os.path.join(cwd, "data", stdin_file) if stdin_file else ""
+        name, _, value = SANDBOX_PATH.partition("=")
+        fields = exec_limited(
+            cwd, [map_arg(a, dirs) for a in cmd], {name: value},
+            stdin=stdin,
+            stdout=os.path.join(cwd, stdout_file),
+            stderr=os.path.join(cwd, stderr_file),
+            time_limit=time_limit,
+            mem_kb=mem_mb * 1024,
+            fsize_kb=fsize_kb,
+            stack_kb=STACK_KB,
+        )
+        return (0 if "status" not in fields else 1), format_meta(fields)
+
+
+class DockerSandbox(Sandbox):
+    """
+    slot 对应一个预热容器（工作目录挂载为 /app；不挂载题目数据，运行前把输入文件复制到 /app/data）。
+    逐个测试点 docker exec 的开销较大，worker 走 judge() 的整份提交快速路径；
+    逐测试点接口用于基准测试对比，以及与其它后端共用 judge_submission 的流程。
+    extra_dirs 不生效：镜像中已自带 /opt/judge，缺少的 include 目录（如 -I/pch）g++ 会忽略。
+    """
+    name = "docker"
+    batch = True
+
+    def __init__(self, image: str = DOCKER_IMAGE):
+        from container_pool import ContainerPool
+        self.image = image
+        self.pool = ContainerPool()
+        self._slots = {}  # slot -> (WarmContainer, healthy)
+
+    def judge(self, problem_id, language, source_code, limitations, test_cases=None, reused=None):
+        from docker_judge import judge_submission_docker
+        return judge_submission_docker(image=self.image, problem_id=problem_id, language=language,
+                                       source_code=source_code, limitations=limitations,
+                                       test_cases=test_cases, pool=self.pool, reused=reused)
+
+    def workdir(self, slot: int) -> str:
+        return self._slots[slot][0].workdir
+
+    def prepare(self, slot: int) -> str:
+        from container_pool import WarmContainer
+        if self.pool.enabled:
+            c = self.pool.acquire(self.image)
+        else:
+            c = WarmContainer(self.image)
+            if not c.start():
+                raise RuntimeError(f"failed to start container from {self.image}")
+        self._slots[slot] = (c, True)
+        return c.workdir
+
+    def reset(self, slot: int) -> None:
+        c, healthy = self._slots.pop(slot, (None, False))
+        if c is None:
+            return
+        if self.pool.enabled:
+            self.pool.release(c, healthy=healthy)
+        else:
+            c.destroy()
+
+    def run(self, slot, cmd, time_limit, mem_mb, stdin_file="", stdout_file="stdout.txt",
+            stderr_file="stderr.txt", datadir="", fsize_kb=DEFAULT_OUTPUT_LIMIT_KB, extra_dirs=()):
+        c, _ = self._slots[slot]
+        if not c.set_limits(mem_mb, cpus.cpuset()):
+            self._slots[slot] = (c, False)
+            return 1, format_meta({"status": "XX", "message": "docker update failed"})
+        if datadir and stdin_file:
+            # 容器不挂载题目数据目录（见 container_pool.py），只把这一个输入文件复制进去
+            os.makedirs(os.path.join(c.workdir, "data"), exist_ok=True)
+            shutil.copyfile(os.path.join(datadir, stdin_file), os.path.join(c.workdir, "data", stdin_file))
+        stdin = f"/app/data/{stdin_file}" if stdin_file else "/dev/null"
+        inner = (f"ulimit -f {fsize_kb} -s {STACK_KB}; /usr/bin/time -f 'time:%e\\nmax-rss:%M' -o .meta -- "
+                 f"{shlex.join(cmd)} < {shlex.quote(stdin)} > {shlex.quote(stdout_file)} 2> {shlex.quote(stderr_file)}")
+        script = f"rm -f .meta; timeout -s KILL {time_limit}s bash -c {shlex.quote(inner)}; echo $? > .exitcode"
+
+        start = time.monotonic()
+        try:
+            # timeout 在容器内按墙钟杀死选手程序；docker exec 本身卡住时再由这里兜底
+            proc = c.exec(script, timeout=wall_time_limit(time_limit) + 10)
+        except subprocess.TimeoutExpired:
+            self._slots[slot] = (c, False)
+            return 1, format_meta({"status": "XX", "message": "docker exec timed out"})
+        wall = time.monotonic() - start
+        if proc.returncode != 0:
+            # exec 本身失败（容器退出等），容器不再复用
+            self._slots[slot] = (c, False)
+            return 1, format_meta({"status": "XX", "message": proc.stderr.strip()})
+
+        fields = parse_meta(_read(os.path.join(c.workdir, ".meta")))
+        try:
+            rc = int(_read(os.path.join(c.workdir, ".exitcode")).strip())
+        except ValueError:
+            rc = 1
+        fields["time-wall"] = f"{wall:.3f}"
+        if rc == 137 and wall >= time_limit:
+            fields.update({"killed": 1, "status": "TO", "message": "Time limit exceeded"})
+        elif rc == 137:
+            fields.update({"cg-oom-killed": 1, "exitsig": 9, "status": "SG", "message": "Caught fatal signal 9"})
+        elif rc > 128:
+            fields.update({"exitsig": rc - 128, "status": "SG", "message": f"Caught fatal signal {rc - 128}"})
+        elif rc != 0:
+            fields.update({"exitcode": rc, "status": "RE", "message": f"Exited with error status {rc}"})
+        else:
+            fields["exitcode"] = 0
+        return (0 if "status" not in fields else 1), format_meta(fields)
+
+
+BACKENDS = {"isolate": IsolateSandbox, "docker": DockerSandbox, "rlimit": RlimitSandbox}
+_instances: Dict[str, Sandbox] = {}
+_mutex = threading.Lock()
+
+
+def get(name: str) -> Sandbox:
+    """按名字取本进程的后端实例（docker 后端持有容器池，每个进程只建一个）"""
+    if name not in BACKENDS:
+        raise ValueError(f"unknown sandbox backend: {name}")
+    with _mutex:
+        if name not in _instances:
+            _instances[name] = BACKENDS[name]()
+        return _instances[name]
+
+
+def _configured(name: str) -> str:
+    """检查 SANDBOX_BACKENDS / DEFAULT_SANDBOX 选中的后端：没有隔离的后端须显式允许"""
+    if name not in BACKENDS:
+        raise ValueError(f"unknown sandbox backend: {name}")
+    if not BACKENDS[name].isolated and not ALLOW_UNISOLATED_SANDBOX:
+        raise ValueError(f"sandbox backend {name} does not isolate submissions from the host; "
+                         f"set ALLOW_UNISOLATED_SANDBOX=1 to use it for judging")
+    return name
+
+
+def backend_name(language: str) -> str:
+    return _configured(SANDBOX_BACKENDS.get(language, DEFAULT_SANDBOX))
+
+
+def for_language(language: str) -> Sandbox:
+    return get(backend_name(language))
+
+
+def box_backends() -> List[str]:
+    """本节点配置中需要 box 池的后端（docker 等整份提交一次完成的后端除外）"""
+    names = {_configured(name) for name in set(SANDBOX_BACKENDS.values()) | {DEFAULT_SANDBOX}}
+    return sorted(name for name in names if not BACKENDS[name].batch)
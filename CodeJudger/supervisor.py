@@ -0,0 +1,165 @@
+# supervisor.py
+"""
+worker 进程监管
+
+按队列积压、空闲 CPU 与可用内存动态调整 worker 数：
+- 上限：判题核数 // PARALLEL_BOXES（每个 worker 绑定 PARALLEL_BOXES 个核，不超卖以免计时失真，见 cpus.py）、
+  可租用的 box 数、可用内存能容纳的 worker 数，以及 MAX_WORKERS（0 表示不额外限制）
+- 有积压时逐轮扩容；队列持续空闲 SCALE_DOWN_IDLE_SEC 后每轮缩掉一个（SIGTERM，判完手上任务再退出）
+- 正在退出的 worker 仍占着绑定的核与租用的 box，退出前照样计入上限，新 worker 不会与它们超卖；
+  它们占用的内存已反映在 MemAvailable 中
+- worker 异常退出立即补上；回调发送进程退出同样重启
+box-id 由各 worker 通过 box_alloc 租用，动态增减进程不会冲突。
+"""
+import os
+import time
+import signal
+import multiprocessing as mp
+from typing import Dict, Optional
+import redis
+import job_queue
+import callbacks
+import sandbox
+import cpus
+from config import (REDIS_URL, MIN_WORKERS, MAX_WORKERS, RESERVED_CORES, WORKER_MEM_MB, MEM_HEADROOM_MB,
+                    SUPERVISOR_INTERVAL, SCALE_DOWN_IDLE_SEC, BOX_ID_COUNT, BOX_POOL_SIZE, PARALLEL_BOXES,
+                    CPU_PINNING)
+
+
+def usable_cores() -> int:
+    if CPU_PINNING:
+        return len(cpus.layout()[1])
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    return max(1, cores - RESERVED_CORES)
+
+
+def available_mem_mb() -> Optional[int]:
+    """/proc/meminfo 中的 MemAvailable，读不到返回 None（不按内存限制）"""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return None
+
+
+def _run_child(target, *args):
+    # 子进程不继承 supervisor 的信号处理
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    target(*args)
+
+
+class Supervisor:
+    def __init__(self, target):
+        self._target = target  # worker 入口，参数为 worker_idx
+        self._workers: Dict[int, mp.Process] = {}
+        self._draining: Dict[int, mp.Process] = {}  # 已发 SIGTERM、等待退出的 worker
+        self._sender: Optional[mp.Process] = None
+        self._next_idx = 0
+        self._idle_since: Optional[float] = None
+        self._stopping = False
+        self._rds = redis.from_url(REDIS_URL, decode_responses=True)
+
+    def max_workers(self) -> int:
+        limits = [
+            usable_cores() // max(1, PARALLEL_BOXES),
+            BOX_ID_COUNT // max(1, BOX_POOL_SIZE * len(sandbox.box_backends()) + max(0, PARALLEL_BOXES - 1)),
+        ]
+        if MAX_WORKERS > 0:
+            limits.append(MAX_WORKERS)
+        return max(MIN_WORKERS, min(limits))
+
+    def _spawn(self):
+        idx = self._next_idx
+        self._next_idx += 1
+        p = mp.Process(target=_run_child, args=(self._target, idx), daemon=True)
+        p.start()
+        self._workers[idx] = p
+
+    def _spawn_sender(self):
+        self._sender = mp.Process(target=_run_child, args=(callbacks.sender_loop,), daemon=True)
+        self._sender.start()
+
+    def _reap(self):
+        for idx, p in list(self._workers.items()):
+            if not p.is_alive():
+                p.join()
+                del self._workers[idx]
+                print(f"[Supervisor] worker {idx} exited unexpectedly (code {p.exitcode}), restarting")
+        for idx, p in list(self._draining.items()):
+            if not p.is_alive():
+                p.join()
+                del self._draining[idx]
+        if self._sender is not None and not self._sender.is_alive():
+            print(f"[Supervisor] callback sender exited (code {self._sender.exitcode}), restarting")
+            self._spawn_sender()
+
+    def _scale(self):
+        depth = sum(job_queue.lane_depths(self._rds).values())
+        current = len(self._workers)
+        limit = self.max_workers()
+
+        # 补足下限、按积压扩容；每个新 worker 都要有足够的可用内存
+        want = min(limit, max(MIN_WORKERS, current + depth))
+        mem = available_mem_mb()
+        while len(self._workers) < want:
+            # 正在退出的 worker 判完手上的任务前还占着核与 box
+            if len(self._workers) + len(self._draining) >= limit:
+                break
+            if mem is not None and len(self._workers) >= MIN_WORKERS and mem < WORKER_MEM_MB + MEM_HEADROOM_MB:
+                break
+            self._spawn()
+            if mem is not None:
+                mem -= WORKER_MEM_MB
+        if len(self._workers) != current:
+            print(f"[Supervisor] depth={depth}, workers {current} -> {len(self._workers)} "
+                  f"(draining {len(self._draining)}, limit {limit})")
+
+        # 持续空闲时缩容；超过上限（例如可用核数变少）时也缩
+        now = time.time()
+        if depth > 0:
+            self._idle_since = None
+        elif self._idle_since is None:
+            self._idle_since = now
+        idle = self._idle_since is not None and now - self._idle_since >= SCALE_DOWN_IDLE_SEC
+        if len(self._workers) > MIN_WORKERS and (idle or len(self._workers) > limit):
+            idx = max(self._workers)
+            p = self._workers.pop(idx)
+            os.kill(p.pid, signal.SIGTERM)
+            self._draining[idx] = p
+            self._idle_since = now
+            print(f"[Supervisor] scale down, draining worker {idx}")
+
+    def shutdown(self, signum=None, frame=None):
+        """部署时的 SIGTERM：转发给所有 worker，等它们判完手上的任务"""
+        self._stopping = True
+        for p in list(self._workers.values()) + list(self._draining.values()):
+            if p.is_alive():
+                os.kill(p.pid, signal.SIGTERM)
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.shutdown)
+        signal.signal(signal.SIGINT, self.shutdown)
+        cpus.pin_housekeeping()  # worker 启动后再各自绑定到判题核
+        self._spawn_sender()
+        while not self._stopping:
+            self._reap()
+            try:
+                self._scale()
+            except redis.RedisError as e:
+                print(f"[Supervisor] failed to read queue depth: {e}")
+                while len(self._workers) < MIN_WORKERS:
+                    self._spawn()
+            time.sleep(SUPERVISOR_INTERVAL)
+
+        for p in list(self._workers.values()) + list(self._draining.values()):
+            p.join()
+        # 回调发送进程没有正在判的任务，未送达的回调留在 Redis 发件箱
+        self._sender.terminate()
+
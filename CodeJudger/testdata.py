@@ -0,0 +1,102 @@
+# testdata.py
+"""
+题目测试数据清单
+
+后端在上传/修改测试数据时写入 DATA_DIR/<problem_id>/manifest.json（见 backend/modules/testcases_processing.py），
+这里按 manifest 的 mtime 缓存解析结果，判题时不再 glob 目录、逐个 stat。
+没有 manifest 的旧数据退回到扫描目录，此时没有预计算的摘要。
+manifest 中还可以带有题目的 checker 配置（特殊评测，见 checkers.py）；
+manifest 的 version 随测试数据与 checker 变化，判题结果缓存以它判断数据是否改动（见 result_cache.py）；
+逐测试点的 in/out 摘要供增量重判判断哪些测试点改动过（见 incremental.py）；
+groups 为测试点分组与计分配置（见 groups.py）。
+"""
+import os
+import json
+from glob import glob
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from config import DATA_DIR
+
+MANIFEST_NAME = "manifest.json"
+
+# (name, in 文件名, out 宿主机绝对路径, 规范化标准输出的 sha256 或 None)
+TestCase = Tuple[str, str, str, Optional[str]]
+
+
+class Manifest(NamedTuple):
+    dataset: List[TestCase]
+    checker: Optional[dict]
+    version: Optional[str]
+    digests: Dict[str, str]  # 测试点名 -> "in_digest:out_digest"，按测试点顺序
+    groups: Optional[List[dict]]
+    base: str
+
+
+_cache: Dict[int, Tuple[int, Manifest]] = {}  # problem_id -> (mtime_ns, manifest)
+
+
+def _scan(base: str) -> List[TestCase]:
+    dataset = []
+    for in_path in sorted(glob(os.path.join(base, "*.in"))):
+        name = os.path.splitext(os.path.basename(in_path))[0]
+        out_path = os.path.join(base, f"{name}.out")
+        if os.path.exists(out_path):
+            dataset.append((name, os.path.basename(in_path), out_path, None))
+    return dataset
+
+
+def _load(problem_id: int) -> Manifest:
+    base = os.path.join(DATA_DIR, str(problem_id))
+    manifest_path = os.path.join(base, MANIFEST_NAME)
+    try:
+        mtime = os.stat(manifest_path).st_mtime_ns
+    except OSError:
+        _cache.pop(problem_id, None)
+        return Manifest(_scan(base), None, None, {}, None, base)
+
+    cached = _cache.get(problem_id)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        dataset = [
+            (c["name"], c["in"], os.path.join(base, c["out"]), c.get("out_digest"))
+            for c in manifest.get("cases", [])
+        ]
+        digests = {
+            c["name"]: f"{c['in_digest']}:{c['out_digest']}"
+            for c in manifest.get("cases", []) if c.get("in_digest") and c.get("out_digest")
+        }
+    except (OSError, ValueError, KeyError):
+        return Manifest(_scan(base), None, None, {}, None, base)
+    loaded = Manifest(dataset, manifest.get("checker"), manifest.get("version"), digests,
+                      manifest.get("groups") or None, base)
+    _cache[problem_id] = (mtime, loaded)
+    return loaded
+
+
+def load_testcases(problem_id: int) -> Tuple[List[TestCase], str]:
+    """返回 ( [(name, in_filename, out_filepath, out_digest), ...], base_dir )"""
+    manifest = _load(problem_id)
+    return manifest.dataset, manifest.base
+
+
+def load_checker(problem_id: int) -> Optional[dict]:
+    """manifest 中的 checker 配置（见 checkers.py），没有时为 None，即逐行精确比较"""
+    return _load(problem_id).checker
+
+
+def load_version(problem_id: int) -> Optional[str]:
+    """manifest 的 version；没有 manifest 的旧数据无法判断是否改动，返回 None"""
+    return _load(problem_id).version
+
+
+def load_groups(problem_id: int) -> Optional[List[dict]]:
+    """manifest 中的测试点分组（见 groups.py），没有时为 None，即按通过测试点的比例计分"""
+    return _load(problem_id).groups
+
+
+def load_case_digests(problem_id: int) -> Dict[str, str]:
+    """测试点名 -> 输入与标准输出摘要；没有 manifest 时为空"""
+    return _load(problem_id).digests
@@ -0,0 +1,66 @@
+# conftest.py
+"""
+判题机单元测试的公共 fixture
+
+在 CodeJudger 目录下运行：python -m pytest -q tests
+模块按判题机的运行方式（工作目录为 CodeJudger）直接 import；Redis 用 fakeredis 代替，
+测试数据目录指向临时目录，manifest 由后端的 write_manifest 生成，与线上同一口径。
+"""
+import os
+import sys
+import json
+import importlib.util
+import pytest
+
+JUDGER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, JUDGER_DIR)
+
+
+@pytest.fixture
+def rds():
+    fakeredis = pytest.importorskip("fakeredis")
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture(scope="session")
+def backend_testcases():
+    """后端的 modules/testcases_processing.py（只依赖标准库，按路径加载，不经过 Flask 应用）"""
+    path = os.path.join(os.path.dirname(JUDGER_DIR), "backend", "modules", "testcases_processing.py")
+    spec = importlib.util.spec_from_file_location("backend_testcases_processing", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    import testdata
+    monkeypatch.setattr(testdata, "DATA_DIR", str(tmp_path))
+    testdata._cache.clear()
+    yield tmp_path
+    testdata._cache.clear()
+
+
+@pytest.fixture
+def make_problem(data_dir, backend_testcases):
+    """
+    make_problem(problem_id, {"1": ("输入", "标准输出"), ...}, groups=[...]) 写入测试数据并生成 manifest，返回数据目录。
+    重复调用同一 problem_id 时覆盖写入（模拟修改测试数据）。
+    """
+    import testdata
+
+    def make(problem_id, cases: dict, groups=None, files=None):
+        base = data_dir / str(problem_id)
+        base.mkdir(exist_ok=True)
+        for name, (inp, out) in cases.items():
+            (base / f"{name}.in").write_text(inp, encoding="utf-8")
+            (base / f"{name}.out").write_bytes(out.encode("utf-8"))
+        if groups is not None:
+            (base / "groups.json").write_text(json.dumps(groups), encoding="utf-8")
+        for name, content in (files or {}).items():
+            (base / name).write_text(content, encoding="utf-8")
+        backend_testcases.write_manifest(str(base))
+        testdata._cache.clear()
+        return base
+
+    return make
@@ -0,0 +1,119 @@
+import os
+import stat
+import pytest
+import checkers
+import judge
+import sandbox
+
+# 测试用的 testlib.h：只提供 checker 需要的头文件，编译很快
+TESTLIB_H = "#include <cstdio>\n#include <cstring>\n#include <cstdlib>\n"
+
+# checker <input> <output> <answer>：输入为 crash 时以 3 退出（checker 出错），否则比较第一个 token
+CHECKER_CPP = r"""
+#include "testlib.h"
+static void first(const char *path, char *buf) {
+    FILE *f = fopen(path, "r");
+    buf[0] = 0;
+    if (f) { if (fscanf(f, "%63s", buf) != 1) buf[0] = 0; fclose(f); }
+}
+int main(int argc, char **argv) {
+    char in[64], out[64], ans[64];
+    first(argv[1], in); first(argv[2], out); first(argv[3], ans);
+    if (!strcmp(in, "crash")) return 3;
+    if (strcmp(out, ans)) { fprintf(stderr, "expected %s, found %s", ans, out); return 1; }
+    return 0;
+}
+"""
+
+ECHO = "print(input())\n"
+
+
+class RecordingSandbox(sandbox.RlimitSandbox):
+    """记录每次 run 的命令，确认 checker 的编译与运行都经过沙箱"""
+
+    def __init__(self):
+        self.commands = []
+
+    def run(self, slot, cmd, *args, **kwargs):
+        self.commands.append(list(cmd))
+        return super().run(slot, cmd, *args, **kwargs)
+
+
+@pytest.fixture
+def box(tmp_path, monkeypatch, data_dir):
+    monkeypatch.setattr(sandbox, "RLIMIT_SANDBOX_ROOT", str(tmp_path / "boxes"))
+    monkeypatch.setattr(checkers, "CHECKER_CACHE_DIR", str(tmp_path / "checkers"))
+    monkeypatch.setattr(judge, "DATA_DIR", str(data_dir))
+    checkers._compiled.clear()
+    backend = RecordingSandbox()
+    backend.prepare(0)
+    yield backend
+    checkers._compiled.clear()
+
+
+def _testlib_problem(make_problem, cases, source=CHECKER_CPP):
+    return make_problem(1, cases, files={"checker.cpp": source, "testlib.h": TESTLIB_H})
+
+
+def _judge(backend, code=ECHO, test_cases=None):
+    return judge.judge_submission(0, 1, "python", code, {"maxTime": 2}, test_cases=test_cases,
+                                  box_ready=True, sandbox=backend)
+
+
+def test_testlib_checker_compiles_and_runs_in_sandbox(make_problem, box):
+    _testlib_problem(make_problem, {"1": ("7", "7\n"), "2": ("8", "9\n"), "3": ("crash", "0\n")})
+    result = _judge(box)
+    assert [c["status"] for c in result["cases"]] == ["AC", "WA", "IE"], result
+    assert result["status"] == "IE" and result["checker"] == "testlib"
+    assert result["cases"][1]["diff"] == "expected 9, found 8"
+    assert "checker failed" in result["cases"][2]["message"]
+    assert result["timings"]["checker_compile_ms"] > 0
+
+    compiles = [c for c in box.commands if c[0] == checkers.CHECKER_COMPILER]
+    runs = [c for c in box.commands if c[0] == f"{checkers.STAGE_DIR}/checker"]
+    assert len(compiles) == 1 and len(runs) == 3
+    # 答案只在 checker 运行期间出现在 box 中
+    assert not os.path.exists(os.path.join(box.workdir(0), checkers.STAGE_DIR))
+
+    # 第二次判题直接使用缓存的 checker
+    box.commands.clear()
+    result = _judge(box)
+    assert "checker_compile_ms" not in result["timings"]
+    assert not [c for c in box.commands if c[0] == checkers.CHECKER_COMPILER]
+
+
+def test_testlib_checker_with_in_memory_answers(make_problem, box):
+    _testlib_problem(make_problem, {"1": ("1", "1\n")})
+    result = _judge(box, test_cases=[{"id": "a", "input": "5", "output": "5"},
+                                     {"id": "b", "input": "6", "output": "5"}])
+    assert [c["status"] for c in result["cases"]] == ["AC", "WA"], result
+
+
+def test_stale_stage_entry_in_box_is_replaced(make_problem, box):
+    _testlib_problem(make_problem, {"1": ("7", "7\n")})
+    # 选手程序在 box 中留下的同名符号链接不会被跟随
+    target = box.workdir(0) + "-elsewhere"
+    os.makedirs(target)
+    os.symlink(target, os.path.join(box.workdir(0), checkers.STAGE_DIR))
+    assert _judge(box)["status"] == "AC"
+    assert os.listdir(target) == []
+
+
+def test_checker_compile_error_is_internal_error(make_problem, box):
+    _testlib_problem(make_problem, {"1": ("7", "7\n")}, source="int main( {\n")
+    result = _judge(box)
+    assert result["status"] == "IE"
+    assert result["message"].startswith("checker compilation failed")
+
+
+def test_checker_compile_is_time_limited(make_problem, box, tmp_path, monkeypatch):
+    slow = tmp_path / "slow-g++"
+    slow.write_text("#!/bin/sh\nsleep 30\n")
+    slow.chmod(slow.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setattr(checkers, "CHECKER_COMPILER", str(slow))
+    monkeypatch.setattr(checkers, "CHECKER_COMPILE_TIME_LIMIT", 0.2)
+    _testlib_problem(make_problem, {"1": ("7", "7\n")})
+    result = _judge(box)
+    assert result["status"] == "IE" and "timed out" in result["message"], result
+    # 没有留下编译产物，下次判题重新编译
+    assert all(name.endswith(".lock") for name in os.listdir(tmp_path / "checkers"))
@@ -0,0 +1,133 @@
+import io
+import json
+import random
+import functools
+import pytest
+import compare
+
+ALPHABET = ["a", "b", "1", " ", "  ", "\t", "\n", "\n", "\r\n", "\r", "\v", "\f", "\x1c", " ", "中"]
+
+
+def _stream(text: str) -> io.StringIO:
+    # 与 _open_text 一样使用通用换行（\r\n、\r 读出为 \n）
+    return io.StringIO(text, newline=None)
+
+
+def _random_text(rng: random.Random, n: int) -> str:
+    return "".join(rng.choice(ALPHABET) for _ in range(n))
+
+
+def _mutate(rng: random.Random, text: str) -> str:
+    """只改动规范化后不可见的部分（行尾空白、换行写法、末尾空行），偶尔改动内容"""
+    lines = text.split("\n")
+    out = [line + rng.choice(["", " ", "\t", "  \t"]) for line in lines]
+    text = rng.choice(["\n", "\r\n"]).join(out) + rng.choice(["", "\n", "\n\n", " \r\n\n  "])
+    if rng.random() < 0.2 and text:
+        i = rng.randrange(len(text))
+        text = text[:i] + rng.choice(ALPHABET) + text[i + 1:]
+    return text
+
+
+@pytest.fixture(params=[1, 2, 3, 7, compare.CHUNK_SIZE])
+def chunk_size(request, monkeypatch):
+    """用很小的块长度读取，让空白、换行恰好落在块边界上"""
+    monkeypatch.setattr(compare, "_normalized_chunks",
+                        functools.partial(compare._normalized_chunks, chunk_size=request.param))
+    return request.param
+
+
+def test_normalized_chunks_match_baseline_normalize(backend_testcases, chunk_size):
+    rng = random.Random(chunk_size)
+    for _ in range(300):
+        text = _random_text(rng, rng.randrange(40))
+        expected = backend_testcases._normalize(_stream(text).read())
+        assert "".join(compare._normalized_chunks(_stream(text))) == expected, repr(text)
+
+
+def test_compare_streams_agrees_with_baseline(backend_testcases, chunk_size):
+    rng = random.Random(1000 + chunk_size)
+    for _ in range(500):
+        a = _random_text(rng, rng.randrange(30))
+        b = _mutate(rng, a) if rng.random() < 0.7 else _random_text(rng, rng.randrange(30))
+        same = backend_testcases._normalize(_stream(a).read()) == backend_testcases._normalize(_stream(b).read())
+        ok, diff = compare.compare_streams(_stream(a), _stream(b))
+        assert ok == same, (a, b)
+        assert (diff == "") == ok
+
+
+@pytest.mark.parametrize("actual", [
+    "1 2\n3\n",
+    "1 2   \n3\t\n\n\n",
+    "1 2\r\n3\r\n",
+    "1 2\r\n3",
+    "1 2\n3\n   \n \t\n",
+])
+def test_trailing_whitespace_crlf_and_blank_lines_are_ignored(actual, chunk_size):
+    assert compare.compare_streams(_stream("1 2\n3"), _stream(actual)) == (True, "")
+
+
+def test_whitespace_across_chunk_boundary():
+    # 行尾空白跨越 64K 块边界，其后还有内容
+    line = "x" * (compare.CHUNK_SIZE - 3)
+    expected = line + "\nnext\n"
+    actual = line + "      \nnext   \n\n"
+    assert compare.compare_streams(_stream(expected), _stream(actual)) == (True, "")
+    assert not compare.compare_streams(_stream(expected), _stream(line + "      \nnexT\n"))[0]
+
+
+def test_leading_and_inner_whitespace_matter():
+    assert not compare.compare_streams(_stream("1 2"), _stream(" 1 2"))[0]
+    assert not compare.compare_streams(_stream("1 2"), _stream("1  2"))[0]
+    assert not compare.compare_streams(_stream("1\n2"), _stream("1\n\n2"))[0]
+
+
+def test_diff_reports_first_differing_line():
+    ok, diff = compare.compare_streams(_stream("a\nb\nc\n"), _stream("a\nb\nd\n"))
+    assert not ok
+    assert diff.startswith("Line 3:")
+    assert "Expected: c" in diff and "Actual:   d" in diff
+
+
+def test_diff_reports_missing_and_extra_lines():
+    ok, diff = compare.compare_streams(_stream("a\nb\n"), _stream("a\n"))
+    assert not ok and "Line 2:" in diff and "<no line>" in diff
+    ok, diff = compare.compare_streams(_stream("a\n"), _stream("a\nextra\n"))
+    assert not ok and "Line 2:" in diff and "Actual:   extra" in diff
+
+
+def test_diff_is_bounded_for_long_lines():
+    ok, diff = compare.compare_streams(_stream("x" * 100000 + "a"), _stream("x" * 100000 + "b"))
+    assert not ok
+    assert len(diff) <= compare.MAX_DIFF_LEN + len("\n...[truncated]...")
+
+
+@pytest.mark.parametrize("out", [
+    "",
+    "\n\n",
+    "42\n",
+    "1 2 3   \r\n4 5 6\r\n\r\n",
+    "行尾空白\t \n中文\n",
+    "a\rb\rc",
+    "x" * (compare.CHUNK_SIZE + 5) + "  \n" + "y\n" * 3,
+])
+def test_digest_file_matches_backend_manifest(make_problem, out):
+    base = make_problem(1, {"1": ("", out)})
+    manifest = json.loads((base / "manifest.json").read_text(encoding="utf-8"))
+    assert compare.digest_file(str(base / "1.out")) == manifest["cases"][0]["out_digest"]
+
+
+def test_compare_files_uses_expected_digest(tmp_path):
+    exp, act = tmp_path / "1.out", tmp_path / "user.out"
+    exp.write_text("1\n2\n")
+    act.write_bytes(b"1 \r\n2\r\n\r\n")
+    digest = compare.digest_file(str(exp))
+    assert compare.compare_files(str(exp), str(act), digest) == (True, "")
+    # 摘要不同时打开标准答案生成 diff；缺少选手输出按空输出处理
+    ok, diff = compare.compare_files(str(exp), str(tmp_path / "missing.out"), digest)
+    assert not ok and diff.startswith("Line 1:")
+
+
+def test_compare_text():
+    path = "/nonexistent/user.out"
+    assert compare.compare_text("", path) == (True, "")
+    assert not compare.compare_text("1", path)[0]
@@ -0,0 +1,239 @@
+import os
+import stat
+import subprocess
+import pytest
+import docker_judge
+import jvm
+import compile_cache
+
+_real_run = subprocess.run
+JUDGER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FAKE_TIME = """#!/bin/bash
+# /usr/bin/time -f FMT -o FILE -- cmd...
+while [ "$1" != "--" ]; do
+    if [ "$1" = "-o" ]; then out="$2"; shift; fi
+    shift
+done
+shift
+"$@"
+code=$?
+printf 'time:0.01\\nmax-rss:1024\\n' > "$out"
+exit $code
+"""
+
+# java：带 JudgeHarness 参数时模拟 harness（从标准输入读密钥，输入为 ok 的测试点正常结束并写签名的 hmeta，
+# 输入为 forge 的测试点写没有签名的 hmeta，其余不写），
+# 否则模拟独立 JVM 运行 Main：输入 ok 输出 ok，mle 以 137 退出（被 OOM kill），wa 输出错误答案
+FAKE_JAVA = """#!/bin/bash
+if [[ " $* " == *" JudgeHarness "* ]]; then
+    echo "harness $*" >> "$FAKE_JAVA_LOG.args"
+    shift $(($# - 4))
+    read -r key
+    cd "$1"
+    while IFS=$'\\t' read -r name input; do
+        [ -n "$name" ] || continue
+        input="$1${input#/app}"  # harness.list 中是容器内路径
+        body=$'status:ok\\ntime:5\\nmemory:2048\\n'
+        case "$(cat "$input")" in
+            ok)
+                echo ok > "$name.stdout"
+                mac=$(python3 -c 'import sys; from jvm import harness_mac; print(harness_mac(*sys.argv[1:]))' \\
+                      "$key" "$name" "$body")
+                printf '%smac:%s\\n' "$body" "$mac" > "$name.hmeta" ;;
+            forge)
+                echo ok > "$name.stdout"
+                printf '%s' "$body" > "$name.hmeta" ;;
+        esac
+    done < "$2"
+    exit 0
+fi
+echo "java $*" >> "$FAKE_JAVA_LOG.args"
+read -r line
+echo "$line" >> "$FAKE_JAVA_LOG"
+case "$line" in
+    ok) echo ok ;;
+    mle) exit 137 ;;
+    *) echo wrong ;;
+esac
+"""
+
+FAKE_JAVAC = """#!/bin/bash
+touch Main.class
+"""
+
+
+def _write_exe(path, content):
+    path.write_text(content)
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+
+
+@pytest.fixture
+def fake_docker(tmp_path, monkeypatch, data_dir):
+    """
+    用宿主机上的 bash 代替 docker run：脚本中的 /app 换成工作目录，/usr/bin/time、java、javac 换成假程序。
+    记录每次 docker run 的挂载参数与当时工作目录中的文件，供断言容器内能看到什么。
+    """
+    monkeypatch.setattr(docker_judge, "DATA_DIR", str(data_dir))
+    monkeypatch.setattr(compile_cache, "fetch", lambda key, workdir: False)
+    stored = []
+    monkeypatch.setattr(compile_cache, "store", lambda key, workdir, artifacts: stored.append(list(runs)))
+    bindir = tmp_path / "fakebin"
+    bindir.mkdir()
+    _write_exe(bindir / "time", FAKE_TIME)
+    _write_exe(bindir / "java", FAKE_JAVA)
+    _write_exe(bindir / "javac", FAKE_JAVAC)
+    java_log = tmp_path / "java.log"
+    java_log.touch()
+    runs = []
+
+    def run(cmd, *args, **kwargs):
+        if not cmd or cmd[0] != "docker":
+            return _real_run(cmd, *args, **kwargs)
+        if cmd[1] != "run":
+            return subprocess.CompletedProcess(cmd, 1, "", "")
+        mounts = [cmd[i + 1] for i, arg in enumerate(cmd) if arg == "-v"]
+        workdir = next(m.split(":")[0] for m in mounts if m.split(":")[1] == "/app")
+        files = sorted(os.path.relpath(os.path.join(root, f), workdir)
+                       for root, _, names in os.walk(workdir) for f in names)
+        runs.append({"mounts": mounts, "files": files, "script": os.path.basename(cmd[-1])})
+        with open(cmd[-1].replace("/app", workdir)) as f:
+            script = f.read()
+        script = (script.replace("/usr/bin/time", str(bindir / "time"))
+                  .replace("/app", workdir).replace("bash -lc", "bash -c"))
+        env = dict(os.environ, PATH=f"{bindir}:{os.environ['PATH']}", FAKE_JAVA_LOG=str(java_log),
+                   PYTHONPATH=JUDGER_DIR)
+        return _real_run(["bash", "-c", script], cwd=workdir, env=env, input=kwargs.get("input"),
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=kwargs.get("timeout"))
+
+    monkeypatch.setattr(subprocess, "run", run)
+    return {"runs": runs, "java_log": java_log, "stored": stored}
+
+
+PY_SOURCE = """
+import os
+line = input().strip()
+with open(os.environ["FAKE_JAVA_LOG"], "a") as f:
+    f.write(line + "\\n")
+print("ok" if line == "ok" else "wrong")
+"""
+
+
+def test_container_sees_inputs_but_not_expected_outputs(make_problem, fake_docker):
+    make_problem(1, {"1": ("ok", "ok\n"), "2": ("ok", "ok\n")})
+    make_problem(2, {"1": ("ok", "secret\n")})
+    result = docker_judge.judge_submission_docker("judge-image", 1, "python", PY_SOURCE, {"maxTime": 1})
+    assert result["status"] == "AC", result
+    run = fake_docker["runs"][0]
+    assert [m.split(":")[1] for m in run["mounts"]] == ["/app"]
+    assert "data/1.in" in run["files"] and "data/2.in" in run["files"]
+    assert not [f for f in run["files"] if f.endswith((".out", ".ans"))]
+
+
+def test_reused_failure_skips_its_group(make_problem, fake_docker):
+    make_problem(1, {"1a": ("ok", "ok\n"), "1b": ("wa", "ok\n"), "2a": ("ok", "ok\n")},
+                 groups=[{"name": "1", "weight": 50, "cases": ["1*"]}, {"name": "2", "weight": 50, "cases": ["2*"]}])
+    result = docker_judge.judge_submission_docker("judge-image", 1, "python", PY_SOURCE, {"maxTime": 1},
+                                                  reused={"1a": "WA"})
+    assert [(c["name"], c["status"]) for c in result["cases"]] == [("1b", "Skipped"), ("2a", "AC")]
+    assert "data/1b.in" not in fake_docker["runs"][0]["files"]
+    assert fake_docker["java_log"].read_text().split() == ["ok"]
+
+
+def test_acm_stops_in_container_using_expected_digest(make_problem, fake_docker):
+    make_problem(1, {"1": ("ok", "ok  \r\n\n"), "2": ("wa", "ok\n"), "3": ("ok", "ok\n")})
+    result = docker_judge.judge_submission_docker("judge-image", 1, "python", PY_SOURCE,
+                                                  {"maxTime": 1, "judgeMode": "acm"})
+    assert [c["status"] for c in result["cases"]] == ["AC", "WA", "Skipped"]
+    # 第 1 个测试点按规范化后的摘要判为一致，第 2 个不一致后脚本退出，第 3 个没有运行
+    assert fake_docker["java_log"].read_text().split() == ["ok", "wa"]
+
+
+CR_SOURCE = """
+import os
+line = input().strip()
+with open(os.environ["FAKE_JAVA_LOG"], "a") as f:
+    f.write(line + "\\n")
+print({"cr": "o\\rk", "vt": "ok\\v \\u3000"}.get(line, "ok" if line == "ok" else "wrong"))
+"""
+
+
+def test_acm_digest_in_container_matches_host_compare(make_problem, fake_docker):
+    # 单独的 \r 是换行、\v 与全角空格是行尾空白：宿主机判 AC，容器内也不能据此提前停止
+    make_problem(1, {"1": ("cr", "o\nk\n"), "2": ("vt", "ok\n"), "3": ("wa", "ok\n"), "4": ("ok", "ok\n")})
+    result = docker_judge.judge_submission_docker("judge-image", 1, "python", CR_SOURCE,
+                                                  {"maxTime": 1, "judgeMode": "acm"})
+    assert [c["status"] for c in result["cases"]] == ["AC", "AC", "WA", "Skipped"], result
+    assert fake_docker["java_log"].read_text().split() == ["cr", "vt", "wa"]
+
+
+def test_cases_after_in_container_stop_are_skipped(make_problem, fake_docker, monkeypatch):
+    # 容器内的判断与宿主机不一致时，以宿主机为准；停止之后没有运行的测试点是 Skipped 而不是 RE
+    monkeypatch.setattr(docker_judge, "_DIGEST_PY", "import sys\nfor line in sys.stdin:\n    print('x', flush=True)\n")
+    make_problem(1, {"1": ("ok", "ok\n"), "2": ("ok", "ok\n")})
+    result = docker_judge.judge_submission_docker("judge-image", 1, "python", PY_SOURCE,
+                                                  {"maxTime": 1, "judgeMode": "acm"})
+    assert [c["status"] for c in result["cases"]] == ["AC", "Skipped"], result
+    assert fake_docker["java_log"].read_text().split() == ["ok"]
+
+
+def test_acm_stops_in_container_in_memory_mode(fake_docker):
+    test_cases = [{"id": "1", "input": "ok", "output": "ok"},
+                  {"id": "2", "input": "wa", "output": "ok"},
+                  {"id": "3", "input": "ok", "output": "ok"}]
+    result = docker_judge.judge_submission_docker("judge-image", None, "python", PY_SOURCE,
+                                                  {"maxTime": 1, "judgeMode": "acm"}, test_cases)
+    assert [c["status"] for c in result["cases"]] == ["AC", "WA", "Skipped"]
+    assert fake_docker["java_log"].read_text().split() == ["ok", "wa"]
+    assert not [f for f in fake_docker["runs"][0]["files"] if f.endswith((".out", ".ans"))]
+
+
+@pytest.fixture
+def harness_on(monkeypatch):
+    monkeypatch.setattr(docker_judge, "JAVA_HARNESS", True)
+
+
+def test_acm_with_java_harness_reruns_failed_case(make_problem, fake_docker, harness_on):
+    make_problem(1, {"1": ("ok", "ok\n"), "2": ("mle", "ok\n"), "3": ("ok", "ok\n")})
+    result = docker_judge.judge_submission_docker("judge-image", 1, "java", "class Main {}",
+                                                  {"maxTime": 1, "judgeMode": "acm"})
+    # 第 1 个测试点在 harness 中通过、不重跑；第 2 个在 harness 中失败，用独立 JVM 重跑得到 MLE 后停止
+    assert [c["status"] for c in result["cases"]] == ["AC", "MLE", "Skipped"]
+    assert fake_docker["java_log"].read_text().split() == ["mle"]
+
+
+def test_acm_with_java_harness_all_pass(make_problem, fake_docker, harness_on):
+    make_problem(1, {"1": ("ok", "ok\n"), "2": ("ok", "ok\n")})
+    result = docker_judge.judge_submission_docker("judge-image", 1, "java", "class Main {}",
+                                                  {"maxTime": 1, "judgeMode": "acm"})
+    assert result["status"] == "AC"
+    assert [(c["time"], c["memory"]) for c in result["cases"]] == [(5.0, 2048.0)] * 2
+    assert fake_docker["java_log"].read_text() == ""
+
+
+def test_forged_harness_meta_is_not_trusted(make_problem, fake_docker, harness_on):
+    make_problem(1, {"1": ("ok", "ok\n"), "2": ("forge", "ok\n")})
+    result = docker_judge.judge_submission_docker("judge-image", 1, "java", "class Main {}", {"maxTime": 1})
+    # 没有正确 mac 的 hmeta 不算在 harness 中通过：脚本据此跳过了重跑，宿主机判为 RE
+    assert [c["status"] for c in result["cases"]] == ["AC", "RE"]
+
+
+def test_harness_and_standalone_jvm_use_the_same_stack(make_problem, fake_docker, harness_on, monkeypatch):
+    monkeypatch.setattr(docker_judge, "JAVA_STACK_MB", 32)
+    monkeypatch.setattr(jvm, "JAVA_STACK_MB", 32)
+    make_problem(1, {"1": ("wa", "ok\n")})
+    docker_judge.judge_submission_docker("judge-image", 1, "java", "class Main {}", {"maxTime": 1})
+    harness, standalone = (line.split() for line in
+                           (fake_docker["java_log"].parent / "java.log.args").read_text().splitlines())
+    assert harness[0] == "harness" and harness[-1] == "32" and "-Xss32m" in harness
+    assert standalone[0] == "java" and "-Xss32m" in standalone
+
+
+def test_compile_artifacts_are_cached_before_tests_run(make_problem, fake_docker):
+    make_problem(1, {"1": ("ok", "ok\n"), "2": ("wa", "ok\n")})
+    result = docker_judge.judge_submission_docker("judge-image", 1, "java", "class Main {}", {"maxTime": 1})
+    assert [c["status"] for c in result["cases"]] == ["AC", "WA"], result
+    assert [run["script"] for run in fake_docker["runs"]] == ["compile.sh", "run_all_tests.sh"]
+    # 存入编译缓存时只执行过编译
+    assert [[run["script"] for run in runs] for runs in fake_docker["stored"]] == [["compile.sh"]]
+    assert "compile_ms" in result["timings"]
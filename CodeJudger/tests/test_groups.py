@@ -0,0 +1,146 @@
+import threading
+import pytest
+import groups as test_groups
+import judge
+import sandbox
+from testdata import load_groups
+
+GROUPS = [
+    {"name": "1", "weight": 20, "cases": ["1a", "1b"], "depends": []},
+    {"name": "2", "weight": 30, "cases": ["2a", "2b"], "depends": ["1"]},
+    {"name": "3", "weight": 50, "cases": ["3a"], "depends": ["2"]},
+    {"name": "4", "weight": 0, "cases": ["4a"], "depends": []},
+]
+
+
+def _case(name, status="AC"):
+    return {"name": name, "status": status, "time": 1.0, "memory": 1.0, "message": "", "diff": ""}
+
+
+def _apply(statuses, groups=GROUPS):
+    return test_groups.apply(groups, [_case(name, status) for name, status in statuses.items()])
+
+
+def test_order_follows_groups_and_puts_ungrouped_last():
+    plan = test_groups.GroupPlan(GROUPS)
+    tests = [(name,) for name in ["x", "3a", "2b", "1b", "4a", "2a", "1a"]]
+    assert [t[0] for t in plan.order(tests)] == ["1a", "1b", "2a", "2b", "3a", "4a", "x"]
+
+
+def test_skip_within_group_after_failure():
+    plan = test_groups.GroupPlan(GROUPS)
+    assert plan.skip_reason("1b") is None
+    plan.record("1a", "WA")
+    assert "earlier case in group 1" in plan.skip_reason("1b")
+    assert plan.skip_reason("4a") is None and plan.skip_reason("x") is None
+    plan.record("x", "WA")  # 未归组的测试点失败不影响任何组
+    assert plan.passed("4")
+
+
+def test_dependencies_are_transitive():
+    plan = test_groups.GroupPlan(GROUPS)
+    plan.record("1a", "TLE")
+    assert plan.skip_reason("2a") == "Skipped: group 2 depends on failed group 1"
+    assert plan.skip_reason("3a") == "Skipped: group 3 depends on failed group 2"
+    assert not plan.passed("1") and not plan.passed("2") and not plan.passed("3")
+    assert plan.passed("4")
+
+
+def test_plan_is_shared_between_threads():
+    plan = test_groups.GroupPlan([{"name": "g", "weight": 1, "cases": [str(i) for i in range(200)]}])
+    threads = [threading.Thread(target=plan.record, args=(str(i), "AC" if i else "WA")) for i in range(200)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not plan.passed("g")
+
+
+def test_apply_scores_passed_groups():
+    cases, score, groups = _apply({"1a": "AC", "1b": "AC", "2a": "AC", "2b": "AC", "3a": "AC", "4a": "WA"})
+    assert score == 100.0
+    assert [g["passed"] for g in groups] == [True, True, True, False]
+    assert [g["score"] for g in groups] == [20, 30, 50, 0]
+    assert [c["status"] for c in cases] == ["AC"] * 5 + ["WA"]
+
+
+def test_apply_marks_skipped_cases_and_dependants():
+    cases, score, groups = _apply({"2b": "AC", "1a": "AC", "1b": "AC", "2a": "WA", "3a": "AC", "4a": "AC"})
+    # 按组排序；组 2 中失败之后的测试点与依赖组 2 的组 3 改为 Skipped，即使它们实际运行并通过了
+    assert [(c["name"], c["status"]) for c in cases] == [
+        ("1a", "AC"), ("1b", "AC"), ("2a", "WA"), ("2b", "Skipped"), ("3a", "Skipped"), ("4a", "AC")]
+    assert cases[3]["time"] is None and cases[3]["message"].startswith("Skipped")
+    assert score == 20.0
+    assert [g["passed"] for g in groups] == [True, False, False, True]
+
+
+def test_apply_keeps_digest_of_skipped_cases():
+    cases, _, _ = test_groups.apply(GROUPS[:1], [_case("1a", "WA"), dict(_case("1b"), digest="d")])
+    assert cases[1] == {"name": "1b", "status": "Skipped", "time": None, "memory": None,
+                        "message": "Skipped: an earlier case in group 1 failed", "diff": "", "digest": "d"}
+
+
+def test_group_with_missing_cases_is_not_passed():
+    cases, score, groups = _apply({"1a": "AC", "2a": "AC", "2b": "AC", "3a": "AC", "4a": "AC"})
+    assert [c["name"] for c in cases] == ["1a", "2a", "2b", "3a", "4a"]
+    # 缺少测试点的组不得分，但不会让依赖它的组跳过（缺少的测试点稍后由调用方合并）
+    assert [g["passed"] for g in groups] == [False, True, True, True]
+    assert score == 80.0
+
+
+def test_apply_with_zero_total_weight():
+    _, score, _ = test_groups.apply([{"name": "g", "weight": 0, "cases": ["1"]}], [_case("1")])
+    assert score == 0.0
+
+
+def test_manifest_groups_from_backend(make_problem):
+    cases = {name: ("", "") for name in ["1", "2", "10", "big1", "big2", "extra"]}
+    make_problem(1, cases, groups=[{"name": "small", "weight": 30, "cases": ["1", "2", "1*"]},
+                                   {"name": "big", "weight": 70, "cases": ["big*", "1"], "depends": ["small", "nope"]}])
+    groups = {g["name"]: g for g in load_groups(1)}
+    assert sorted(groups["small"]["cases"]) == ["1", "10", "2"]
+    assert sorted(groups["big"]["cases"]) == ["big1", "big2"]
+    assert groups["big"]["depends"] == ["small"]
+    assert groups["ungrouped"] == {"name": "ungrouped", "weight": 0.0, "cases": ["extra"], "depends": []}
+
+
+ECHO = "print(input())\n"
+
+
+@pytest.fixture
+def rlimit_box(tmp_path, monkeypatch, data_dir):
+    monkeypatch.setattr(sandbox, "RLIMIT_SANDBOX_ROOT", str(tmp_path / "boxes"))
+    monkeypatch.setattr(judge, "DATA_DIR", str(data_dir))
+    return sandbox.RlimitSandbox()
+
+
+@pytest.mark.parametrize("extra_boxes", [(), (1, 2)])
+def test_judge_submission_with_groups(make_problem, rlimit_box, extra_boxes):
+    make_problem(1, {"1a": ("1", "1\n"), "1b": ("2", "2\n"), "2a": ("3", "x\n"), "2b": ("4", "4\n"),
+                     "3a": ("5", "5\n")},
+                 groups=[{"name": "1", "weight": 40, "cases": ["1*"]},
+                         {"name": "2", "weight": 40, "cases": ["2*"]},
+                         {"name": "3", "weight": 20, "cases": ["3*"], "depends": ["2"]}])
+    result = judge.judge_submission(0, 1, "python", ECHO, {"maxTime": 2}, sandbox=rlimit_box,
+                                    extra_boxes=extra_boxes)
+    assert [(c["name"], c["status"]) for c in result["cases"]] == [
+        ("1a", "AC"), ("1b", "AC"), ("2a", "WA"), ("2b", "Skipped"), ("3a", "Skipped")]
+    assert result["status"] == "WA" and result["score"] == 40.0
+    assert [g["passed"] for g in result["groups"]] == [True, False, False]
+
+
+@pytest.mark.parametrize("extra_boxes", [(), (1, 2)])
+def test_judge_submission_records_reused_failures(make_problem, rlimit_box, extra_boxes):
+    make_problem(1, {"1a": ("1", "1\n"), "2a": ("2", "2\n"), "2b": ("3", "3\n"), "3a": ("4", "4\n"),
+                     "4a": ("5", "5\n")},
+                 groups=[{"name": "1", "weight": 25, "cases": ["1*"]},
+                         {"name": "2", "weight": 25, "cases": ["2*"]},
+                         {"name": "3", "weight": 25, "cases": ["3*"], "depends": ["2"]},
+                         {"name": "4", "weight": 25, "cases": ["4*"]}])
+    # 沿用的 2a 失败：同组的 2b 与依赖组 2 的 3a 不再运行
+    result = judge.judge_submission(0, 1, "python", ECHO, {"maxTime": 2}, sandbox=rlimit_box,
+                                    extra_boxes=extra_boxes, reused={"2a": "WA", "4a": "AC"})
+    assert [(c["name"], c["status"]) for c in result["cases"]] == [
+        ("1a", "AC"), ("2b", "Skipped"), ("3a", "Skipped")]
+    assert result["cases"][1]["message"] == "Skipped: an earlier case in group 2 failed"
+    assert result["cases"][2]["time"] is None
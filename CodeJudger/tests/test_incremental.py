@@ -0,0 +1,146 @@
+import incremental
+from testdata import load_groups
+
+CASES = {"1": ("1", "1\n"), "2": ("2", "2\n"), "3": ("3", "3\n")}
+
+
+def _task(**extra):
+    return {"problem_id": 1, "language": "python", "source_code": "print(input())\n",
+            "limitations": {"maxTime": 1}, **extra}
+
+
+def _case(name, status="AC", time=10.0, **extra):
+    return {"name": name, "status": status, "time": time, "memory": 100.0, "message": "", "diff": "", **extra}
+
+
+def _previous(digests, statuses):
+    return [_case(name, status, digest=digests[name], timings={"run_ms": 5.0})
+            for name, status in zip(digests, statuses)]
+
+
+def test_case_digests_change_only_for_modified_case(make_problem):
+    make_problem(1, CASES)
+    digests = incremental.case_digests(_task(), "isolate")
+    assert list(digests) == ["1", "2", "3"]
+    make_problem(1, {**CASES, "2": ("2", "two\n")})
+    changed = incremental.case_digests(_task(), "isolate")
+    assert [name for name in digests if digests[name] != changed[name]] == ["2"]
+
+
+def test_case_digests_depend_on_the_whole_run(make_problem):
+    make_problem(1, CASES)
+    digests = incremental.case_digests(_task(), "isolate")
+    assert incremental.case_digests(_task(source_code="print(input())\r\n"), "isolate") == digests
+    for other in (incremental.case_digests(_task(source_code="print(1)\n"), "isolate"),
+                  incremental.case_digests(_task(limitations={"maxTime": 2}), "isolate"),
+                  incremental.case_digests(_task(language="cpp"), "isolate"),
+                  incremental.case_digests(_task(), "docker")):
+        assert not set(other.values()) & set(digests.values())
+    make_problem(1, CASES, files={"checker.json": '{"type": "tokens"}'})
+    assert not set(incremental.case_digests(_task(), "isolate").values()) & set(digests.values())
+
+
+def test_no_digests_for_self_test_or_legacy_data(make_problem, data_dir):
+    make_problem(1, CASES)
+    assert incremental.case_digests(_task(test_cases=[{"input": "1", "output": "1"}]), "isolate") == {}
+    assert incremental.case_digests(_task(problem_id=None), "isolate") == {}
+    (data_dir / "2").mkdir()
+    (data_dir / "2" / "1.in").write_text("1")
+    (data_dir / "2" / "1.out").write_text("1")
+    assert incremental.case_digests(_task(problem_id=2), "isolate") == {}
+
+
+def test_plan_reuses_cases_with_unchanged_digest(make_problem):
+    make_problem(1, CASES)
+    digests = incremental.case_digests(_task(), "isolate")
+    previous = _previous(digests, ["AC", "WA", "AC"])
+    previous[2]["digest"] = "stale"
+    reuse = incremental.plan(_task(previous_cases=previous), digests)
+    assert sorted(reuse) == ["1", "2"]
+    assert reuse["2"]["status"] == "WA" and reuse["2"]["reused"] is True
+    assert "timings" not in reuse["1"]
+
+
+def test_plan_reruns_internal_errors_and_skipped_cases(make_problem):
+    make_problem(1, CASES)
+    digests = incremental.case_digests(_task(), "isolate")
+    previous = _previous(digests, ["IE", "Skipped", "AC"])
+    assert list(incremental.plan(_task(previous_cases=previous), digests)) == ["3"]
+
+
+def test_plan_disabled_for_acm_and_no_cache(make_problem):
+    make_problem(1, CASES)
+    digests = incremental.case_digests(_task(), "isolate")
+    previous = _previous(digests, ["AC", "AC", "AC"])
+    assert incremental.plan(_task(previous_cases=previous, no_cache=True), digests) == {}
+    acm = _task(previous_cases=previous, limitations={"maxTime": 1, "judgeMode": "ACM"})
+    assert incremental.plan(acm, incremental.case_digests(acm, "isolate")) == {}
+    assert incremental.plan(_task(previous_cases="bogus"), digests) == {}
+    assert incremental.plan(_task(previous_cases=previous), {}) == {}
+
+
+def test_merge_recomputes_status_and_score(make_problem):
+    make_problem(1, CASES)
+    digests = incremental.case_digests(_task(), "isolate")
+    reuse = incremental.plan(_task(previous_cases=_previous(digests, ["AC", "AC", "AC"])), digests)
+    del reuse["2"]
+    # 本次只运行了测试点 2
+    result = {"status": "TLE", "score": 0, "cases": [_case("2", "TLE", time=1000.0)]}
+    merged = incremental.merge(result, reuse, digests)
+    assert [c["name"] for c in merged["cases"]] == ["1", "2", "3"]
+    assert [c["digest"] for c in merged["cases"]] == list(digests.values())
+    assert merged["status"] == "TLE" and merged["score"] == 66.67
+    assert merged["max_time"] == 1000.0 and merged["reused_cases"] == 2
+    assert [c.get("reused", False) for c in merged["cases"]] == [True, False, True]
+
+
+def test_merge_uses_verdict_precedence(make_problem):
+    make_problem(1, CASES)
+    digests = incremental.case_digests(_task(), "isolate")
+    reuse = incremental.plan(_task(previous_cases=_previous(digests, ["TLE", "AC", "AC"])), digests)
+    del reuse["3"]
+    merged = incremental.merge({"cases": [_case("3", "RE")]}, reuse, digests)
+    assert merged["status"] == "RE"
+
+
+def test_merge_returns_errors_without_cases_unchanged(make_problem):
+    make_problem(1, CASES)
+    digests = incremental.case_digests(_task(), "isolate")
+    reuse = incremental.plan(_task(previous_cases=_previous(digests, ["AC", "AC", "AC"])), digests)
+    del reuse["1"]
+    ce = {"status": "CE", "score": 0, "cases": [], "message": "error"}
+    assert incremental.merge(dict(ce), reuse, digests) == ce
+
+
+def test_merge_without_reuse_only_adds_digests(make_problem):
+    make_problem(1, CASES)
+    digests = incremental.case_digests(_task(), "isolate")
+    result = {"status": "WA", "score": 33.33, "cases": [_case("1"), _case("2", "WA"), _case("3", "WA")]}
+    merged = incremental.merge(result, {}, digests)
+    assert merged["status"] == "WA" and merged["score"] == 33.33 and "reused_cases" not in merged
+    assert [c["digest"] for c in merged["cases"]] == list(digests.values())
+
+
+def test_reused_only(make_problem):
+    make_problem(1, CASES)
+    digests = incremental.case_digests(_task(), "isolate")
+    reuse = incremental.plan(_task(previous_cases=_previous(digests, ["AC", "WA", "AC"])), digests)
+    result = incremental.reused_only(reuse, digests)
+    assert result["status"] == "WA" and result["score"] == 66.67 and result["reused_cases"] == 3
+    del reuse["3"]
+    assert incremental.reused_only(reuse, digests) is None
+    assert incremental.reused_only({}, digests) is None
+
+
+def test_merge_with_groups_skips_after_reused_failure(make_problem):
+    groups = [{"name": "a", "weight": 40, "cases": ["1", "2"]}, {"name": "b", "weight": 60, "cases": ["3"]}]
+    make_problem(1, CASES, groups=groups)
+    digests = incremental.case_digests(_task(), "isolate")
+    reuse = incremental.plan(_task(previous_cases=_previous(digests, ["WA", "AC", "AC"])), digests)
+    del reuse["2"]
+    # 测试点 2 的数据改动后重新运行并通过，但同组沿用的测试点 1 失败，按组重新判定为 Skipped
+    merged = incremental.merge({"cases": [_case("2")]}, reuse, digests, load_groups(1))
+    assert [c["status"] for c in merged["cases"]] == ["WA", "Skipped", "AC"]
+    assert merged["cases"][1]["digest"] == digests["2"]
+    assert merged["score"] == 60.0 and merged["status"] == "WA"
+    assert [g["passed"] for g in merged["groups"]] == [False, True]
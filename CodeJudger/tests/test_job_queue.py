@@ -0,0 +1,241 @@
+import json
+import time
+import pytest
+import job_queue
+from config import QUEUE_KEY
+
+
+def _job(sid, user=1, **extra):
+    return {"submission_id": sid, "user_id": user, **extra}
+
+
+def _take(rds, worker="w1", scheduler=None, timeout=1):
+    item = job_queue.dequeue(rds, scheduler or job_queue.LaneScheduler(), worker, timeout=timeout)
+    return None if item is None else item[1]["submission_id"]
+
+
+def _drain(rds, worker="w1"):
+    taken = []
+    while True:
+        sid = _take(rds, worker, timeout=0.01)
+        if sid is None:
+            return taken
+        taken.append(sid)
+        job_queue.ack(rds, worker, {"submission_id": sid})
+
+
+@pytest.fixture
+def live_only(monkeypatch):
+    """只从 live 取任务，排除 lane 加权轮转对顺序的影响"""
+    monkeypatch.setattr(job_queue.LaneScheduler, "next_order", lambda self: ["live"])
+
+
+def test_round_robin_between_users(rds, live_only):
+    for i in range(3):
+        job_queue.enqueue(rds, _job(f"a{i}", user=1), "live")
+    job_queue.enqueue(rds, _job("b0", user=2), "live")
+    job_queue.enqueue(rds, _job("c0", user=None), "live")
+    assert _drain(rds) == ["a0", "b0", "c0", "a1", "a2"]
+    assert job_queue.lane_depths(rds)["live"] == 0
+
+
+def test_unknown_lane_falls_back_to_default(rds):
+    assert job_queue.enqueue(rds, _job("s1"), "nope") == job_queue.DEFAULT_LANE
+    lane, job = job_queue.dequeue(rds, job_queue.LaneScheduler(), "w1", timeout=1)
+    assert lane == job_queue.DEFAULT_LANE and job["lane"] == job_queue.DEFAULT_LANE
+
+
+def test_enqueue_front(rds, live_only):
+    job_queue.enqueue(rds, _job("s1"), "live")
+    job_queue.enqueue(rds, _job("s2"), "live", front=True)
+    assert _drain(rds) == ["s2", "s1"]
+
+
+def test_dequeue_times_out_when_empty(rds):
+    start = time.time()
+    assert _take(rds, timeout=1) is None
+    assert time.time() - start < 3
+
+
+def test_inflight_cap(rds, monkeypatch):
+    monkeypatch.setattr(job_queue, "MAX_INFLIGHT_PER_USER", 2)
+    job_queue.enqueue(rds, _job("s1"), "live")
+    job_queue.enqueue(rds, _job("s2"), "live")
+    with pytest.raises(job_queue.QueueFull):
+        job_queue.enqueue(rds, _job("s3"), "live")
+    # 同一提交重新入队（如重判）不占新名额；其他用户、不受限的 lane、匿名提交不受影响
+    job_queue.enqueue(rds, _job("s2"), "live")
+    job_queue.enqueue(rds, _job("t1", user=2), "live")
+    job_queue.enqueue(rds, _job("s3"), "rejudge")
+    job_queue.enqueue(rds, _job("x1", user=None), "live")
+    job_queue.enqueue(rds, _job("x2", user=None), "live")
+    job_queue.enqueue(rds, _job("x3", user=None), "live")
+
+    # 判完一个就释放一个名额
+    job_queue.finish(rds, _job("s1"))
+    job_queue.enqueue(rds, _job("s3"), "live")
+    with pytest.raises(job_queue.QueueFull):
+        job_queue.enqueue(rds, _job("s4"), "deadline")
+
+
+def test_inflight_cap_drops_stale_entries(rds, monkeypatch):
+    monkeypatch.setattr(job_queue, "MAX_INFLIGHT_PER_USER", 1)
+    job_queue.enqueue(rds, _job("s1"), "live")
+    rds.zadd(job_queue.INFLIGHT_PREFIX + "1", {"s1": time.time() - job_queue.INFLIGHT_STALE_SEC - 10})
+    job_queue.enqueue(rds, _job("s2"), "live")
+
+
+def test_reserve_takes_the_slot_before_enqueue(rds, monkeypatch):
+    monkeypatch.setattr(job_queue, "MAX_INFLIGHT_PER_USER", 1)
+    job_queue.reserve(rds, _job("s1"), "live")
+    with pytest.raises(job_queue.QueueFull):
+        job_queue.reserve(rds, _job("s2"), "live")
+    # 占到名额的提交随后入队不再被拒；匿名提交与不受限的 lane 不占名额
+    job_queue.enqueue(rds, _job("s1"), "live")
+    job_queue.reserve(rds, _job("x1", user=None), "live")
+    job_queue.reserve(rds, _job("s2"), "rejudge")
+    assert rds.zrange(job_queue.INFLIGHT_PREFIX + "1", 0, -1) == ["s1"]
+    # 占了名额却没入队的，finish 释放
+    job_queue.finish(rds, _job("s1"))
+    job_queue.reserve(rds, _job("s2"), "live")
+
+
+def test_inflight_released_on_ack(rds, monkeypatch):
+    monkeypatch.setattr(job_queue, "MAX_INFLIGHT_PER_USER", 1)
+    job_queue.enqueue(rds, _job("s1"), "live")
+    lane, job = job_queue.dequeue(rds, job_queue.LaneScheduler(), "w1", timeout=1)
+    with pytest.raises(job_queue.QueueFull):
+        job_queue.enqueue(rds, _job("s2"), "live")
+    job_queue.ack(rds, "w1", job)
+    job_queue.enqueue(rds, _job("s2"), "live")
+
+
+def test_dequeue_records_processing_and_lease(rds):
+    job_queue.enqueue(rds, _job("s1"), "live")
+    _, job = job_queue.dequeue(rds, job_queue.LaneScheduler(), "w1", timeout=1)
+    assert [json.loads(raw)["submission_id"] for raw in rds.lrange(f"{QUEUE_KEY}:processing:w1", 0, -1)] == ["s1"]
+    assert "w1" in rds.hgetall(job_queue.LEASES_KEY)
+    job_queue.ack(rds, "w1", job)
+    assert rds.llen(f"{QUEUE_KEY}:processing:w1") == 0
+    assert "w1" not in rds.hgetall(job_queue.LEASES_KEY)
+
+
+def _reap(rds, worker="reaper"):
+    rds.delete(job_queue.REAPER_LOCK_KEY)
+    return job_queue.reap(rds, worker)
+
+
+def test_reap_requeues_jobs_of_worker_without_heartbeat(rds, live_only):
+    job_queue.enqueue(rds, _job("s1"), "live")
+    job_queue.enqueue(rds, _job("s2"), "live")
+    assert _take(rds, "dead") == "s1"
+    job_queue.heartbeat(rds, "alive")
+    assert _take(rds, "alive") == "s2"
+
+    assert _reap(rds) == []
+    # 放回原用户子队列队首；活着的 worker 的任务不动
+    assert rds.llen(f"{QUEUE_KEY}:processing:dead") == 0
+    assert rds.llen(f"{QUEUE_KEY}:processing:alive") == 1
+    assert "dead" not in rds.hgetall(job_queue.LEASES_KEY)
+    assert rds.hget(job_queue.ATTEMPTS_KEY, "s1") == "1"
+    assert job_queue.lane_depths(rds)["live"] == 1
+    assert _take(rds, "w2") == "s1"
+
+
+def test_reap_leaves_long_running_jobs_of_live_workers(rds):
+    job_queue.heartbeat(rds, "slow")
+    job_queue.enqueue(rds, _job("s1"), "live")
+    assert _take(rds, "slow") == "s1"
+    # 判了很久但心跳正常：不回收，避免同一提交被两个 worker 判两次
+    rds.hset(job_queue.LEASES_KEY, "slow", time.time() - 86400)
+    assert _reap(rds) == []
+    assert rds.llen(f"{QUEUE_KEY}:processing:slow") == 1
+    assert _take(rds, "w2", timeout=0.01) is None
+
+    rds.delete(f"{QUEUE_KEY}:hb:slow")
+    assert _reap(rds) == []
+    assert rds.llen(f"{QUEUE_KEY}:processing:slow") == 0
+    assert _take(rds, "w2") == "s1"
+
+
+def test_reap_gives_up_after_max_attempts(rds):
+    job_queue.enqueue(rds, _job("s1"), "live")
+    for attempt in range(1, job_queue.MAX_JOB_ATTEMPTS):
+        assert _take(rds, f"dead{attempt}") == "s1"
+        assert _reap(rds) == []
+    assert _take(rds, "last") == "s1"
+    dead = _reap(rds)
+    assert [job["submission_id"] for job in dead] == ["s1"]
+    assert rds.hget(job_queue.ATTEMPTS_KEY, "s1") is None
+    assert _take(rds, timeout=0.01) is None
+
+
+def test_reap_runs_once_per_interval(rds):
+    job_queue.enqueue(rds, _job("s1"), "live")
+    assert _take(rds, "dead") == "s1"
+    assert job_queue.reap(rds, "r1") == []
+    assert _take(rds, "dead2") == "s1"
+    # 锁未过期，第二个回收器不执行
+    job_queue.reap(rds, "r2")
+    assert rds.llen(f"{QUEUE_KEY}:processing:dead2") == 1
+    assert rds.hget(job_queue.ATTEMPTS_KEY, "s1") == "1"
+
+
+def test_requeue_puts_job_back_without_counting_an_attempt(rds, live_only):
+    job_queue.enqueue(rds, _job("a1", user=1), "live")
+    job_queue.enqueue(rds, _job("a2", user=1), "live")
+    job_queue.enqueue(rds, _job("b1", user=2), "live")
+    assert _take(rds, "w1") == "a1"
+    job_queue.requeue(rds, "w1")
+
+    assert rds.llen(f"{QUEUE_KEY}:processing:w1") == 0
+    assert "w1" not in rds.hgetall(job_queue.LEASES_KEY)
+    assert rds.hget(job_queue.ATTEMPTS_KEY, "a1") is None
+    assert job_queue.lane_depths(rds)["live"] == 3
+    # 放回用户子队列队首，用户 1 的其它任务仍在它之后；用户 2 已排在环中用户 1 之前
+    assert _drain(rds) == ["b1", "a1", "a2"]
+
+
+def test_requeue_of_only_job_moves_user_to_ring_tail(rds, live_only):
+    job_queue.enqueue(rds, _job("a1", user=1), "live")
+    job_queue.enqueue(rds, _job("b1", user=2), "live")
+    job_queue.enqueue(rds, _job("b2", user=2), "live")
+    assert _take(rds, "w1") == "a1"
+    job_queue.requeue(rds, "w1")
+    assert _drain(rds) == ["b1", "a1", "b2"]
+
+
+def test_lane_scheduler_smooth_weighted_round_robin():
+    weights = {"selftest": 8, "deadline": 6, "live": 4, "rejudge": 1}
+    scheduler = job_queue.LaneScheduler(weights)
+    total = sum(weights.values())
+    firsts = [scheduler.next_order()[0] for _ in range(total * 3)]
+    for cycle in range(3):
+        window = firsts[cycle * total:(cycle + 1) * total]
+        assert {lane: window.count(lane) for lane in weights} == weights
+    # 平滑：最高权重的 lane 不会连续霸占；最低权重的 lane 每轮都有机会
+    assert firsts[:4] == ["selftest", "deadline", "live", "selftest"]
+    assert "rejudge" in firsts[:total]
+    # 其余 lane 按优先级顺序排在后面
+    order = scheduler.next_order()
+    assert sorted(order) == sorted(job_queue.QUEUE_LANES)
+    rest = [lane for lane in job_queue.QUEUE_LANES if lane != order[0]]
+    assert order[1:] == rest
+
+
+def test_lane_scheduler_with_zero_weights():
+    scheduler = job_queue.LaneScheduler({lane: 0 for lane in job_queue.QUEUE_LANES})
+    assert scheduler.next_order() == list(job_queue.QUEUE_LANES)
+
+
+def test_weighted_dequeue_across_lanes(rds):
+    for i in range(10):
+        job_queue.enqueue(rds, _job(f"r{i}"), "rejudge")
+        job_queue.enqueue(rds, _job(f"l{i}"), "live")
+    scheduler = job_queue.LaneScheduler({"selftest": 0, "deadline": 0, "live": 4, "rejudge": 1})
+    lanes = []
+    for _ in range(10):
+        lane, job = job_queue.dequeue(rds, scheduler, "w1", timeout=1)
+        job_queue.ack(rds, "w1", job)
+        lanes.append(lane)
+    assert lanes.count("live") == 8 and lanes.count("rejudge") == 2
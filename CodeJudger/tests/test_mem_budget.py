@@ -0,0 +1,85 @@
+import time
+import pytest
+import job_queue
+import mem_budget
+
+BUDGET = 1000
+
+
+@pytest.fixture
+def budget(monkeypatch):
+    monkeypatch.setattr(mem_budget, "budget_mb", lambda: BUDGET)
+
+
+def _admit(rds, worker, need, submission_id=None):
+    job_queue.heartbeat(rds, worker)
+    return mem_budget.admit(rds, worker, need, submission_id, wait_sec=0)
+
+
+def _waiting(rds):
+    return rds.hgetall(mem_budget.WAIT_KEY)
+
+
+def test_admit_within_budget_and_release(rds, budget):
+    assert _admit(rds, "w1", 600) == "admitted"
+    assert _admit(rds, "w2", 300) == "admitted"
+    assert _admit(rds, "w3", 200, "s3") == "deferred"
+    mem_budget.release(rds, "w1")
+    assert _admit(rds, "w3", 200, "s3") == "admitted"
+    assert rds.hgetall(mem_budget.HELD_KEY) == {"w2": "300", "w3": "200"}
+    assert _waiting(rds) == {}
+
+
+def test_oversized_job_runs_alone(rds, budget):
+    assert _admit(rds, "w1", 5000) == "admitted"
+    assert _admit(rds, "w2", 10) == "deferred"
+
+
+def test_reservations_of_dead_workers_are_dropped(rds, budget):
+    assert _admit(rds, "w1", 900) == "admitted"
+    rds.delete(f"{job_queue.QUEUE_KEY}:hb:w1")
+    assert _admit(rds, "w2", 900) == "admitted"
+    assert "w1" not in rds.hgetall(mem_budget.HELD_KEY)
+
+
+def test_deferred_job_keeps_blocking_smaller_jobs(rds, budget):
+    assert _admit(rds, "w1", 600) == "admitted"
+    assert _admit(rds, "w2", 600, "big") == "deferred"
+    # 大提交放回队列后仍占着等待位置：后来的小提交即使放得下也不能先占用内存
+    assert _admit(rds, "w3", 300, "small") == "deferred"
+    mem_budget.release(rds, "w1")
+    assert _admit(rds, "w3", 500, "small") == "deferred"
+    # 再次取到大提交（可能是另一个 worker）时接替保留的位置并准入
+    assert _admit(rds, "w4", 600, "big") == "admitted"
+    assert "job:big" not in _waiting(rds)
+
+
+def test_deferred_job_keeps_its_original_wait_time(rds, budget):
+    assert _admit(rds, "w1", 600) == "admitted"
+    assert _admit(rds, "w2", 700, "big") == "deferred"
+    first_since = _waiting(rds)["job:big"].split(":")[1]
+    time.sleep(0.01)
+    # 之后才开始等待的提交排在大提交后面
+    job_queue.heartbeat(rds, "w5")
+    assert not mem_budget.reserve(rds, "w5", 400, BUDGET, time.time())
+    # 再次取到仍放不下时沿用最初的等待时间
+    assert _admit(rds, "w4", 700, "big") == "deferred"
+    assert _waiting(rds)["job:big"].split(":")[1] == first_since
+
+    mem_budget.release(rds, "w1")
+    assert _admit(rds, "w6", 700, "big") == "admitted"
+    assert not mem_budget.reserve(rds, "w5", 400, BUDGET, time.time())
+
+
+def test_expired_hold_is_dropped(rds, budget, monkeypatch):
+    monkeypatch.setattr(mem_budget, "ADMISSION_HOLD_SEC", -1)
+    assert _admit(rds, "w1", 600) == "admitted"
+    assert _admit(rds, "w2", 600, "big") == "deferred"
+    assert _admit(rds, "w3", 300, "small") == "admitted"
+    assert "job:big" not in _waiting(rds)
+
+
+def test_no_budget_admits_everything(rds, monkeypatch):
+    monkeypatch.setattr(mem_budget, "budget_mb", lambda: None)
+    assert _admit(rds, "w1", 10 ** 9) == "admitted"
+    assert rds.hgetall(mem_budget.HELD_KEY) == {}
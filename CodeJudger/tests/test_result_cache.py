@@ -0,0 +1,120 @@
+import pytest
+import result_cache
+from config import RESULT_CACHE_PREFIX
+
+SOURCE = "print(input())\n"
+LIMITS = {"maxTime": 1, "maxMemory": 256}
+
+
+def _key(problem_id=1, source=SOURCE, limitations=LIMITS, language="python", sandbox_name="isolate"):
+    return result_cache.cache_key(problem_id, language, source, limitations, sandbox_name)
+
+
+def _result(status="AC"):
+    return {
+        "status": status, "score": 100, "max_time": 12.0, "max_memory": 3000,
+        "cases": [{"name": "1", "status": status, "time": 12.0, "memory": 3000, "message": "", "diff": "",
+                   "timings": {"run_ms": 20.0, "compare_ms": 0.1}}],
+        "timings": {"total_ms": 40.0}, "box_setup_saved_ms": 3.0, "finished_at": "2020-01-01T00:00:00",
+    }
+
+
+def test_no_key_without_problem_or_manifest(data_dir):
+    assert _key(problem_id=None) is None
+    assert _key(problem_id=7) is None
+    # 没有 manifest 的旧数据无法判断是否改动
+    (data_dir / "8").mkdir()
+    (data_dir / "8" / "1.in").write_text("1")
+    (data_dir / "8" / "1.out").write_text("1")
+    assert _key(problem_id=8) is None
+
+
+def test_disabled_when_ttl_is_zero(make_problem, monkeypatch):
+    make_problem(1, {"1": ("1", "1\n")})
+    monkeypatch.setattr(result_cache, "RESULT_CACHE_TTL_SEC", 0)
+    assert _key() is None
+
+
+def test_key_ignores_line_endings_and_trailing_whitespace(make_problem):
+    make_problem(1, {"1": ("1", "1\n")})
+    key = _key()
+    assert key is not None
+    assert _key(source="print(input())\r\n") == key
+    assert _key(source="print(input())\n\n  \n") == key
+    # 代码内容（包括行首缩进、行内空白）的改动都视为不同的代码
+    assert _key(source="print( input())\n") != key
+    assert _key(source=" print(input())\n") != key
+
+
+def test_key_depends_on_language_limits_and_backend(make_problem):
+    make_problem(1, {"1": ("1", "1\n")})
+    key = _key()
+    assert _key(limitations={"maxMemory": 256, "maxTime": 1}) == key
+    assert _key(limitations={"maxTime": 2, "maxMemory": 256}) != key
+    assert _key(limitations={**LIMITS, "judgeMode": "acm"}) != key
+    assert _key(language="cpp") != key
+    assert _key(sandbox_name="docker") != key
+    assert _key(problem_id=2) is None
+
+
+def test_key_changes_with_test_data_and_checker(make_problem):
+    make_problem(1, {"1": ("1", "1\n")})
+    key = _key()
+    make_problem(1, {"1": ("1", "1\n")})
+    assert _key() == key
+    make_problem(1, {"1": ("1", "2\n")})
+    changed = _key()
+    assert changed != key
+    make_problem(1, {"1": ("1", "2\n")}, files={"checker.json": '{"type": "tokens"}'})
+    assert _key() not in (key, changed)
+
+
+def test_store_and_lookup_roundtrip(rds, make_problem):
+    make_problem(1, {"1": ("1", "1\n")})
+    key = _key()
+    assert result_cache.lookup(rds, key) is None
+    result_cache.store(rds, key, _result(), "s1")
+    hit = result_cache.lookup(rds, key)
+    assert hit["status"] == "AC" and hit["score"] == 100
+    assert hit["cached"] is True and hit["cached_from"] == "s1"
+    assert hit["finished_at"] != "2020-01-01T00:00:00"
+    # 各阶段耗时不进缓存，命中时不计入耗时指标
+    assert "timings" not in hit and "box_setup_saved_ms" not in hit
+    assert all("timings" not in case for case in hit["cases"])
+    assert hit["cases"][0]["time"] == 12.0
+    assert 0 < rds.ttl(RESULT_CACHE_PREFIX + key) <= result_cache.RESULT_CACHE_TTL_SEC
+
+
+def test_lookup_of_a_cached_result_is_stored_again_without_marks(rds, make_problem):
+    make_problem(1, {"1": ("1", "1\n")})
+    key = _key()
+    result_cache.store(rds, key, _result(), "s1")
+    result_cache.store(rds, key, result_cache.lookup(rds, key), "s2")
+    assert result_cache.lookup(rds, key)["cached_from"] == "s2"
+
+
+@pytest.mark.parametrize("status", ["IE", None])
+def test_internal_errors_are_not_cached(rds, make_problem, status):
+    make_problem(1, {"1": ("1", "1\n")})
+    key = _key()
+    result = _result()
+    result["status"] = status
+    result_cache.store(rds, key, result, "s1")
+    assert result_cache.lookup(rds, key) is None
+
+
+def test_large_results_are_compressed(rds, make_problem):
+    make_problem(1, {"1": ("1", "1\n")})
+    key = _key()
+    result = _result("WA")
+    result["cases"] = [dict(result["cases"][0], name=str(i), diff="x" * 500) for i in range(100)]
+    result_cache.store(rds, key, result, "s1")
+    assert rds.get(RESULT_CACHE_PREFIX + key).startswith("z:")
+    assert len(result_cache.lookup(rds, key)["cases"]) == 100
+
+
+def test_corrupt_entry_is_a_miss(rds, make_problem):
+    make_problem(1, {"1": ("1", "1\n")})
+    key = _key()
+    rds.set(RESULT_CACHE_PREFIX + key, "{not json")
+    assert result_cache.lookup(rds, key) is None
@@ -0,0 +1,87 @@
+import os
+import sys
+import pytest
+import sandbox
+
+FAKE_ISOLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fake_isolate.py")
+
+ALLOC = "import sys\nx = bytearray({mb} * 1024 * 1024)\nx[::4096] = b'1' * len(x[::4096])\nprint('done')\n"
+
+
+def _run(tmp_path, code, mem_kb, time_limit=5, harden=False, cmd=None):
+    src = tmp_path / "main.py"
+    src.write_text(code)
+    return sandbox.exec_limited(str(tmp_path), cmd or [sys.executable, str(src)], {"PATH": "/usr/bin:/bin"},
+                                stdin="", stdout="out.txt", stderr="err.txt",
+                                time_limit=time_limit, mem_kb=mem_kb, harden=harden)
+
+
+def test_allocation_within_limit(tmp_path):
+    fields = _run(tmp_path, ALLOC.format(mb=16), mem_kb=256 * 1024)
+    assert "status" not in fields, fields
+    assert (tmp_path / "out.txt").read_text() == "done\n"
+
+
+def test_allocation_beyond_limit_fails_and_is_reported_as_mle(tmp_path):
+    # 上限是硬性的：分配直接失败，不会先占满节点内存再在事后按 max-rss 判定
+    fields = _run(tmp_path, ALLOC.format(mb=2048), mem_kb=128 * 1024)
+    assert fields["status"] == "SG" and fields.get("cg-oom-killed") == 1, fields
+    assert fields["max-rss"] < 512 * 1024
+    assert (tmp_path / "out.txt").read_text() == ""
+
+
+def test_unrelated_failure_is_not_mle(tmp_path):
+    fields = _run(tmp_path, "raise SystemExit(3)\n", mem_kb=128 * 1024)
+    assert fields["status"] == "RE" and fields["exitcode"] == 3
+
+
+def test_limits_and_hardening_apply_to_the_child(tmp_path):
+    code = ("import resource\n"
+            "print(resource.getrlimit(resource.RLIMIT_DATA)[0] // 1024)\n"
+            "print([l for l in open('/proc/self/status') if l.startswith('NoNewPrivs')][0].split()[1])\n")
+    fields = _run(tmp_path, code, mem_kb=128 * 1024, harden=True)
+    assert "status" not in fields, (tmp_path / "err.txt").read_text()
+    assert (tmp_path / "out.txt").read_text().split() == [str(128 * 1024), "1"]
+
+
+def test_missing_command_is_runtime_error(tmp_path):
+    fields = _run(tmp_path, "", mem_kb=0, cmd=["./nope"])
+    assert fields["status"] == "RE" and fields["exitcode"] == 127
+    assert "exec failed" in (tmp_path / "err.txt").read_text()
+
+
+@pytest.fixture
+def fake_isolate(tmp_path, monkeypatch):
+    monkeypatch.setattr(sandbox, "ISOLATE_BIN", FAKE_ISOLATE)
+    monkeypatch.setattr(sandbox, "ISOLATE_BOX_ROOT", str(tmp_path / "boxes"))
+    monkeypatch.setenv("ISOLATE_BOX_ROOT", str(tmp_path / "boxes"))
+    return sandbox.IsolateSandbox()
+
+
+def test_isolate_prepare_and_reset(fake_isolate):
+    workdir = fake_isolate.prepare(3)
+    assert os.path.isdir(workdir)
+    fake_isolate.reset(3)
+    assert not os.path.exists(workdir)
+
+
+def test_isolate_init_failure_raises(fake_isolate, tmp_path):
+    # box 根目录被一个文件占住，--init 失败
+    (tmp_path / "boxes").write_text("")
+    with pytest.raises(RuntimeError, match="--init of box 3 failed with exit code 1") as e:
+        fake_isolate.prepare(3)
+    assert "NotADirectoryError" in str(e.value)
+
+
+def test_unisolated_backend_requires_opt_in(monkeypatch):
+    monkeypatch.setattr(sandbox, "SANDBOX_BACKENDS", {"cpp": "rlimit", "python": "isolate"})
+    monkeypatch.setattr(sandbox, "ALLOW_UNISOLATED_SANDBOX", False)
+    assert sandbox.backend_name("python") == "isolate"
+    with pytest.raises(ValueError, match="ALLOW_UNISOLATED_SANDBOX"):
+        sandbox.backend_name("cpp")
+    with pytest.raises(ValueError, match="ALLOW_UNISOLATED_SANDBOX"):
+        sandbox.box_backends()
+
+    monkeypatch.setattr(sandbox, "ALLOW_UNISOLATED_SANDBOX", True)
+    assert sandbox.backend_name("cpp") == "rlimit"
+    assert sandbox.box_backends() == ["isolate", "rlimit"]
@@ -0,0 +1,60 @@
+import pytest
+import job_queue
+import supervisor
+
+
+class FakeProcess:
+    def __init__(self, pid):
+        self.pid = pid
+        self.alive = True
+
+    def is_alive(self):
+        return self.alive
+
+    def join(self):
+        pass
+
+
+@pytest.fixture
+def sup(rds, monkeypatch):
+    monkeypatch.setattr(supervisor, "MIN_WORKERS", 1)
+    monkeypatch.setattr(supervisor, "SCALE_DOWN_IDLE_SEC", 0)
+    monkeypatch.setattr(supervisor, "available_mem_mb", lambda: None)
+    monkeypatch.setattr(supervisor.os, "kill", lambda pid, sig: None)
+    monkeypatch.setattr(supervisor.Supervisor, "max_workers", lambda self: 3)
+    s = supervisor.Supervisor(target=None)
+    s._rds = rds
+
+    def spawn():
+        s._workers[s._next_idx] = FakeProcess(1000 + s._next_idx)
+        s._next_idx += 1
+
+    monkeypatch.setattr(s, "_spawn", spawn)
+    return s
+
+
+def _backlog(rds, n):
+    for i in range(n):
+        job_queue.enqueue(rds, {"submission_id": f"s{i}", "user_id": i}, "live")
+
+
+def test_draining_workers_count_against_the_limit(sup, rds):
+    _backlog(rds, 5)
+    sup._scale()
+    assert len(sup._workers) == 3
+
+    # 队列空闲后缩掉一个；它判完手上的任务之前，新的积压不能再占它的核与 box
+    for _ in range(5):
+        job_queue.dequeue(rds, job_queue.LaneScheduler(), "w", timeout=1)
+    sup._scale()
+    assert len(sup._workers) == 2 and len(sup._draining) == 1
+    _backlog(rds, 5)
+    sup._scale()
+    assert len(sup._workers) == 2
+
+    # 退出后补上
+    sup._draining[2].alive = False
+    sup._reap()
+    sup._scale()
+    assert len(sup._workers) == 3 and not sup._draining
+
@@ -0,0 +1,87 @@
+# watchdog.py
+"""
+worker 看门狗
+
+每个测试点已有墙钟上限（sandbox.wall_time_limit），但沙箱本身卡住（isolate、docker 客户端无响应）、
+或测试点很多的提交仍可能长时间占着 worker。看门狗为每个提交设置硬预算 SUBMISSION_BUDGET_SEC：
+超时后由 on_expire 上报结果（IE）并确认任务，再杀死本进程的所有子孙进程（含 setsid 的选手程序）并退出，
+由 Supervisor 重启 worker。box 租约为文件锁，进程退出即释放。
+"""
+import os
+import time
+import signal
+import threading
+from typing import Callable, List, Optional
+
+EXIT_CODE = 75  # 看门狗退出时的进程退出码，便于在 Supervisor 日志中区分
+
+
+def _children() -> dict:
+    """ppid -> [pid]，读取 /proc"""
+    tree = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                # comm 可能含空格与括号，从最后一个 ')' 之后解析
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        tree.setdefault(int(fields[1]), []).append(int(entry))
+    return tree
+
+
+def descendants(pid: int) -> List[int]:
+    tree = _children()
+    result, stack = [], [pid]
+    while stack:
+        for child in tree.get(stack.pop(), []):
+            result.append(child)
+            stack.append(child)
+    return result
+
+
+def kill_descendants() -> None:
+    for pid in descendants(os.getpid()):
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+
+class Watchdog:
+    def __init__(self, on_expire: Callable[[dict, float], None], interval: float = 1.0):
+        self._on_expire = on_expire
+        self._interval = interval
+        self._task: Optional[dict] = None
+        self._started = 0.0
+        self._deadline = 0.0
+        self._lock = threading.Lock()
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def arm(self, task: dict, budget_sec: float) -> None:
+        with self._lock:
+            self._task = task
+            self._started = time.monotonic()
+            self._deadline = self._started + budget_sec
+
+    def disarm(self) -> None:
+        with self._lock:
+            self._task = None
+
+    def _loop(self):
+        while True:
+            time.sleep(self._interval)
+            with self._lock:
+                task = self._task
+                expired = task is not None and time.monotonic() > self._deadline
+                elapsed = time.monotonic() - self._started
+            if not expired:
+                continue
+            try:
+                self._on_expire(task, elapsed)
+            except Exception as e:
+                print(f"[Watchdog] failed to report submission {task.get('submission_id')}: {e}")
+            kill_descendants()
+            os._exit(EXIT_CODE)
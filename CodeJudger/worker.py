@@ -1,120 +1,288 @@
 import os
 import json
+import time
+import signal
+import socket
+import threading
 import redis
-import requests
-from judge import judge_submission
-from docker_judge import judge_submission_docker
-from config import REDIS_URL, QUEUE_KEY, WORKER_PROCESSES, BOX_ID_START, SUB_HASH_PREFIX
+from typing import Dict, Optional
+from judge import judge_submission, CPP_COMPILER, CPP_FLAGS
+from box_pool import BoxPool
+import box_alloc
+import sandbox as sandboxes
+import pch
+import job_queue
+import blobs
+import callbacks
+import metrics
+import cpus
+import result_cache
+import incremental
+import mem_budget
+from testdata import load_groups
+from supervisor import Supervisor
+from watchdog import Watchdog
+from config import (REDIS_URL, BOX_POOL_SIZE, PARALLEL_BOXES, SUB_HASH_PREFIX, SANDBOX_BACKENDS,
+                    HEARTBEAT_INTERVAL, MAX_JOB_ATTEMPTS, RESULT_TTL_SEC, SELFTEST_TTL_SEC, SUBMISSION_BUDGET_SEC)
 from datetime import datetime
 
-def worker_loop(worker_idx: int):
-    box_id = (BOX_ID_START + worker_idx) % 1000
-    rds = redis.from_url(REDIS_URL, decode_responses=True)
+def _handle_task(worker_idx: int, rds, pools: Dict[str, BoxPool], lane: str, task: dict):
+    try:
+        blobs.hydrate(rds, task)
+    except blobs.BlobMissing as e:
+        print(f"[Worker {worker_idx}] Submission {task['submission_id']}: {e}")
+        _fail(rds, task, "提交内容已过期，请重新提交")
+        return
+
+    test_cases = task.get("test_cases")
+    submission_id = task["submission_id"]
+    problem_id = task.get("problem_id")
+    source_code = task["source_code"]
+    language = task["language"]
+    limitations = task.get("limitations", {})
 
-    print(f"[Worker {worker_idx}] start, box_id={box_id}")
-    while True:
-        # 阻塞等待任务
-        _, raw = rds.blpop(QUEUE_KEY)
-        task = json.loads(raw)
-
-        test_cases = task.get("test_cases")
-        submission_id = task["submission_id"]
-        problem_id = task.get("problem_id")
-        source_code = task["source_code"]
-        language = task["language"]
-        limitations = task.get("limitations", {})
+    print(f"[Worker {worker_idx}] Judging submission {submission_id} ({lane})")
+    _observe_queue_wait(rds, lane, task)
     
+    # 回调 Web（写入发件箱，由回调发送进程投递）
+    callbacks.post(rds, task, {
+        "status": "Judging",
+        "score": 0,
+        "detail": [],
+        "finished_at": None,
+        "callback_token": task.get("callback_token")
+    })
 
-        print(f"[Worker {worker_idx}] Judging submission {submission_id}")
-        
-        # 回调 Web
-        callback_url = task.get("callback_url")
-        if callback_url:
-            callback_payload = {
-                "status": "Judging",
-                "score": 0,
-                "detail": [],
-                "finished_at": None,
-                "callback_token": task.get("callback_token")
-            }
-            try:
-                resp = requests.put(task["callback_url"], json=callback_payload, timeout=10)
-                resp.raise_for_status()
-                print(f"[Worker {worker_idx}] Submission {submission_id} updated successfully")
-            except Exception as e:
-                print(f"[Worker {worker_idx}] Failed to update submission {submission_id}: {e}")
+    backend = sandboxes.for_language(language)
+    # 自测自带测试数据，不走结果缓存
+    cache_key = None if test_cases is not None else result_cache.cache_key(
+        problem_id, language, source_code, limitations, backend.name)
+    result = None
+    if cache_key:
+        if task.get("no_cache"):
+            outcome = "bypass"
+        else:
+            result = result_cache.lookup(rds, cache_key)
+            outcome = "hit" if result else "miss"
+        metrics.inc(rds, "judge_result_cache_total", {"outcome": outcome})
+    if result is not None:
+        print(f"[Worker {worker_idx}] Submission {submission_id} reused result of {result['cached_from']}")
+    else:
+        # 增量重判：digest 未变的测试点沿用上一次的结果，只运行其余测试点
+        digests = incremental.case_digests(task, backend.name)
+        reuse = incremental.plan(task, digests)
+        groups = load_groups(problem_id) if reuse else None
+        result = incremental.reused_only(reuse, digests, groups)
+        if result is None:
+            result = _judge(worker_idx, rds, pools, backend, task, reused={name: case["status"] for name, case in reuse.items()})
+        result = incremental.merge(result, reuse, digests, groups)
+        if reuse:
+            metrics.inc(rds, "judge_reused_cases_total", amount=len(reuse))
+            print(f"[Worker {worker_idx}] Submission {submission_id} reused {len(reuse)}/{len(digests)} cases")
+        if cache_key:
+            result_cache.store(rds, cache_key, result, submission_id)
+    result["sandbox"] = backend.name
+    try:
+        metrics.observe_result(rds, result, language)
+    except redis.RedisError as e:
+        print(f"[Worker {worker_idx}] failed to record metrics: {e}")
 
-        try:
-            if language == "java":
-                result = judge_submission_docker(
-                    # box_id=box_id,
-                    image="judge_env",
-                    problem_id=problem_id,
-                    language=language,
-                    source_code=source_code,
-                    limitations=limitations,
-                    test_cases=test_cases
-                )
-            else:
+    sub_key = SUB_HASH_PREFIX + submission_id
+    # print(json.dumps(result, indent=2))
+    rds.hset(sub_key, mapping={
+        "status": result.get("status", "error"),
+        "score": str(result.get("score", 0)),
+        "result": blobs.pack(json.dumps(result.get("cases", []))),  # 存测试点详情（较大时压缩）
+        "box_setup_saved_ms": str(result.get("box_setup_saved_ms", 0)),
+        "timings": json.dumps(result.get("timings", {})),  # 各阶段耗时，用于排查慢提交
+        "cached_from": result.get("cached_from", ""),  # 复用了哪次提交的结果（见 result_cache.py），空表示实际判题
+        "created_at": task.get("created_at") or datetime.now().isoformat(),
+        "finished_at": result.get("finished_at") or datetime.now().isoformat()
+    })
+    rds.expire(sub_key, _result_ttl(submission_id))
+
+    # 组装回调数据
+    callbacks.post(rds, task, {
+        "status": result.get("status", "error"),
+        "score": result.get("score", 0),
+        "max_time": result.get("max_time", 0),
+        "max_memory": result.get("max_memory", 0),
+        "detail": result.get("cases", []),
+        "finished_at": result.get("finished_at"),
+        "callback_token": task.get("callback_token")  # 如果需要鉴权
+    })
+
+
+def _judge(worker_idx: int, rds, pools: Dict[str, BoxPool], backend: sandboxes.Sandbox, task: dict,
+           reused: Optional[Dict[str, str]] = None) -> dict:
+    """编译并运行，返回 judge_submission / judge_submission_docker 的结果"""
+    test_cases = task.get("test_cases")
+    submission_id = task["submission_id"]
+    problem_id = task.get("problem_id")
+    source_code = task["source_code"]
+    language = task["language"]
+    limitations = task.get("limitations", {})
+    try:
+        if backend.batch:
+            # 整份提交一次完成（docker：所有测试点在同一次 exec 中运行）
+            result = backend.judge(problem_id, language, source_code, limitations, test_cases, reused)
+        else:
+            pool = pools[backend.name]
+            acquire_start = time.perf_counter()
+            box_id, saved_ms = pool.acquire()
+            metrics.observe(rds, "judge_box_acquire_seconds", time.perf_counter() - acquire_start)
+            # 并行模式：尽量租用辅助 box，租不到就退化为较少的 box
+            extra_boxes = box_alloc.try_lease(PARALLEL_BOXES - 1) if PARALLEL_BOXES > 1 else []
+            try:
                 result = judge_submission(
                     box_id=box_id,
                     problem_id=problem_id,
                     language=language,
                     source_code=source_code,
                     limitations=limitations,
-                    test_cases=test_cases
+                    test_cases=test_cases,
+                    box_ready=True,
+                    extra_boxes=extra_boxes,
+                    sandbox=backend,
+                    reused=reused
                 )
+            finally:
+                pool.release(box_id)
+                box_alloc.release(extra_boxes)
+            result["box_setup_saved_ms"] = saved_ms
+            # box 在后台重置，初始化耗时不在判题路径上，仍计入 box_init 指标
+            result.setdefault("timings", {})["box_init_ms"] = pool.reset_ms(box_id)
+            print(f"[Worker {worker_idx}] Submission {submission_id} box {box_id} ready, saved {saved_ms} ms")
+    except Exception as e:
+        result = {
+            "status": "IE",
+            "score": 0,
+            "cases": [],
+            "finished_at": "",
+            "extra": str(e)
+        }
+    return result
+
+
+def _heartbeat_loop(rds, worker_id: str, stop: threading.Event):
+    """后台心跳；顺带执行回收器，把失联 worker 手上的任务放回队列"""
+    cpus.pin_housekeeping()
+    while not stop.is_set():
+        try:
+            job_queue.heartbeat(rds, worker_id)
+            for task in job_queue.reap(rds, worker_id):
+                print(f"[Reaper] Submission {task['submission_id']} exceeded {MAX_JOB_ATTEMPTS} attempts, giving up")
+                _fail(rds, task, "判题进程多次异常退出，请联系管理员")
         except Exception as e:
-            result = {
-                "status": "IE",
-                "score": 0,
-                "cases": [],
-                "finished_at": "",
-                "extra": str(e)
-            }
-        
-        sub_key = SUB_HASH_PREFIX + submission_id
-        # print(json.dumps(result, indent=2))
-        rds.hset(sub_key, mapping={
-            "status": result.get("status", "error"),
-            "score": str(result.get("score", 0)),
-            "result": json.dumps(result.get("cases", [])),  # 存测试点详情
-            "created_at": task.get("created_at") or datetime.now().isoformat(),
-            "finished_at": result.get("finished_at") or datetime.now().isoformat()
-        })
-
-        # 组装回调数据
-        if callback_url:
-            callback_payload = {
-                "status": result.get("status", "error"),
-                "score": result.get("score", 0),
-                "max_time": result.get("max_time", 0),
-                "max_memory": result.get("max_memory", 0),
-                "detail": result.get("cases", []),
-                "finished_at": result.get("finished_at"),
-                "callback_token": task.get("callback_token")  # 如果需要鉴权
-            }
-
-            # 回调 Web
-            try:
-                resp = requests.put(task["callback_url"], json=callback_payload, timeout=10)
-                resp.raise_for_status()
-                print(f"[Worker {worker_idx}] Submission {submission_id} updated successfully")
-            except Exception as e:
-                print(f"[Worker {worker_idx}] Failed to update submission {submission_id}: {e}")
+            print(f"[Worker {worker_id}] heartbeat failed: {e}")
+        stop.wait(HEARTBEAT_INTERVAL)
 
 
-def main():
-    import multiprocessing as mp
+def _observe_queue_wait(rds, lane: str, task: dict):
+    try:
+        waited = (datetime.now() - datetime.fromisoformat(task["created_at"])).total_seconds()
+    except (KeyError, TypeError, ValueError):
+        return
+    metrics.observe(rds, "judge_queue_wait_seconds", max(0.0, waited), {"lane": lane})
+
+
+def _result_ttl(submission_id: str) -> int:
+    return SELFTEST_TTL_SEC if submission_id.startswith("selftest_") else RESULT_TTL_SEC
+
+
+def _fail(rds, task: dict, message: str):
+    """无法判题（任务反复导致 worker 失联、提交内容已过期），直接判为 IE"""
+    submission_id = task["submission_id"]
+    detail = [{"name": "-", "status": "IE", "message": message}]
+    sub_key = SUB_HASH_PREFIX + submission_id
+    rds.hset(sub_key, mapping={
+        "status": "IE",
+        "score": "0",
+        "result": blobs.pack(json.dumps(detail)),
+        "finished_at": datetime.now().isoformat()
+    })
+    rds.expire(sub_key, _result_ttl(submission_id))
+    job_queue.finish(rds, task)
+    callbacks.post(rds, task, {
+        "status": "IE",
+        "score": 0,
+        "detail": detail,
+        "finished_at": datetime.now().isoformat(),
+        "callback_token": task.get("callback_token")
+    })
+
+
+def _expire(rds, worker_id: str, task: dict, elapsed: float):
+    """看门狗：提交超过 SUBMISSION_BUDGET_SEC 仍未判完，判为 IE 并确认任务（随后 worker 退出、由 Supervisor 重启）"""
+    print(f"[Watchdog {worker_id}] Submission {task['submission_id']} exceeded {SUBMISSION_BUDGET_SEC}s "
+          f"({elapsed:.0f}s), killing worker")
+    metrics.inc(rds, "judge_watchdog_kills_total", {"lane": task.get("lane", "")})
+    _fail(rds, task, f"判题超时：超过单次提交的判题时间上限（{SUBMISSION_BUDGET_SEC} 秒）")
+    job_queue.ack(rds, worker_id, task)
+    mem_budget.release(rds, worker_id)
+    job_queue.unregister(rds, worker_id)
 
-    procs = []
-    for i in range(WORKER_PROCESSES):
-        p = mp.Process(target=worker_loop, args=(i,), daemon=True)
-        p.start()
-        procs.append(p)
 
-    for p in procs:
-        p.join()
+def worker_loop(worker_idx: int):
+    # 收到 SIGTERM/SIGINT 后不再取新任务，判完手上的任务再退出
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+    # 先绑定判题核，之后创建的线程与沙箱进程继承该绑定（后台线程各自改绑到杂务核）
+    pinned = cpus.pin_worker()
+    # 每个逐测试点运行的后端各有一个 box 池；docker 后端自带容器池，启动时一并创建以便预热
+    pools = {}
+    box_ids = []
+    for name in sandboxes.box_backends():
+        ids = box_alloc.lease(BOX_POOL_SIZE)
+        pools[name] = BoxPool(ids, sandboxes.get(name))
+        box_ids += ids
+    for name in set(SANDBOX_BACKENDS.values()) - set(pools):
+        sandboxes.get(name)
+    pch.lookup(CPP_COMPILER, CPP_FLAGS)  # 预编译头缺失时提前在后台生成
+    rds = redis.from_url(REDIS_URL, decode_responses=True)
+    scheduler = job_queue.LaneScheduler()
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    job_queue.heartbeat(rds, worker_id)
+    threading.Thread(target=_heartbeat_loop, args=(rds, worker_id, stop), daemon=True).start()
+    watchdog = Watchdog(lambda task, elapsed: _expire(rds, worker_id, task, elapsed))
+
+    print(f"[Worker {worker_idx}] start, id={worker_id}, box_ids={box_ids}, "
+          f"cpus={cpus.format_cpu_list(pinned) if pinned else 'unpinned'}")
+    while not stop.is_set():
+        # box 全部重置失败时不再取任务，退出后由 Supervisor 重启（重新租用 box）
+        broken = [name for name, pool in pools.items() if pool.broken]
+        if broken:
+            print(f"[Worker {worker_idx}] box pool {', '.join(broken)} is broken, exiting")
+            break
+        # 等待任务，按加权顺序尝试各优先级队列，同一队列内按用户轮转；每秒检查一次是否需要退出
+        item = job_queue.dequeue(rds, scheduler, worker_id, timeout=1)
+        if item is None:
+            continue
+        lane, task = item
+        # 内存准入：预留 maxMemory 与编译余量，节点放不下时等待片刻，仍放不下就放回队列、稍后再取
+        parallel = 1 if sandboxes.for_language(task.get("language")).batch else PARALLEL_BOXES
+        admission = mem_budget.admit(rds, worker_id, mem_budget.job_mem_mb(task, parallel), task.get("submission_id"))
+        metrics.inc(rds, "judge_mem_admission_total", {"outcome": admission})
+        if admission == "deferred":
+            print(f"[Worker {worker_idx}] Submission {task['submission_id']} does not fit in node memory, requeued")
+            job_queue.requeue(rds, worker_id)
+            stop.wait(1)
+            continue
+        # 处理过程中进程异常退出时不 ack，任务由回收器放回队列；超过硬预算由看门狗判为 IE 并结束本进程
+        watchdog.arm(task, SUBMISSION_BUDGET_SEC)
+        _handle_task(worker_idx, rds, pools, lane, task)
+        watchdog.disarm()
+        mem_budget.release(rds, worker_id)
+        job_queue.ack(rds, worker_id, task)
+
+    job_queue.unregister(rds, worker_id)
+    print(f"[Worker {worker_idx}] drained, exit")
+
+
+def main():
+    Supervisor(worker_loop).run()
 
 
 if __name__ == "__main__":
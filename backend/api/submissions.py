@@ -1,5 +1,6 @@
 import time, hmac, base64, hashlib, threading, requests
 import uuid
+from datetime import datetime, timedelta
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import get_jwt_identity, get_jwt
 from exts import db
@@ -30,11 +31,31 @@ def _verify_callback_token(token: str, submission_id: int, max_age_sec: int = 36
 def _fire_and_forget_enqueue(url: str, payload: dict, timeout_sec: float = 3.0):
     def _send():
         try:
-            requests.post(url, json=payload, timeout=timeout_sec)
+            resp = requests.post(url, json=payload, timeout=timeout_sec)
+            if resp.status_code == 429 and payload.get("callback_url"):
+                # 判题机拒绝：该用户在途提交过多，直接把提交置为 IE，避免一直 Pending
+                requests.put(payload["callback_url"], json={
+                    "status": "IE",
+                    "score": 0,
+                    "detail": [{"name": "-", "status": "IE", "message": "提交过于频繁，请等待之前的提交判完后再试"}],
+                    "callback_token": payload.get("callback_token"),
+                }, timeout=timeout_sec)
         except Exception:
             pass
     threading.Thread(target=_send, daemon=True).start()
 
+def _judge_priority(problem_set_id) -> str:
+    """
+    判题机队列优先级：临近截止的题单提交走 deadline，其余普通提交走 live
+    """
+    if problem_set_id:
+        problem_set = ProblemSetModel.query.get(problem_set_id)
+        if problem_set and problem_set.end_time:
+            remaining = problem_set.end_time - datetime.now()
+            if timedelta(0) <= remaining <= timedelta(minutes=current_app.config["DEADLINE_LANE_MINUTES"]):
+                return "deadline"
+    return "live"
+
 def submit_legacy(problem, data: dict):
     """
     提交传统题（单选、多选、填空、主观题）
@@ -132,7 +153,9 @@ def submit_coding(problem, data: dict):
         "source_code": source_code,
         "limitations": problem.limitations,
         "callback_url": callback_url,
-        "callback_token": callback_token
+        "callback_token": callback_token,
+        "priority": _judge_priority(problem_set_id),
+        "user_id": user_id
     }
     _fire_and_forget_enqueue(f"{current_app.config['JUDGE_SERVER']}/judger/{submission.id}", judge_payload, timeout_sec=3.0)
 
@@ -167,7 +190,9 @@ def self_check():
                 "source_code": source_code,
                 "test_cases": test_cases,
                 "limitations": limitations,
+                "problem_id": data.get("problem_id"),  # 可选，判题机使用该题的 checker 比较输出
                 "callback_url": None,  # 这里不需要回调
+                "user_id": get_jwt_identity(),
             },
             timeout=5
         )
@@ -205,6 +230,9 @@ def submit_problem(problem_id):
 @bp.patch("/<int:submission_id>")
 @role_required()
 def rejudge(submission_id):
+    """
+    重判单个提交；body 可带 {"no_cache": true}，跳过判题机的结果缓存（对时间敏感的重判）
+    """
     submission = SubmissionModel.query.get_or_404(submission_id)
     problem = ProblemModel.query.get_or_404(submission.problem_id)
     language = submission.language
@@ -215,6 +243,8 @@ def rejudge(submission_id):
         return jsonify({"error": "Missing language or source_code"}), 400
 
     problem = ProblemModel.query.get_or_404(problem.id)
+    # 上一次的测试点结果，判题机据此只重跑数据改动过的测试点
+    previous_cases = submission.extra if isinstance(submission.extra, list) else None
 
     # 1) 入库
     submission.status = "Pending"
@@ -234,7 +264,11 @@ def rejudge(submission_id):
         "source_code": source_code,
         "limitations": limitations,
         "callback_url": callback_url,
-        "callback_token": callback_token
+        "callback_token": callback_token,
+        "priority": "live",
+        "user_id": submission.user_id,
+        "no_cache": bool((request.get_json(silent=True) or {}).get("no_cache")),
+        "previous_cases": previous_cases
     }
     _fire_and_forget_enqueue(f"{current_app.config['JUDGE_SERVER']}/judger/{submission.id}", judge_payload, timeout_sec=3.0)
 
@@ -250,7 +284,9 @@ def rejudge(submission_id):
 def rejudge_problem(problem_id):
     """
     重判指定 problem_id 下的所有提交记录
+    body 可带 {"no_cache": true}：测试数据未变时判题机默认复用已有结果，对时间敏感的重判需跳过缓存
     """
+    no_cache = bool((request.get_json(silent=True) or {}).get("no_cache"))
     problem = ProblemModel.query.get_or_404(problem_id)
     submissions = SubmissionModel.query.filter_by(problem_id=problem_id).all()
     for submission in submissions:
@@ -260,6 +296,8 @@ def rejudge_problem(problem_id):
 
         if not language or not source_code:
             continue
+        # 上一次的测试点结果：只修改了个别测试点时，判题机只重跑 digest 变化的测试点
+        previous_cases = submission.extra if isinstance(submission.extra, list) else None
 
         # 入库
         submission.status = "Pending"
@@ -277,7 +315,11 @@ def rejudge_problem(problem_id):
             "source_code": source_code,
             "limitations": limitations,
             "callback_url": callback_url,
-            "callback_token": callback_token
+            "callback_token": callback_token,
+            "priority": "rejudge",  # 批量重判走最低优先级，不挤占学生提交
+            "user_id": submission.user_id,
+            "no_cache": no_cache,
+            "previous_cases": previous_cases
         }
         _fire_and_forget_enqueue(
             f"{current_app.config['JUDGE_SERVER']}/judger/{submission.id}",
@@ -330,28 +372,19 @@ def get_submission(submission_id):
     }), 200
 
 
-@bp.put("/<int:submission_id>")
-def judge_callback(submission_id):
+def _apply_judge_result(s: SubmissionModel, data: dict):
     """
-    判题机回调：更新 submission 状态/分数/详情
-    - 判题机可多次回调：compiling/running -> 最终态（accepted/rejected/CE/RE/TLE/MLE）
-    - 通过 callback_token 鉴权
+    把一次判题机回调写到 submission 上（不提交事务）
+    判题机重试/重新领取任务时回调可能乱序，已出最终结果的提交不再退回 Judging
     """
-    data = request.get_json() or {}
-    token = data.get("callback_token") or request.headers.get("X-Judge-Signature")
-
-    if not token or not _verify_callback_token(token, submission_id):
-        return jsonify({"error": "invalid callback token"}), 401
-
-    s = SubmissionModel.query.get_or_404(submission_id)
-
-    # 允许局部更新
     new_status = data.get("status")
     new_score = data.get("score")
     max_time = data.get("max_time")
     max_memory = data.get("max_memory")
     detail = data.get("detail")
 
+    if new_status == "Judging" and s.status not in ("Pending", "Judging"):
+        return
     if new_status:
         s.status = new_status
     if max_time:
@@ -366,6 +399,58 @@ def judge_callback(submission_id):
         except Exception:
             s.extra = str(detail)
 
+
+@bp.put("/batch")
+def judge_callback_batch():
+    """
+    判题机批量回调：{ "updates": [ { submission_id, callback_token, status, score, ... }, ... ] }
+    逐条校验 callback_token，一次事务提交
+    返回 { "results": { submission_id: "ok" | "invalid callback token" | "not found" } }
+    """
+    updates = (request.get_json() or {}).get("updates") or []
+    results = {}
+    valid = {}
+    for data in updates:
+        submission_id = data.get("submission_id")
+        if not isinstance(submission_id, int):
+            continue
+        if not _verify_callback_token(data.get("callback_token") or "", submission_id):
+            results[str(submission_id)] = "invalid callback token"
+            continue
+        valid[submission_id] = data
+
+    if valid:
+        submissions = SubmissionModel.query.filter(SubmissionModel.id.in_(list(valid))).all()
+        found = {s.id: s for s in submissions}
+        for submission_id, data in valid.items():
+            s = found.get(submission_id)
+            if s is None:
+                results[str(submission_id)] = "not found"
+                continue
+            _apply_judge_result(s, data)
+            results[str(submission_id)] = "ok"
+        db.session.commit()
+    return jsonify({"results": results})
+
+
+@bp.put("/<int:submission_id>")
+def judge_callback(submission_id):
+    """
+    判题机回调：更新 submission 状态/分数/详情
+    - 判题机可多次回调：compiling/running -> 最终态（accepted/rejected/CE/RE/TLE/MLE）
+    - 通过 callback_token 鉴权
+    """
+    data = request.get_json() or {}
+    token = data.get("callback_token") or request.headers.get("X-Judge-Signature")
+
+    if not token or not _verify_callback_token(token, submission_id):
+        return jsonify({"error": "invalid callback token"}), 401
+
+    s = SubmissionModel.query.get_or_404(submission_id)
+
+    # 允许局部更新
+    _apply_judge_result(s, data)
+
     db.session.commit()
     return jsonify({"ok": True})
 
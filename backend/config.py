@@ -12,6 +12,7 @@ SQLALCHEMY_DATABASE_URI = (f"mysql+pymysql://{USERNAME}:{PASSWORD}@{HOSTNAME}:{P
 # 这里是判题机
 JUDGE_SERVER = "http://127.0.0.1:8000"  # 判题机地址
 PUBLIC_BASE_URL = "http://127.0.0.1:5000/api"
+DEADLINE_LANE_MINUTES = 30  # 题单截止前多少分钟内的提交进入判题机的 deadline 优先队列
 
 # JUDGE_SERVER = "http://121.249.151.214:8000"  # 判题机地址
 # PUBLIC_BASE_URL = "http://172.24.61.145:5001/api"
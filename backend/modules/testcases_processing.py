@@ -1,7 +1,153 @@
 import os
 import io
+import json
 import zipfile
 import shutil
+import hashlib
+from glob import glob
+from fnmatch import fnmatch
+
+# 判题机读取的测试数据清单，随测试数据一起放在 data/{pid}/ 下
+MANIFEST_NAME = "manifest.json"
+# 随测试数据上传的配置文件：特殊评测写入 manifest 的 checker 字段（见 CodeJudger/checkers.py），
+# 测试点分组写入 groups 字段（见 CodeJudger/groups.py）
+CHECKER_FILES = ("checker.json", "checker.cpp", "testlib.h", "groups.json")
+CHECKER_TYPES = ("exact", "tokens", "float", "testlib")
+
+
+def _normalize(s: str) -> str:
+    """与判题机比较规则一致：去掉每行行尾空白和末尾空行"""
+    return "\n".join([line.rstrip() for line in s.rstrip().splitlines()])
+
+
+def _checker_spec(base_dir: str):
+    """
+    checker.json（{"type": "tokens"} / {"type": "float", "eps": 1e-6} …）与 checker.cpp 生成 manifest 的 checker 字段。
+    只有 checker.cpp 时视为 testlib checker；都没有或配置无效时返回 None，判题机按逐行精确比较。
+    """
+    spec = {}
+    json_path = os.path.join(base_dir, "checker.json")
+    if os.path.isfile(json_path):
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                spec = json.load(f)
+        except ValueError:
+            spec = {}
+    cpp_path = os.path.join(base_dir, "checker.cpp")
+    if os.path.isfile(cpp_path):
+        spec.setdefault("type", "testlib")
+    if not isinstance(spec, dict) or spec.get("type") not in CHECKER_TYPES:
+        return None
+
+    checker = {"type": spec["type"]}
+    if checker["type"] == "float":
+        checker["eps"] = float(spec.get("eps", 1e-6))
+    elif checker["type"] == "testlib":
+        if not os.path.isfile(cpp_path):
+            return None
+        h = hashlib.sha256()
+        for name in ("checker.cpp", "testlib.h"):
+            path = os.path.join(base_dir, name)
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    h.update(f.read())
+        checker["source"] = "checker.cpp"
+        checker["source_digest"] = h.hexdigest()
+    return checker
+
+
+def _groups_spec(base_dir: str, names: list):
+    """
+    groups.json 生成 manifest 的 groups 字段：
+      [{"name": "1", "weight": 30, "cases": ["1", "2"]}, {"name": "2", "weight": 70, "cases": ["big*"], "depends": ["1"]}]
+    cases 支持通配符，按测试点顺序展开；每个测试点只归入第一个匹配的组；depends 只能引用前面的组。
+    未归入任何组的测试点放进末尾 weight 为 0 的组（照常运行，不计分）。没有或配置无效时返回 None。
+    """
+    path = os.path.join(base_dir, "groups.json")
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            spec = json.load(f)
+    except ValueError:
+        return None
+    if not isinstance(spec, list):
+        return None
+
+    groups = []
+    assigned = set()
+    for i, g in enumerate(spec):
+        if not isinstance(g, dict):
+            return None
+        name = str(g.get("name", i + 1))
+        patterns = [str(p) for p in g.get("cases", [])]
+        cases = [n for n in names if n not in assigned and any(fnmatch(n, p) for p in patterns)]
+        assigned.update(cases)
+        earlier = {x["name"] for x in groups}
+        groups.append({
+            "name": name,
+            "weight": float(g.get("weight", 1)),
+            "cases": cases,
+            "depends": [str(d) for d in g.get("depends", []) if str(d) in earlier],
+        })
+    rest = [n for n in names if n not in assigned]
+    if rest:
+        groups.append({"name": "ungrouped", "weight": 0.0, "cases": rest, "depends": []})
+    return groups
+
+
+def write_manifest(base_dir: str):
+    """
+    扫描 base_dir 下成对的 .in/.out，写入 manifest.json：
+    有序的测试点列表、文件大小、输入的 sha256 以及规范化后标准输出的 sha256，以及 checker、测试点分组配置（如有）。
+    判题机按 manifest 的 mtime 缓存，直接用 out_digest 比对选手输出。
+    没有测试点时删除 manifest。
+    """
+    manifest_path = os.path.join(base_dir, MANIFEST_NAME)
+    cases = []
+    for in_path in sorted(glob(os.path.join(base_dir, "*.in"))):
+        name = os.path.splitext(os.path.basename(in_path))[0]
+        out_path = os.path.join(base_dir, f"{name}.out")
+        if not os.path.exists(out_path):
+            continue
+        with open(in_path, "rb") as f:
+            in_digest = hashlib.sha256(f.read()).hexdigest()
+        with open(out_path, "r", encoding="utf-8", errors="ignore") as f:
+            out_digest = hashlib.sha256(_normalize(f.read()).encode("utf-8")).hexdigest()
+        cases.append({
+            "name": name,
+            "in": os.path.basename(in_path),
+            "out": os.path.basename(out_path),
+            "in_size": os.path.getsize(in_path),
+            "out_size": os.path.getsize(out_path),
+            "in_digest": in_digest,
+            "out_digest": out_digest,
+        })
+
+    if not cases:
+        if os.path.isfile(manifest_path):
+            os.remove(manifest_path)
+        return None
+
+    checker = _checker_spec(base_dir)
+    groups = _groups_spec(base_dir, [c["name"] for c in cases])
+    version = hashlib.sha256(
+        ("\n".join(f"{c['name']}:{c['in_digest']}:{c['out_digest']}" for c in cases)
+         + "\n" + json.dumps(checker, sort_keys=True)
+         + "\n" + json.dumps(groups, sort_keys=True)).encode("utf-8")
+    ).hexdigest()
+    manifest = {"version": version, "cases": cases}
+    if checker:
+        manifest["checker"] = checker
+    if groups:
+        manifest["groups"] = groups
+
+    # 先写临时文件再替换，判题机不会读到写了一半的 manifest
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+    return manifest
 
 def process_json_data(pid: str, test_cases: list):
     """
@@ -35,6 +181,8 @@ def process_json_data(pid: str, test_cases: list):
             "out": os.path.relpath(output_path, parent_root)
         })
 
+    write_manifest(base_dir)
+
     return {
         "num_cases": len(cases_info),
         "cases": cases_info
@@ -96,6 +244,15 @@ def process_test_cases(pid: str, uploaded_file):
             })
             valid_files.update([new_in, new_out])
 
+    # checker、分组配置文件同样移到 base_dir 根目录保留
+    for fpath in all_files:
+        fname = os.path.basename(fpath)
+        if fname in CHECKER_FILES and os.path.exists(fpath):
+            new_path = os.path.join(base_dir, fname)
+            if fpath != new_path:
+                shutil.move(fpath, new_path)
+            valid_files.add(new_path)
+
     # 4. 删除无关文件和空目录
     for root, dirs, files in os.walk(base_dir, topdown=False):
         for f in files:
@@ -107,6 +264,8 @@ def process_test_cases(pid: str, uploaded_file):
             if not os.listdir(dpath):
                 os.rmdir(dpath)
 
+    write_manifest(base_dir)
+
     # 5. 返回 JSON
     return {
         'num_cases': len(test_cases),
@@ -130,6 +289,9 @@ def remove_test_cases(pid: str, test_cases_dict: dict):
                 if os.path.isfile(abs_path):
                     os.remove(abs_path)
 
+    if os.path.isdir(base_dir):
+        write_manifest(base_dir)
+
     # 删除空目录
     if os.path.isdir(base_dir) and not os.listdir(base_dir):
         os.rmdir(base_dir)
@@ -151,7 +313,8 @@ def pack_test_cases(pid: str):
         if root != base_dir:
             dirs[:] = []  # 不进入子目录
         for f in files:
-            all_files.append(os.path.join(root, f))
+            if f != MANIFEST_NAME:
+                all_files.append(os.path.join(root, f))
 
     if not all_files:
         raise FileNotFoundError("测试用例目录为空")